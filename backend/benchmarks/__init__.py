@@ -0,0 +1 @@
+"""Local load-testing and benchmarking tools for the NEURALFIN.AI backend."""
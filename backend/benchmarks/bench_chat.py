@@ -0,0 +1,206 @@
+"""
+Latency/throughput benchmark for /api/chat/stream and /api/chat.
+
+Starts the fake LLM and the instrumented backend as separate processes, drives
+each endpoint with N concurrent clients and reports, per scenario:
+
+- TTFT (time to first ``text-delta`` frame) p50/p95/p99
+- total request latency p50/p95/p99
+- completed requests per second and response bytes per second
+- error count and backend event-loop lag (p50/p99/max)
+- upstream calls made to the fake LLM (fewer than requests when the response
+  cache or request coalescing answers some of them)
+
+Use it as the regression gate for backend performance changes:
+
+    python -m benchmarks.bench_chat --json before.json
+    # ... change backend ...
+    python -m benchmarks.bench_chat --baseline before.json --max-regression 0.10
+
+With ``--baseline`` the run exits non-zero if any scenario's p95 TTFT, p95
+latency or throughput regresses by more than ``--max-regression``.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import CHAT_BODY, free_port, parse_frame, percentile, start_server, stop_servers, wait_until_up
+
+ENDPOINTS = {"stream": "/api/chat/stream", "chat": "/api/chat"}
+
+
+async def timed_request(http: httpx.AsyncClient, backend_url: str, endpoint: str) -> dict:
+    """Issue one request and return its timings; errors are recorded, not raised"""
+    started = time.perf_counter()
+    ttft = None
+    size = 0
+    ok = True
+    try:
+        if endpoint == "stream":
+            async with http.stream("POST", backend_url + ENDPOINTS[endpoint], json=CHAT_BODY) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    size += len(line) + 1
+                    event = parse_frame(line)
+                    if event is None:
+                        continue
+                    if ttft is None and event["type"] == "text-delta":
+                        ttft = time.perf_counter() - started
+                    elif event["type"] == "error":
+                        ok = False
+        else:
+            response = await http.post(backend_url + ENDPOINTS[endpoint], json=CHAT_BODY)
+            response.raise_for_status()
+            size = len(response.content)
+            ttft = time.perf_counter() - started
+    except httpx.HTTPError:
+        ok = False
+    total = time.perf_counter() - started
+    return {"ok": ok and ttft is not None, "ttft": ttft, "total": total, "bytes": size}
+
+
+async def run_scenario(backend_url: str, llm_url: str, endpoint: str, concurrency: int, requests: int) -> dict:
+    """Run `requests` requests with at most `concurrency` in flight"""
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+    results = []
+
+    async def client_worker(http):
+        while not queue.empty():
+            queue.get_nowait()
+            results.append(await timed_request(http, backend_url, endpoint))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as http:
+        await http.post(f"{backend_url}/bench/loop-lag/reset")
+        await http.post(f"{llm_url}/stats/reset")
+        started = time.perf_counter()
+        await asyncio.gather(*[client_worker(http) for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+        loop_lag = (await http.get(f"{backend_url}/bench/loop-lag")).json()
+        upstream_calls = (await http.get(f"{llm_url}/stats")).json()["requests"]
+
+    succeeded = [r for r in results if r["ok"]]
+    ttfts = [r["ttft"] for r in succeeded]
+    totals = [r["total"] for r in succeeded]
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - len(succeeded),
+        "wall_s": wall,
+        "rps": len(succeeded) / wall,
+        "bytes_per_s": sum(r["bytes"] for r in results) / wall,
+        "upstream_calls": upstream_calls,
+        **{f"ttft_p{p}_ms": percentile(ttfts, p) * 1000 for p in (50, 95, 99)},
+        **{f"total_p{p}_ms": percentile(totals, p) * 1000 for p in (50, 95, 99)},
+        "loop_lag_p50_ms": loop_lag["p50_ms"],
+        "loop_lag_p99_ms": loop_lag["p99_ms"],
+        "loop_lag_max_ms": loop_lag["max_ms"],
+    }
+
+
+def print_report(results: list):
+    header = (f"{'endpoint':>8} {'conc':>5} {'reqs':>5} {'err':>4} {'req/s':>7} {'KB/s':>8} "
+              f"{'ttft p50':>9} {'p95':>7} {'p99':>7} {'total p50':>10} {'p95':>7} {'p99':>7} "
+              f"{'lag p50':>8} {'p99':>6} {'max':>6} {'upstream':>8}")
+    print(header)
+    for r in results:
+        print(f"{r['endpoint']:>8} {r['concurrency']:>5} {r['requests']:>5} {r['errors']:>4} "
+              f"{r['rps']:>7.1f} {r['bytes_per_s'] / 1024:>8.1f} "
+              f"{r['ttft_p50_ms']:>9.1f} {r['ttft_p95_ms']:>7.1f} {r['ttft_p99_ms']:>7.1f} "
+              f"{r['total_p50_ms']:>10.1f} {r['total_p95_ms']:>7.1f} {r['total_p99_ms']:>7.1f} "
+              f"{_ms(r['loop_lag_p50_ms']):>8} {_ms(r['loop_lag_p99_ms']):>6} {_ms(r['loop_lag_max_ms']):>6} "
+              f"{r.get('upstream_calls', '-'):>8}")
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def compare_to_baseline(results: list, baseline: list, max_regression: float) -> list:
+    """Return a description of every metric that regressed beyond the allowed fraction"""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        before = previous.get((r["endpoint"], r["concurrency"]))
+        if before is None:
+            continue
+        for metric in ("ttft_p95_ms", "total_p95_ms"):
+            if r[metric] > before[metric] * (1 + max_regression):
+                regressions.append(f"{r['endpoint']}@{r['concurrency']}: {metric} {before[metric]:.1f} -> {r[metric]:.1f}")
+        if r["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"{r['endpoint']}@{r['concurrency']}: rps {before['rps']:.1f} -> {r['rps']:.1f}")
+    return regressions
+
+
+async def main(args) -> int:
+    llm_port, backend_port = free_port(), free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+
+    fake_llm = start_server("benchmarks.fake_llm:app", llm_port, {
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKEN_RATE": str(args.token_rate),
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.first_token_delay),
+        "FAKE_LLM_LATENCY_JITTER": str(args.latency_jitter),
+        "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+    })
+    backend = start_server("benchmarks.instrumented_app:app", backend_port, {
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OPENAI_MAX_RETRIES": "0",
+        # Every benchmark client asks the same question, so the cache is opt-in here
+        "RESPONSE_CACHE_ENABLED": "true" if args.response_cache else "false",
+        "CHAT_COALESCING_ENABLED": "true" if args.coalescing else "false",
+    })
+    results = []
+    try:
+        await wait_until_up(f"{llm_url}/stats")
+        await wait_until_up(f"{backend_url}/health")
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                requests = max(concurrency, args.requests_per_client * concurrency)
+                results.append(await run_scenario(backend_url, llm_url, endpoint, concurrency, requests))
+    finally:
+        stop_servers(backend, fake_llm)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=["stream", "chat"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-rate", type=float, default=50)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--response-cache", action="store_true", help="leave the backend response cache enabled")
+    parser.add_argument("--coalescing", action="store_true",
+                        help="leave request coalescing enabled (identical concurrent streams share one upstream call)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results previously written with --json")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
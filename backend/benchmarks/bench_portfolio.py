@@ -0,0 +1,131 @@
+"""
+Portfolio optimizer latency at 1k–5k funds.
+
+Generates a synthetic fund universe whose daily returns follow a market
+factor, one factor per asset class, and fund-specific noise. It publishes the
+NAVs as a snapshot with database/nav_snapshot.py, loads it into a NavStore the
+way a worker does, and times the following:
+
+- cold: covariance estimation (Ledoit-Wolf) plus a minimum-variance solve
+- repeat: the same request again, answered from the result cache
+- constrained: a new constraint set (max weight and asset-class caps) on the
+  cached covariance, for each objective
+
+For reference it also builds the dense N×N covariance the textbook way, using
+``np.cov``, dense Ledoit-Wolf and dense products in the same solver. It reports
+that time and the largest weight difference from the factor-form solve.
+
+    python -m benchmarks.bench_portfolio --funds 1000 2500 5000 --years 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import BACKEND_DIR
+from benchmarks.sample_fund_db import ASSET_CLASSES
+from src import portfolio
+from src.nav_store import NavStore
+
+# After the backend modules, so database/main.py and config.py do not shadow them
+sys.path.append(os.path.join(os.path.dirname(BACKEND_DIR), "database"))
+from nav_snapshot import write_snapshot_from_frame  # noqa: E402
+
+CAPS = {"Equity": 0.6, "Fixed Income": 0.5, "Money Market": 0.1}
+
+
+def synthetic_universe(funds: int, years: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp("2025-06-30"), periods=252 * years + 1)
+    classes = list(ASSET_CLASSES)
+    fund_class = rng.integers(0, len(classes), funds)
+    vols = np.array([ASSET_CLASSES[c][3] for c in classes])[fund_class]
+    market = rng.normal(0, 0.008, len(dates) - 1)
+    class_factors = rng.normal(0, 0.005, (len(dates) - 1, len(classes)))
+    returns = (market[:, None] * rng.uniform(0.2, 1.2, funds) * (vols / vols.max())
+               + class_factors[:, fund_class] * rng.uniform(0.5, 1.0, funds)
+               + rng.normal(0, 1, (len(dates) - 1, funds)) * vols * 0.6
+               + rng.normal(0.0002, 0.0001, funds))
+    closes = 100 * np.exp(np.vstack([np.zeros(funds), np.cumsum(returns, axis=0)]))
+    isins = np.array([f"LU{i:010d}" for i in range(funds)])
+    frame = pd.DataFrame({
+        "isin": np.repeat(isins, len(dates)),
+        "date": np.tile(dates.to_numpy(), funds),
+        "close": closes.T.ravel(),
+    })
+    universe = [portfolio.Fund(isin, classes[c], None) for isin, c in zip(isins, fund_class)]
+    return frame, universe
+
+
+def dense_reference(store: NavStore, universe, lookback_days: int):
+    """Dense N×N Ledoit-Wolf covariance and a min-variance solve with dense products"""
+    started = time.perf_counter()
+    _, returns, included, _ = portfolio.returns_matrix(store, [f.isin for f in universe], lookback_days)
+    t, n = returns.shape
+    sample = np.cov(returns, rowvar=False, bias=True)
+    x = returns - returns.mean(axis=0)
+    mu = np.trace(sample) / n
+    delta = ((sample - mu * np.eye(n)) ** 2).sum() / n
+    beta = ((x ** 2).T @ (x ** 2)).sum() / t ** 2 - (sample ** 2).sum() / t
+    shrinkage = min(max(beta / n, 0) / delta, 1)
+    dense = ((1 - shrinkage) * sample + shrinkage * mu * np.eye(n)) * portfolio.TRADING_DAYS
+    model = portfolio.CovarianceModel(included, "", "", t, "ledoit_wolf", shrinkage, np.zeros(n),
+                                      np.diag(dense).copy(), None, 0.0, 0.0, dense=dense)
+    classes = {f.isin: f.asset_class for f in universe}
+    names = sorted(set(classes.values()))
+    groups = np.searchsorted(names, [classes[i] for i in included])
+    constraints = (np.ones(n), groups, np.ones(len(names)))
+    weights, _, _ = portfolio._fista(model, np.zeros(n), 1.0, constraints, 2000)
+    return time.perf_counter() - started, shrinkage, dict(zip(included, weights))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main(args) -> int:
+    lookback_days = 365 * args.years
+    print(f"{'funds':>6} {'step':>26} {'ms':>9} {'iters':>6} {'holdings':>9} {'vol':>7}")
+    for funds in args.funds:
+        frame, universe = synthetic_universe(funds, args.years + 1)
+        with tempfile.TemporaryDirectory() as root:
+            write_snapshot_from_frame(root, frame)
+            del frame
+            store = NavStore(root)
+            store.refresh()
+            optimizer = portfolio.PortfolioOptimizer(cache_max_bytes=1 << 30, max_funds=max(args.funds))
+
+            steps = [
+                ("cold min_variance", dict(objective="min_variance")),
+                ("repeat (result cache)", dict(objective="min_variance")),
+                ("min_variance capped", dict(objective="min_variance", max_weight=0.02, asset_class_caps=CAPS)),
+                ("mean_variance capped", dict(objective="mean_variance", max_weight=0.02, asset_class_caps=CAPS)),
+                ("risk_parity", dict(objective="risk_parity")),
+            ]
+            factor_weights = None
+            for name, options in steps:
+                ms, result = timed(lambda: optimizer.optimize(store, universe, lookback_days=lookback_days, **options))
+                if factor_weights is None:
+                    factor_weights = {h["isin"]: h["weight"] for h in result["holdings"]}
+                print(f"{funds:>6} {name:>26} {ms:>9.1f} {result['solver']['iterations']:>6} "
+                      f"{result['holdings_count']:>9} {result['volatility']:>7.4f}")
+
+            seconds, shrinkage, dense_weights = dense_reference(store, universe, lookback_days)
+            diff = max(abs(dense_weights[i] - factor_weights.get(i, 0.0)) for i in dense_weights)
+            print(f"{funds:>6} {'dense reference':>26} {seconds * 1000:>9.1f} {'':>6} {'':>9} {'':>7}"
+                  f"  shrinkage {shrinkage:.3f}, max |Δw| {diff:.1e}")
+            print(f"{funds:>6} {'cache':>26} {optimizer.snapshot()}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--funds", type=int, nargs="+", default=[1000, 2500, 5000])
+    parser.add_argument("--years", type=int, default=3, help="lookback in years")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""
+Model router benchmark against two fake upstreams.
+
+Starts two fake LLMs and drives ``/api/chat/stream`` under several router
+configurations:
+
+- ``primary``: a slow upstream with a long-tailed first-token latency that
+  rejects a share of requests with 429
+- ``fallback``: a faster, reliable upstream
+
+Scenarios:
+
+- ``single``: primary only, as without the router
+- ``failover``: primary, failing over to fallback
+- ``hedged``: as failover, plus a hedge request after ``--hedge-after`` seconds
+- ``capped``: as failover, with the primary capped at ``--primary-cap`` concurrent calls
+
+Each scenario reports TTFT p50/p95/p99, failed requests and the calls each upstream received.
+
+    python -m benchmarks.bench_router --concurrency 32 --requests 256
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+
+from benchmarks.bench_chat import timed_request
+from benchmarks.common import free_port, percentile, start_server, stop_servers, wait_until_up
+
+
+def scenarios(args) -> dict:
+    primary = {"model": "primary-model", "base_url": None, "max_concurrency": 256}
+    fallback = {"model": "fallback-model", "base_url": None, "max_concurrency": 256}
+    return {
+        "single": {"routes": {"primary": primary}, "classes": {"short": ["primary"], "planning": ["primary"]}},
+        "failover": {
+            "routes": {"primary": primary, "fallback": fallback},
+            "classes": {"short": ["primary", "fallback"], "planning": ["primary", "fallback"]},
+        },
+        "hedged": {
+            "routes": {"primary": primary, "fallback": fallback},
+            "classes": {"short": ["primary", "fallback"], "planning": ["primary", "fallback"]},
+            "hedge_after": args.hedge_after,
+        },
+        "capped": {
+            "routes": {"primary": {**primary, "max_concurrency": args.primary_cap}, "fallback": fallback},
+            "classes": {"short": ["primary", "fallback"], "planning": ["primary", "fallback"]},
+        },
+    }
+
+
+async def run_scenario(name: str, config: dict, llm_urls: dict, args) -> dict:
+    for route, spec in config["routes"].items():
+        spec["base_url"] = f"{llm_urls[route]}/v1"
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(config, f)
+    backend_port = free_port()
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    backend = start_server("benchmarks.instrumented_app:app", backend_port, {
+        "OPENAI_API_KEY": "fake-key",
+        "MODEL_ROUTER_CONFIG": f.name,
+        "RESPONSE_CACHE_ENABLED": "false",
+        "CHAT_COALESCING_ENABLED": "false",
+        "LOG_SAMPLE_RATE": "0",
+    })
+    try:
+        await wait_until_up(f"{backend_url}/health")
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+        results = []
+
+        async def client_worker(http):
+            while not queue.empty():
+                queue.get_nowait()
+                results.append(await timed_request(http, backend_url, "stream"))
+
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=None) as http:
+            for url in llm_urls.values():
+                await http.post(f"{url}/stats/reset")
+            await asyncio.gather(*[client_worker(http) for _ in range(args.concurrency)])
+            calls = {route: (await http.get(f"{url}/stats")).json()["requests"] for route, url in llm_urls.items()}
+            router = (await http.get(f"{backend_url}/api/cache/stats")).json()["router"]
+    finally:
+        stop_servers(backend)
+        os.unlink(f.name)
+
+    ttfts = [r["ttft"] for r in results if r["ok"]]
+    return {
+        "scenario": name,
+        "errors": sum(1 for r in results if not r["ok"]),
+        **{f"ttft_p{p}_ms": percentile(ttfts, p) * 1000 for p in (50, 95, 99)},
+        "primary_calls": calls["primary"],
+        "fallback_calls": calls["fallback"],
+        "hedge_wins": sum(route["hedge_wins"] for route in router["routes"].values()),
+    }
+
+
+async def main(args) -> int:
+    ports = {"primary": free_port(), "fallback": free_port()}
+    llm_urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    common = {"FAKE_LLM_TOKENS": str(args.tokens), "FAKE_LLM_TOKEN_RATE": "100"}
+    llms = [
+        start_server("benchmarks.fake_llm:app", ports["primary"], {
+            **common,
+            "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.primary_delay),
+            "FAKE_LLM_LATENCY_JITTER": str(args.primary_jitter),
+            "FAKE_LLM_ERROR_RATE": str(args.primary_429_rate),
+            "FAKE_LLM_ERROR_STATUS": "429",
+        }),
+        start_server("benchmarks.fake_llm:app", ports["fallback"], {
+            **common,
+            "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.fallback_delay),
+            "FAKE_LLM_LATENCY_JITTER": "0.2",
+        }),
+    ]
+    results = []
+    try:
+        for url in llm_urls.values():
+            await wait_until_up(f"{url}/stats")
+        for name, config in scenarios(args).items():
+            if name in args.scenarios:
+                results.append(await run_scenario(name, config, llm_urls, args))
+    finally:
+        stop_servers(*llms)
+
+    print(f"{'scenario':>9} {'err':>4} {'ttft p50':>9} {'p95':>7} {'p99':>7} {'primary':>8} {'fallback':>8} {'hedge wins':>10}")
+    for r in results:
+        print(f"{r['scenario']:>9} {r['errors']:>4} {r['ttft_p50_ms']:>9.1f} {r['ttft_p95_ms']:>7.1f} "
+              f"{r['ttft_p99_ms']:>7.1f} {r['primary_calls']:>8} {r['fallback_calls']:>8} {r['hedge_wins']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["single", "failover", "hedged", "capped"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--primary-delay", type=float, default=0.3)
+    parser.add_argument("--primary-jitter", type=float, default=1.0, help="lognormal sigma of the primary's first-token delay")
+    parser.add_argument("--primary-429-rate", type=float, default=0.1)
+    parser.add_argument("--fallback-delay", type=float, default=0.2)
+    parser.add_argument("--hedge-after", type=float, default=0.5)
+    parser.add_argument("--primary-cap", type=int, default=8)
+    sys.exit(asyncio.run(main(parser.parse_args())))
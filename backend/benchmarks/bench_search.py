@@ -0,0 +1,156 @@
+"""
+Fund search latency: the in-process search index vs. the SQL LIKE search.
+
+Generates a synthetic fund universe and builds the search index with
+database/search_index.py. It loads the index the way a worker does, and loads
+the same funds into an in-memory SQLite database with the migration indexes.
+It then times a mix of searches both ways. SQL runs the LIKE query of the
+chat tool's fallback path, so it has no similarity search and no typo
+tolerance. Reports p50/p99 per query kind, index build time, load time and size.
+
+    python -m benchmarks.bench_search --funds 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.common import BACKEND_DIR, percentile
+from benchmarks.sample_fund_db import ASSET_CLASSES
+from src.fund_search import FundSearchIndex
+
+# After the backend modules, so database/main.py and config.py do not shadow them
+sys.path.append(os.path.join(os.path.dirname(BACKEND_DIR), "database"))
+from search_index import build_search_index  # noqa: E402
+
+THEMES = ["Dividend", "Growth", "Value", "Sustainable", "ESG Leaders", "Income", "Opportunities", "Select",
+          "Quality", "Small Cap", "Innovation", "Climate Transition", "Short Duration", "Flexible", "Core"]
+REGIONS = ["Global", "European", "US", "Asian", "Japan", "Emerging Markets", "Euro", "Nordic", "China", "World"]
+SHARE_CLASSES = ["A Acc", "A Dis", "I Acc", "R Acc EUR Hedged", "Z Acc"]
+
+QUERIES = {
+    "text": ["global dividend equity", "emerging market bond", "sustainable innovation",
+             "short duration income", "japan small cap", "climate transition"],
+    "typo": ["sustainible infrastructure", "emergin market", "dividnd growth"],
+    "text+filter": [("european value", {"currency": "EUR"}), ("income", {"asset_class": "Fixed Income", "risk_max": 3})],
+    "filter": [({"asset_class": "Equity", "risk_min": 5}), ({"category": "Global Bonds"})],
+}
+
+
+def synthetic_overview(funds: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(funds):
+        asset_class = rng.choice(list(ASSET_CLASSES))
+        categories, objective, benchmark, _, (risk_lo, risk_hi) = ASSET_CLASSES[asset_class]
+        category = rng.choice(categories)
+        company = f"Asset Manager {i % 400}"
+        theme, region = rng.choice(THEMES), rng.choice(REGIONS)
+        rows.append({
+            "isin": f"LU{i:09d}{i % 10}",
+            "name": f"{company} {region} {theme} {category} {rng.choice(SHARE_CLASSES)}",
+            "fund_company": company,
+            "asset_class": asset_class,
+            "subasset_class": None,
+            "category": category,
+            "risk_reward_indicator": rng.randint(risk_lo, risk_hi),
+            "fund_benchmark": benchmark,
+            "investment_objective": f"The fund aims to provide {objective}, with a focus on {region.lower()} "
+                                    f"{theme.lower()} opportunities.",
+            "fund_aum": round(rng.uniform(1e6, 5e9), 2),
+            "aum_currency": rng.choice(["EUR", "USD", "GBP", "CHF"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def sql_search(conn, query=None, asset_class=None, category=None, currency=None, risk_min=None, risk_max=None, limit=10):
+    """The chat tool's SQL fallback, in SQLite syntax"""
+    where, params = [], []
+    if query:
+        where.append("(name LIKE ? OR fund_company LIKE ?)")
+        params += [f"%{query}%", f"%{query}%"]
+    for column, value in (("asset_class", asset_class), ("category", category), ("aum_currency", currency)):
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if risk_min is not None:
+        where.append("risk_reward_indicator >= ?")
+        params.append(risk_min)
+    if risk_max is not None:
+        where.append("risk_reward_indicator <= ?")
+        params.append(risk_max)
+    sql = "SELECT isin, name, fund_company, asset_class, category, risk_reward_indicator, fund_aum, aum_currency FROM fund_overview"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " ORDER BY fund_aum DESC LIMIT ?", params + [limit]).fetchall()
+
+
+def calls(kind: str, isins: list):
+    """(query, filters) pairs of one query kind"""
+    if kind == "similar":
+        return [(None, {"similar_to": isin}) for isin in isins]
+    if kind == "filter":
+        return [(None, filters) for filters in QUERIES[kind]]
+    if kind == "text+filter":
+        return QUERIES[kind]
+    return [(q, {}) for q in QUERIES[kind]]
+
+
+def timed(fn, repeats: int) -> list:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(args) -> int:
+    df = synthetic_overview(args.funds)
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        path = build_search_index(root, df, dim=args.dim)
+        build_seconds = time.perf_counter() - started
+        size_mib = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2 ** 20
+
+        started = time.perf_counter()
+        index = FundSearchIndex(root)
+        index.refresh()
+        load_ms = (time.perf_counter() - started) * 1000
+
+        conn = sqlite3.connect(":memory:")
+        df.to_sql("fund_overview", conn, index=False)
+        for column in ("asset_class, category", "category", "risk_reward_indicator", "fund_aum"):
+            conn.execute(f"CREATE INDEX idx_{column.replace(', ', '_')} ON fund_overview ({column})")
+
+        rng = random.Random(1)
+        similar = rng.sample(df["isin"].tolist(), 5)
+        print(f"{args.funds:,} funds: index built in {build_seconds:.1f}s, {size_mib:.1f} MiB, loaded in {load_ms:.0f} ms")
+        print(f"{'kind':>12} {'index p50':>10} {'p99':>7} {'sql p50':>9} {'p99':>8} {'hits':>5}")
+        for kind in ("text", "typo", "text+filter", "filter", "similar"):
+            index_times, sql_times, hits = [], [], 0
+            for query, filters in calls(kind, similar):
+                hits += len(index.search(query, limit=10, **filters)) > 0
+                index_times += timed(lambda: index.search(query, limit=10, **filters), args.repeats)
+                if "similar_to" not in filters:
+                    sql_times += timed(lambda: sql_search(conn, query, **filters), max(1, args.repeats // 10))
+            sql_p50 = f"{percentile(sql_times, 50) * 1000:>9.2f}" if sql_times else f"{'-':>9}"
+            sql_p99 = f"{percentile(sql_times, 99) * 1000:>8.2f}" if sql_times else f"{'-':>8}"
+            total = len(calls(kind, similar))
+            print(f"{kind:>12} {percentile(index_times, 50) * 1000:>10.2f} {percentile(index_times, 99) * 1000:>7.2f} "
+                  f"{sql_p50} {sql_p99} {hits:>2}/{total}")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--funds", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=128)
+    sys.exit(main(parser.parse_args()))
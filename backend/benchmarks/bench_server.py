@@ -0,0 +1,236 @@
+"""
+Production server benchmark and graceful-restart check.
+
+Starts the fake LLM and the backend under gunicorn (``gunicorn.conf.py``) and
+reports, for each worker count, with and without the import preload:
+
+- startup time until the first worker serves ``/health`` and until every
+  worker has finished its application startup
+- RSS, PSS and private memory of the master and of each worker (PSS counts
+  shared pages fractionally, so it shows what the preload saves)
+
+It then checks that restarts lose no stream:
+
+- rolling restart: streams are in flight when the master gets SIGHUP, and new
+  streams keep arriving while the workers are replaced
+- shutdown: streams are in flight when the master gets SIGTERM
+
+Every stream must end with its ``finish`` frame and carry all tokens. The
+script exits non-zero otherwise.
+
+    python -m benchmarks.bench_server --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, CHAT_BODY, fake_tokens, free_port, parse_frame, start_server, stop_servers, wait_until_up
+
+READY_LINE = "Application startup complete"
+
+
+class GunicornProcess:
+    """gunicorn master process, with its log lines timestamped as they arrive"""
+
+    def __init__(self, port: int, workers: int, env: dict):
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+            cwd=BACKEND_DIR,
+            env={**os.environ, **env, "PORT": str(port), "HOST": "127.0.0.1", "WEB_CONCURRENCY": str(workers)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        self.lines = []
+        threading.Thread(target=self._read_log, daemon=True).start()
+
+    def _read_log(self):
+        for line in self.proc.stderr:
+            self.lines.append((time.perf_counter(), line))
+
+    def ready_times(self) -> list:
+        return [t - self.started for t, line in list(self.lines) if READY_LINE in line]
+
+    async def wait_ready(self, count: int, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while len(self.ready_times()) < count:
+            if time.monotonic() > deadline or self.proc.poll() is not None:
+                raise RuntimeError("gunicorn workers did not start:\n" + "".join(line for _, line in self.lines[-20:]))
+            await asyncio.sleep(0.02)
+
+    def worker_pids(self) -> list:
+        with open(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children") as f:
+            return [int(pid) for pid in f.read().split()]
+
+    def signal(self, sig):
+        self.proc.send_signal(sig)
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+        self.proc.wait()
+
+
+def memory_kib(pid: int) -> dict:
+    """Rss, Pss and private (unshared) memory of a process in KiB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+async def measure_startup(port: int, workers: int, preload: bool, env: dict) -> dict:
+    server = GunicornProcess(port, workers, {**env, "SERVER_PRELOAD_IMPORTS": "true" if preload else "false"})
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        await wait_until_up(url)
+        first = time.perf_counter() - server.started
+        await server.wait_ready(workers)
+        all_ready = max(server.ready_times())
+        # Warm every worker a little so the numbers reflect a serving process
+        async with httpx.AsyncClient() as http:
+            await asyncio.gather(*[http.get(url) for _ in range(workers * 8)])
+        master = memory_kib(server.proc.pid)
+        per_worker = [memory_kib(pid) for pid in server.worker_pids()]
+    finally:
+        server.stop()
+    return {
+        "workers": workers,
+        "preload": preload,
+        "first_ready_s": first,
+        "all_ready_s": all_ready,
+        "master": master,
+        "worker_rss_kib": sum(m["rss"] for m in per_worker) / len(per_worker),
+        "worker_pss_kib": sum(m["pss"] for m in per_worker) / len(per_worker),
+        "worker_private_kib": sum(m["private"] for m in per_worker) / len(per_worker),
+        "total_pss_kib": master["pss"] + sum(m["pss"] for m in per_worker),
+    }
+
+
+async def one_stream(http: httpx.AsyncClient, url: str, tokens: int) -> str:
+    """Run one stream; return "ok" or what went wrong"""
+    deltas = 0
+    try:
+        async with http.stream("POST", url + "/api/chat/stream", json=CHAT_BODY) as response:
+            if response.status_code != 200:
+                return f"status {response.status_code}"
+            async for line in response.aiter_lines():
+                event = parse_frame(line)
+                if event is None:
+                    continue
+                if event["type"] == "text-delta":
+                    deltas += fake_tokens(event["textDelta"])
+                elif event["type"] == "error":
+                    return f"error frame: {event['error']}"
+                elif event["type"] == "finish":
+                    return "ok" if deltas == tokens else f"{deltas}/{tokens} tokens"
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__} after {deltas} tokens"
+    return f"cut off after {deltas} tokens"
+
+
+async def check_restart(port: int, workers: int, sig, streams: int, tokens: int, stream_seconds: float, env: dict) -> dict:
+    """Send `sig` to the master while `streams` streams are in flight; count streams that did not complete"""
+    server = GunicornProcess(port, workers, env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_up(url + "/health")
+        await server.wait_ready(workers)
+        async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=None)) as http:
+            in_flight = [asyncio.create_task(one_stream(http, url, tokens)) for _ in range(streams)]
+            # Restart once every stream is past its first tokens
+            await asyncio.sleep(min(1.0, stream_seconds / 3))
+            restarted = time.perf_counter()
+            server.signal(sig)
+            late = []
+            if sig == signal.SIGHUP:
+                # Clients keep arriving while the old workers drain and new ones boot
+                while time.perf_counter() - restarted < stream_seconds:
+                    late.append(asyncio.create_task(one_stream(http, url, tokens)))
+                    await asyncio.sleep(0.1)
+            results = await asyncio.gather(*in_flight, *late)
+        if sig == signal.SIGHUP:
+            await server.wait_ready(workers * 2)
+        else:
+            server.proc.wait(timeout=60)
+        drain = time.perf_counter() - restarted
+    finally:
+        server.stop()
+    failures = [r for r in results if r != "ok"]
+    return {
+        "signal": signal.Signals(sig).name,
+        "streams": len(results),
+        "lost": len(failures),
+        "failures": sorted(set(failures)),
+        "seconds": drain,
+    }
+
+
+async def main(args) -> int:
+    llm_port = free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    fake_llm = start_server("benchmarks.fake_llm:app", llm_port, {
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKEN_RATE": str(args.token_rate),
+        "FAKE_LLM_FIRST_TOKEN_DELAY": "0.1",
+    })
+    env = {
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OPENAI_MAX_RETRIES": "0",
+        # Every stream must reach the upstream, so nothing is answered from shared state
+        "RESPONSE_CACHE_ENABLED": "false",
+        "CHAT_COALESCING_ENABLED": "false",
+        "LOG_SAMPLE_RATE": "0",
+        # Several workers need sessions they all can read
+        "SESSION_BACKEND": "file",
+        "SESSION_DIR": os.path.join(tempfile.gettempdir(), f"bench-server-sessions-{os.getpid()}"),
+    }
+    failed = False
+    try:
+        await wait_until_up(f"{llm_url}/stats")
+
+        print(f"{'workers':>7} {'preload':>7} {'first ready s':>13} {'all ready s':>11} "
+              f"{'worker RSS MiB':>14} {'PSS':>6} {'private':>7} {'total PSS MiB':>13}")
+        for workers in args.workers:
+            for preload in (False, True):
+                r = await measure_startup(free_port(), workers, preload, env)
+                print(f"{r['workers']:>7} {str(r['preload']):>7} {r['first_ready_s']:>13.2f} {r['all_ready_s']:>11.2f} "
+                      f"{r['worker_rss_kib'] / 1024:>14.1f} {r['worker_pss_kib'] / 1024:>6.1f} "
+                      f"{r['worker_private_kib'] / 1024:>7.1f} {r['total_pss_kib'] / 1024:>13.1f}")
+
+        stream_seconds = args.tokens / args.token_rate
+        print()
+        for sig in (signal.SIGHUP, signal.SIGTERM):
+            r = await check_restart(free_port(), max(args.workers), sig, args.streams, args.tokens, stream_seconds, env)
+            status = "ok" if not r["lost"] else "LOST STREAMS " + ", ".join(r["failures"])
+            print(f"{r['signal']}: {r['streams']} streams, {r['lost']} lost, done after {r['seconds']:.1f}s - {status}")
+            failed = failed or r["lost"] > 0
+    finally:
+        stop_servers(fake_llm)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--streams", type=int, default=32, help="streams in flight when the signal is sent")
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--token-rate", type=float, default=20)
+    sys.exit(asyncio.run(main(parser.parse_args())))
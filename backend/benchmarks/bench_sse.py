@@ -0,0 +1,128 @@
+"""
+CPU cost per streamed token on /api/chat/stream.
+
+Starts the fake LLM streaming fast and the backend as a separate process, runs
+concurrent streams and reads the backend's user+system CPU time from /proc
+before and after. Reports, per scenario:
+
+- CPU milliseconds per 1000 streamed tokens
+- frames and bytes per stream
+- the tokens actually received, as a check
+
+Scenarios differ only in the backend's environment:
+
+- ``unbatched``: deltas are never held (``STREAM_BATCH_INTERVAL_MS=0``); those already
+  buffered when a stream wakes still go out as one frame
+- ``batched``: deltas merged for up to 20 ms / 64 bytes (the default)
+
+To compare against another revision, check it out elsewhere and point
+``--backend-dir`` at its ``backend`` directory:
+
+    git worktree add /tmp/before <rev>
+    python -m benchmarks.bench_sse --backend-dir /tmp/before/backend --scenarios unbatched
+    python -m benchmarks.bench_sse
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, CHAT_BODY, fake_tokens, free_port, parse_frame, start_server, stop_servers, wait_until_up
+
+SCENARIOS = {
+    "unbatched": {"STREAM_BATCH_INTERVAL_MS": "0"},
+    "batched": {"STREAM_BATCH_INTERVAL_MS": "20", "STREAM_BATCH_BYTES": "64"},
+}
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        # The command name may contain spaces; the fields after it are fixed
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def one_stream(http: httpx.AsyncClient, url: str) -> dict:
+    frames = size = tokens = 0
+    headers = {"Accept": "text/event-stream"}
+    async with http.stream("POST", url + "/api/chat/stream", json=CHAT_BODY, headers=headers) as response:
+        async for line in response.aiter_lines():
+            size += len(line) + 1
+            event = parse_frame(line)
+            if event is not None:
+                frames += 1
+                if event["type"] == "text-delta":
+                    tokens += fake_tokens(event["textDelta"])
+    return {"frames": frames, "bytes": size, "tokens": tokens}
+
+
+async def run_scenario(name: str, args, llm_url: str) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    backend = start_server("main:app", port, {
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "RESPONSE_CACHE_ENABLED": "false",
+        "CHAT_COALESCING_ENABLED": "false",
+        "CHAT_TOOLS_ENABLED": "false",
+        "LOG_SAMPLE_RATE": "0",
+        **SCENARIOS[name],
+    }, cwd=args.backend_dir)
+    try:
+        await wait_until_up(url + "/health")
+        limits = httpx.Limits(max_connections=args.streams)
+        async with httpx.AsyncClient(limits=limits, timeout=None) as http:
+            # Warm up imports, connection pools and caches before measuring
+            await asyncio.gather(*[one_stream(http, url) for _ in range(4)])
+            before = cpu_seconds(backend.pid)
+            results = []
+            for _ in range(args.rounds):
+                results += await asyncio.gather(*[one_stream(http, url) for _ in range(args.streams)])
+            cpu = cpu_seconds(backend.pid) - before
+    finally:
+        stop_servers(backend)
+    tokens = sum(r["tokens"] for r in results)
+    return {
+        "scenario": name,
+        "streams": len(results),
+        "tokens": tokens,
+        "cpu_ms_per_1k_tokens": cpu * 1000 / tokens * 1000 if tokens else float("nan"),
+        "frames_per_stream": sum(r["frames"] for r in results) / len(results),
+        "bytes_per_stream": sum(r["bytes"] for r in results) / len(results),
+    }
+
+
+async def main(args) -> int:
+    llm_port = free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    fake_llm = start_server("benchmarks.fake_llm:app", llm_port, {
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKEN_RATE": str(args.token_rate),
+        "FAKE_LLM_FIRST_TOKEN_DELAY": "0.05",
+    })
+    results = []
+    try:
+        await wait_until_up(f"{llm_url}/stats")
+        for name in args.scenarios:
+            results.append(await run_scenario(name, args, llm_url))
+    finally:
+        stop_servers(fake_llm)
+
+    print(f"{'scenario':>10} {'streams':>7} {'tokens':>8} {'CPU ms/1k tok':>13} {'frames/stream':>13} {'bytes/stream':>12}")
+    for r in results:
+        print(f"{r['scenario']:>10} {r['streams']:>7} {r['tokens']:>8} {r['cpu_ms_per_1k_tokens']:>13.1f} "
+              f"{r['frames_per_stream']:>13.1f} {r['bytes_per_stream']:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=["unbatched", "batched"])
+    parser.add_argument("--streams", type=int, default=32, help="concurrent streams per round")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-rate", type=float, default=200)
+    parser.add_argument("--backend-dir", default=BACKEND_DIR)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,70 @@
+"""Shared helpers for the benchmark scripts: process management and statistics."""
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_BODY = {"messages": [{"role": "user", "content": "How should I diversify a retirement portfolio?"}]}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app_path: str, port: int, env: dict, cwd: str = BACKEND_DIR) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def stop_servers(*procs: subprocess.Popen):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.wait()
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            try:
+                await http.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+
+def parse_frame(line: str) -> Optional[dict]:
+    """The JSON payload of an SSE ``data:`` line, or None for ids, comments and blank lines"""
+    if not line.startswith("data:"):
+        return None
+    return json.loads(line[len("data:"):])
+
+
+def fake_tokens(text: str) -> int:
+    """Tokens in streamed text from the fake LLM, which sends ``tok<i> `` per token (frames may carry several)"""
+    return len(text.split())
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile; returns nan for an empty list"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[rank]
@@ -0,0 +1,241 @@
+"""
+Fake OpenAI-compatible chat-completions server for local load testing.
+
+Speaks just enough of the ``/v1/chat/completions`` protocol (streaming and
+non-streaming) for the OpenAI SDK to talk to it, so the backend can be pointed
+at it with ``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+Behaviour is configurable through ``FAKE_LLM_*`` environment variables, the
+command line, or at runtime with ``POST /config``:
+
+- ``tokens``             tokens per answer
+- ``token_rate``         tokens per second once streaming has started
+- ``first_token_delay``  seconds before the first token (mean)
+- ``latency_jitter``     lognormal sigma applied to the first-token delay (0 = fixed)
+- ``error_rate``         fraction of requests rejected with ``error_status``
+- ``error_status``       HTTP status used for injected errors (e.g. 429, 500)
+- ``abort_rate``         fraction of streams cut off halfway through
+- ``tool_calls``         when the request offers tools, answer its first turn with this many
+                         calls to the first tool (0 = never call tools)
+
+Run it with:
+    python -m benchmarks.fake_llm --port 9100 --token-rate 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+config = {
+    "tokens": int(os.getenv("FAKE_LLM_TOKENS", "50")),
+    "token_rate": float(os.getenv("FAKE_LLM_TOKEN_RATE", "50")),
+    "first_token_delay": float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY", "0.2")),
+    "latency_jitter": float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0")),
+    "error_rate": float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+    "error_status": int(os.getenv("FAKE_LLM_ERROR_STATUS", "500")),
+    "abort_rate": float(os.getenv("FAKE_LLM_ABORT_RATE", "0")),
+    "tool_calls": int(os.getenv("FAKE_LLM_TOOL_CALLS", "0")),
+}
+
+app = FastAPI(title="Fake LLM", version="1.0.0")
+
+stats = {"requests": 0, "errors": 0, "aborts": 0, "in_flight": 0, "peak_in_flight": 0}
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _first_token_delay() -> float:
+    delay = config["first_token_delay"]
+    if config["latency_jitter"] > 0:
+        # Lognormal keeps the mean at first_token_delay while giving a long right tail
+        sigma = config["latency_jitter"]
+        delay *= random.lognormvariate(-sigma * sigma / 2, sigma)
+    return delay
+
+
+def _token_delay() -> float:
+    return 1.0 / config["token_rate"] if config["token_rate"] > 0 else 0.0
+
+
+def _enter():
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+
+def _leave():
+    stats["in_flight"] -= 1
+
+
+def _injected_error():
+    stats["errors"] += 1
+    return JSONResponse(
+        status_code=config["error_status"],
+        content={"error": {"message": "Injected fake LLM error", "type": "fake_error", "code": None}},
+    )
+
+
+def _requested_tool_calls(body: dict) -> list:
+    """Tool calls to answer with: only before any tool result is in the conversation"""
+    tools = body.get("tools") or []
+    if not tools or config["tool_calls"] <= 0 or body.get("tool_choice") == "none":
+        return []
+    if any(m.get("role") == "tool" for m in body.get("messages", [])):
+        return []
+    name = tools[0]["function"]["name"]
+    return [
+        {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": "{}"}}
+        for _ in range(config["tool_calls"])
+    ]
+
+
+async def _stream_tool_calls(completion_id: str, model: str, calls: list):
+    _enter()
+    try:
+        await asyncio.sleep(_first_token_delay())
+        yield _chunk(completion_id, model, {"role": "assistant", "content": None})
+        for i, call in enumerate(calls):
+            # id and name first, then the arguments as a separate fragment, like the real API
+            yield _chunk(completion_id, model, {"tool_calls": [
+                {"index": i, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}
+            ]})
+            yield _chunk(completion_id, model, {"tool_calls": [
+                {"index": i, "function": {"arguments": call["function"]["arguments"]}}
+            ]})
+        yield _chunk(completion_id, model, {}, finish_reason="tool_calls")
+        yield "data: [DONE]\n\n"
+    finally:
+        _leave()
+
+
+async def _stream(completion_id: str, model: str):
+    _enter()
+    try:
+        tokens = config["tokens"]
+        abort_at = tokens // 2 if random.random() < config["abort_rate"] else None
+        await asyncio.sleep(_first_token_delay())
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for i in range(tokens):
+            if i == abort_at:
+                stats["aborts"] += 1
+                raise RuntimeError("Injected fake LLM stream abort")
+            if i:
+                await asyncio.sleep(_token_delay())
+            yield _chunk(completion_id, model, {"content": f"tok{i} "})
+        yield _chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+    finally:
+        _leave()
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    try:
+        body = await request.json()
+    except ClientDisconnect:
+        # A hedged or cancelled request the client gave up on before sending its body
+        return Response(status_code=499)
+    model = body.get("model", "fake-model")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if random.random() < config["error_rate"]:
+        stats["requests"] += 1
+        return _injected_error()
+
+    tool_calls = _requested_tool_calls(body)
+    if body.get("stream"):
+        stream = _stream_tool_calls(completion_id, model, tool_calls) if tool_calls else _stream(completion_id, model)
+        return StreamingResponse(stream, media_type="text/event-stream")
+
+    _enter()
+    try:
+        if tool_calls:
+            await asyncio.sleep(_first_token_delay())
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": None, "tool_calls": tool_calls},
+                    "finish_reason": "tool_calls",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+
+        tokens = config["tokens"]
+        await asyncio.sleep(_first_token_delay() + _token_delay() * max(tokens - 1, 0))
+        content = "".join(f"tok{i} " for i in range(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": tokens,
+                "total_tokens": tokens,
+            },
+        }
+    finally:
+        _leave()
+
+
+@app.get("/config")
+async def get_config():
+    return config
+
+
+@app.post("/config")
+async def update_config(request: Request):
+    updates = await request.json()
+    for key, value in updates.items():
+        if key in config:
+            config[key] = type(config[key])(value)
+    return config
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    stats.update(requests=0, errors=0, aborts=0, peak_in_flight=stats["in_flight"])
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for key, value in config.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    config.update({key: getattr(args, key) for key in config})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,50 @@
+"""
+The backend app with an event-loop lag probe attached, for benchmarking.
+
+Serves exactly the same routes as ``main:app`` plus ``/bench/loop-lag``, which
+reports how late a periodic ``asyncio.sleep`` wakes up on the server's event
+loop. Anything that blocks the loop (synchronous I/O, heavy serialization)
+shows up directly as lag.
+
+    uvicorn benchmarks.instrumented_app:app
+"""
+import asyncio
+from collections import deque
+
+from benchmarks.common import percentile
+from main import app
+
+PROBE_INTERVAL = 0.01
+
+lag_samples = deque(maxlen=100_000)
+probe_task = None
+
+
+async def _probe():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lag_samples.append(max(0.0, loop.time() - started - PROBE_INTERVAL))
+
+
+@app.post("/bench/loop-lag/reset")
+async def reset_loop_lag():
+    global probe_task
+    if probe_task is None:
+        probe_task = asyncio.create_task(_probe())
+    lag_samples.clear()
+    return {"status": "reset"}
+
+
+@app.get("/bench/loop-lag")
+async def get_loop_lag():
+    samples = list(lag_samples)
+    if not samples:
+        return {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "samples": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
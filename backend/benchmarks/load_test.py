@@ -0,0 +1,88 @@
+"""
+Concurrency load test for /api/chat/stream against the local fake LLM.
+
+Starts the fake LLM and the backend as separate uvicorn processes, then fires
+batches of concurrent streaming requests and reports how wall-clock time scales
+with concurrency. With a non-blocking backend the wall time of N concurrent
+streams stays close to the time of a single stream; a blocking backend grows
+linearly with N.
+
+Run from the backend directory:
+    python -m benchmarks.load_test --concurrency 1 10 50 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import CHAT_BODY, fake_tokens, free_port, parse_frame, start_server, stop_servers, wait_until_up
+
+
+async def one_stream(http: httpx.AsyncClient, url: str) -> int:
+    """Consume a full streaming response, returning the number of tokens received"""
+    tokens = 0
+    async with http.stream("POST", url, json=CHAT_BODY) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = parse_frame(line)
+            if event is not None and event["type"] == "text-delta":
+                tokens += fake_tokens(event["textDelta"])
+    return tokens
+
+
+async def run_batch(backend_url: str, concurrency: int) -> tuple:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as http:
+        started = time.perf_counter()
+        tokens = await asyncio.gather(*[one_stream(http, f"{backend_url}/api/chat/stream") for _ in range(concurrency)])
+        return time.perf_counter() - started, tokens
+
+
+async def main(args):
+    llm_port, backend_port = free_port(), free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+
+    fake_llm = start_server("benchmarks.fake_llm:app", llm_port, {
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(args.first_token_delay),
+        "FAKE_LLM_TOKEN_RATE": str(args.token_rate),
+    })
+    backend = start_server("main:app", backend_port, {
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "MAX_CONCURRENT_UPSTREAM": str(max(args.concurrency)),
+        # Every stream must reach the upstream: identical prompts would otherwise be
+        # answered from the cache or coalesced into one upstream call
+        "RESPONSE_CACHE_ENABLED": "false",
+        "CHAT_COALESCING_ENABLED": "false",
+    })
+    try:
+        await wait_until_up(f"{llm_url}/stats")
+        await wait_until_up(f"{backend_url}/health")
+
+        baseline = None
+        print(f"{'concurrency':>11} {'wall s':>8} {'serial s':>9} {'speedup':>8} {'upstream peak':>14}")
+        async with httpx.AsyncClient() as http:
+            for concurrency in args.concurrency:
+                await http.post(f"{llm_url}/stats/reset")
+                wall, tokens = await run_batch(backend_url, concurrency)
+                if any(count != args.tokens for count in tokens):
+                    print(f"  warning: incomplete streams at concurrency {concurrency}: {sorted(set(tokens))}")
+                if baseline is None:
+                    baseline = wall / concurrency
+                serial = baseline * concurrency
+                peak = (await http.get(f"{llm_url}/stats")).json()["peak_in_flight"]
+                print(f"{concurrency:>11} {wall:>8.2f} {serial:>9.2f} {serial / wall:>7.1f}x {peak:>14}")
+    finally:
+        stop_servers(backend, fake_llm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Build a synthetic SQLite stand-in for the ``fund_data`` database.
+
+Mirrors the fund_overview / nav / performance tables of the database/sql/migrations schema
+with random but plausible data, so the fund endpoints can be exercised without
+MySQL:
+
+    python -m benchmarks.sample_fund_db fund_data.sqlite3 --funds 500 --years 10
+    FUND_DB_BACKEND=sqlite FUND_DB_SQLITE_PATH=fund_data.sqlite3 uvicorn main:app
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+SCHEMA = """
+CREATE TABLE fund_overview (
+    isin TEXT PRIMARY KEY, name TEXT, fund_company TEXT, asset_class TEXT, subasset_class TEXT,
+    category TEXT, inception_date TEXT, risk_reward_indicator INTEGER, fund_benchmark TEXT,
+    investment_objective TEXT, fund_aum REAL, nav REAL, aum_currency TEXT
+);
+CREATE TABLE nav (isin TEXT, date TEXT, close REAL, PRIMARY KEY (isin, date));
+CREATE TABLE performance (
+    isin TEXT PRIMARY KEY, inception REAL, one_day REAL, one_week REAL, one_month REAL,
+    three_months REAL, six_months REAL, one_year REAL, two_years REAL, three_years REAL,
+    five_years REAL, ten_years REAL
+);
+CREATE INDEX idx_fund_overview_asset_class_category ON fund_overview (asset_class, category);
+CREATE INDEX idx_fund_overview_category ON fund_overview (category);
+CREATE INDEX idx_fund_overview_risk ON fund_overview (risk_reward_indicator);
+CREATE INDEX idx_fund_overview_aum ON fund_overview (fund_aum);
+CREATE INDEX idx_nav_date ON nav (date);
+"""
+
+# asset class -> (categories, objective, benchmark, daily volatility, risk indicator range)
+ASSET_CLASSES = {
+    "Equity": (
+        ["Global Equity", "US Large Cap", "Emerging Markets Equity", "Technology Sector", "European Equity"],
+        "long-term capital growth by investing in the shares of companies",
+        "MSCI World", 0.012, (4, 7),
+    ),
+    "Fixed Income": (
+        ["Global Bonds", "EUR Corporate Bonds", "High Yield Bonds", "Government Bonds"],
+        "income and capital preservation by investing in investment grade bonds",
+        "Bloomberg Global Aggregate", 0.004, (2, 4),
+    ),
+    "Mixed Assets": (
+        ["Balanced Allocation", "Cautious Allocation", "Aggressive Allocation"],
+        "a balance of growth and income through a diversified multi-asset portfolio",
+        "50% MSCI World / 50% Bloomberg Global Aggregate", 0.007, (3, 5),
+    ),
+    "Money Market": (
+        ["EUR Money Market", "USD Money Market"],
+        "liquidity and capital preservation through short-term money market instruments",
+        "ESTR", 0.0005, (1, 1),
+    ),
+}
+
+
+def build(path: str, funds: int, years: int, seed: int = 0):
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    business_days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    business_days = [d.isoformat() for d in business_days if d.weekday() < 5]
+
+    for i in range(funds):
+        asset_class = rng.choice(list(ASSET_CLASSES))
+        categories, objective, benchmark, vol, (risk_lo, risk_hi) = ASSET_CLASSES[asset_class]
+        category = rng.choice(categories)
+        isin = f"LU{i:010d}"
+        conn.execute(
+            "INSERT INTO fund_overview VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (isin, f"{category} Fund {i}", f"Asset Manager {i % 25}", asset_class, None, category,
+             start.isoformat(), rng.randint(risk_lo, risk_hi), benchmark,
+             f"The fund aims to provide {objective}.", round(rng.uniform(1e7, 5e9), 2), None,
+             rng.choice(["EUR", "USD", "GBP"])),
+        )
+        drift, value, closes = rng.gauss(0.0002, 0.0002), 100.0, []
+        for day in business_days:
+            value *= 1 + rng.gauss(drift, vol)
+            closes.append((isin, day, round(value, 4)))
+        conn.executemany("INSERT INTO nav VALUES (?,?,?)", closes)
+        conn.execute("UPDATE fund_overview SET nav = ? WHERE isin = ?", (closes[-1][2], isin))
+        conn.execute("INSERT INTO performance VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                     (isin, *[round(rng.uniform(-0.2, 0.5), 4) for _ in range(11)]))
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--funds", type=int, default=200)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    build(args.path, args.funds, args.years, args.seed)
+    print(f"Wrote {args.funds} synthetic funds to {args.path}")
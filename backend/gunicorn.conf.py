@@ -0,0 +1,82 @@
+"""
+Production server: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- One worker per core by default (``WEB_CONCURRENCY``). Every worker imports
+  ``main`` itself, so the OpenAI client, its connection pool, the upstream
+  semaphore and the caches are per worker.
+- Sessions are shared across workers through ``SESSION_BACKEND=file``, the
+  default here (``SESSION_DIR`` must be on storage every worker can reach).
+  An explicit ``SESSION_BACKEND=memory`` runs a single worker and refuses
+  ``WEB_CONCURRENCY`` > 1.
+- Resumable streams (``/api/streams/{id}``) and stream coalescing stay per
+  worker. Behind a load balancer, route a client's requests to the same
+  worker (sticky routing) so a dropped stream can be resumed. A resume that
+  reaches another worker gets a 404 and the client sends the turn again.
+- Heavy third-party packages are imported once here in the master and
+  inherited by the forked workers. Workers boot faster and share those pages.
+  The app itself is not preloaded, so nothing that holds connections or event
+  loop state is created before the fork.
+- On SIGTERM a worker stops accepting connections and lets in-flight SSE
+  streams finish, for up to ``GRACEFUL_TIMEOUT`` seconds, before it exits.
+  ``kill -HUP <master>`` is a rolling restart: new workers start, then the
+  old ones drain.
+- Prometheus samples go to ``PROMETHEUS_MULTIPROC_DIR``, so ``/metrics``
+  served by any worker covers all of them.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+# Set in the master so the forked workers inherit it
+session_backend = os.environ.setdefault("SESSION_BACKEND", "file").lower()
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() if session_backend == "file" else 1)))
+if workers > 1 and session_backend != "file":
+    # A turn landing on a worker that does not hold the session would get a 404
+    raise RuntimeError(
+        f"WEB_CONCURRENCY={workers} needs SESSION_BACKEND=file: in-memory sessions are not shared between workers"
+    )
+worker_class = "uvicorn_worker.UvicornWorker"
+# Longer than the slowest complete answer, so a restart never cuts a stream short
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "120"))
+# Heartbeat timeout; uvicorn workers keep notifying while they stream
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"neuralfin-metrics-{os.getpid()}")
+)
+
+if os.getenv("SERVER_PRELOAD_IMPORTS", "true").lower() == "true":
+    import fastapi  # noqa: F401
+    import httpx  # noqa: F401
+    import numpy  # noqa: F401
+    import openai  # noqa: F401
+    import prometheus_client  # noqa: F401
+    import pydantic  # noqa: F401
+    import uvicorn  # noqa: F401
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be summed into this one
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Drop the exited worker from the live gauges; its counters keep counting
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
@@ -1,17 +1,59 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+import asyncio
 import os
-import json
+import time
 from dotenv import load_dotenv
+from src.response_cache import ResponseCache, replay_chunks
+from src.coalesce import Flight, StreamCoalescer
+from src.sse import EVENT_STREAM, HEARTBEAT, encode_batch, frame, parse_event_id
+from src.model_router import create_model_router_from_env
+from src.fund_api import router as fund_router, close_reader_pool
+from src.nav_store import init_nav_store_from_env, refresh_nav_store_periodically
+from src.fund_search import init_fund_search_from_env, refresh_fund_search_periodically
+from src.portfolio import get_portfolio_optimizer, init_portfolio_optimizer
+from src.history import CompactionResult, HistoryManager, TokenCounter, format_transcript
+from src.sessions import create_session_store_from_env
+from src.observability import (
+    ChatSpan, MetricsMiddleware, STREAMS_IN_FLIGHT, UPSTREAM_IN_FLIGHT, log_error, log_event, metrics_payload, request_start,
+)
+from src.chat_tools import TOOL_SPECS, ToolCallAccumulator, ToolResultCache, ToolRunner, assistant_tool_message
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="NEURALFIN.AI Backend", version="1.0.0")
+# Seconds between checks for a new NAV snapshot published by the ingestion job
+NAV_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("NAV_SNAPSHOT_REFRESH_SECONDS", "60"))
+# Seconds between checks for a new fund search index published by the ingestion job
+FUND_SEARCH_REFRESH_SECONDS = float(os.getenv("FUND_SEARCH_REFRESH_SECONDS", "60"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Memory-mapped NAV snapshot (NAV_SNAPSHOT_DIR); NAV reads fall back to the database without it
+    nav_store = init_nav_store_from_env()
+    refresh_tasks = []
+    if nav_store is not None:
+        refresh_tasks.append(asyncio.create_task(refresh_nav_store_periodically(nav_store, NAV_SNAPSHOT_REFRESH_SECONDS)))
+    # Fund search index (FUND_SEARCH_INDEX_DIR); search_funds falls back to SQL without it
+    fund_search = init_fund_search_from_env()
+    if fund_search is not None:
+        refresh_tasks.append(asyncio.create_task(refresh_fund_search_periodically(fund_search, FUND_SEARCH_REFRESH_SECONDS)))
+    yield
+    for task in refresh_tasks:
+        task.cancel()
+    # The fund data reader pool is created lazily on first use; close it if it was
+    await close_reader_pool()
+
+app = FastAPI(title="NEURALFIN.AI Backend", version="1.0.0", lifespan=lifespan)
+
+# HTTP request counts/latency per route for /metrics (pure ASGI, safe for streaming)
+app.add_middleware(MetricsMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -22,8 +64,145 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Upstream concurrency: how many OpenAI calls this process keeps in flight at once,
+# and how long a request may wait for a free slot before we give up.
+MAX_CONCURRENT_UPSTREAM = int(os.getenv("MAX_CONCURRENT_UPSTREAM", "256"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30"))
+# How often (seconds) we poll for a client disconnect while waiting on the upstream
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# Initialize async OpenAI client (OPENAI_BASE_URL may point at a local fake for load tests)
+client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONCURRENT_UPSTREAM,
+            max_keepalive_connections=MAX_CONCURRENT_UPSTREAM,
+        ),
+    ),
+)
+upstream_slots = asyncio.Semaphore(MAX_CONCURRENT_UPSTREAM)
+SERVER_BUSY = "Server is busy, please try again shortly."
+
+# Identical streaming conversations in flight at the same time share one upstream call
+COALESCING_ENABLED = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+# Streams stay resumable (GET /api/streams/{id} with Last-Event-ID) for STREAM_REPLAY_TTL seconds after
+# they finish; an abandoned stream keeps generating for STREAM_RESUME_GRACE seconds in case its client returns
+stream_coalescer = StreamCoalescer(
+    replay_ttl=float(os.getenv("STREAM_REPLAY_TTL", "60")),
+    max_replay_streams=int(os.getenv("STREAM_REPLAY_MAX_STREAMS", "1000")),
+    resume_grace=float(os.getenv("STREAM_RESUME_GRACE", "10")),
+)
+# Text deltas are merged into one frame for up to STREAM_BATCH_INTERVAL_MS or STREAM_BATCH_BYTES (0 = off)
+STREAM_BATCH_INTERVAL = float(os.getenv("STREAM_BATCH_INTERVAL_MS", "20")) / 1000
+STREAM_BATCH_BYTES = int(os.getenv("STREAM_BATCH_BYTES", "64"))
+# Comment frame sent on idle streams so proxies do not time them out (0 = off)
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Read-side fund data API (fund_data database, read-only reader user)
+app.include_router(fund_router)
+
+# Default model parameters of both chat endpoints (also part of the response cache key);
+# model router routes set their own model and may override the rest
+CHAT_PARAMS = {"model": "gpt-4", "max_tokens": 1000, "temperature": 0.7}
+
+# Model per request class (short / planning), per-model concurrency caps, failover and hedging;
+# configured by the MODEL_ROUTER_CONFIG JSON file, otherwise one route on the client above
+model_router = create_model_router_from_env(client, CHAT_PARAMS, MAX_CONCURRENT_UPSTREAM)
+
+# Response cache for repeated questions; the semantic tier embeds the final user question
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+async def embed_text(text: str) -> List[float]:
+    """Embed a question for the semantic cache tier"""
+    result = await client.embeddings.create(model=RESPONSE_CACHE_EMBEDDING_MODEL, input=text)
+    return result.data[0].embedding
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    embed=embed_text if RESPONSE_CACHE_SEMANTIC else None,
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95")),
+)
+
+# Fund lookup tools offered to the model; results are cached per conversation_id
+CHAT_TOOLS_ENABLED = os.getenv("CHAT_TOOLS_ENABLED", "true").lower() == "true"
+# Model turns that may call tools before the model must answer in text
+CHAT_TOOL_MAX_ROUNDS = int(os.getenv("CHAT_TOOL_MAX_ROUNDS", "3"))
+
+tool_runner = ToolRunner(
+    ToolResultCache(
+        max_conversations=int(os.getenv("CHAT_TOOL_CACHE_CONVERSATIONS", "1000")),
+        ttl_seconds=float(os.getenv("CHAT_TOOL_CACHE_TTL", "600")),
+    ),
+    timeout=float(os.getenv("CHAT_TOOL_TIMEOUT", "5")),
+    max_result_chars=int(os.getenv("CHAT_TOOL_MAX_RESULT_CHARS", "4000")),
+)
+
+# Portfolio optimizer (/api/portfolio/optimize and the optimize_portfolio tool): covariance models
+# are cached per NAV snapshot and universe up to PORTFOLIO_CACHE_MAX_BYTES
+init_portfolio_optimizer(
+    cache_max_bytes=int(os.getenv("PORTFOLIO_CACHE_MAX_BYTES", str(256 * 2 ** 20))),
+    # Days of NAV history the covariance is estimated from, unless a request sets lookback_days
+    lookback_days=int(os.getenv("PORTFOLIO_LOOKBACK_DAYS", "1095")),
+    # Largest universe one request may optimize over
+    max_funds=int(os.getenv("PORTFOLIO_MAX_FUNDS", "5000")),
+)
+
+# Conversation history compaction: older turns are folded into a rolling summary once the
+# prompt exceeds HISTORY_TOKEN_BUDGET (leave room for max_tokens within the model's context)
+HISTORY_COMPACTION_ENABLED = os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", CHAT_PARAMS["model"])
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+
+SUMMARY_PROMPT = """You condense financial advisory conversations. Write a concise summary of the conversation so far
+that preserves the client's goals, risk tolerance, investment horizon, holdings, constraints, funds discussed and any
+advice already given. Plain prose, no preamble."""
+
+async def summarize_history(previous: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    """Fold newly evicted turns into the previous summary"""
+    content = format_transcript(messages)
+    if previous:
+        content = f"Summary so far:\n{previous}\n\nNew turns:\n{content}"
+    response = await client.chat.completions.create(
+        model=HISTORY_SUMMARY_MODEL,
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}],
+        max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+        temperature=0,
+    )
+    return (response.choices[0].message.content or "").strip()
+
+history_manager = HistoryManager(
+    summarize_history,
+    TokenCounter(CHAT_PARAMS["model"]),
+    budget_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", "6000")),
+    min_recent_messages=int(os.getenv("HISTORY_MIN_RECENT_MESSAGES", "4")),
+    summary_max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+    summary_step=int(os.getenv("HISTORY_SUMMARY_STEP", "6")),
+    cache_size=int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1024")),
+)
+
+# Server-side conversation history for the session endpoints (SESSION_* settings)
+session_store = create_session_store_from_env()
+
+# System prompt for Sandra
+SYSTEM_PROMPT = """You are Sandra, a professional financial advisor from DL Family Office. You provide expert financial advice with a focus on:
+        - Portfolio management and asset allocation
+        - Retirement planning strategies
+        - Risk management and diversification
+        - Investment opportunities and market analysis
+        - Tax-efficient investing
+        - Estate planning considerations
+        
+        When asked about specific funds, look up their data with the available tools instead of relying on memory.
+        Keep your responses informative yet conversational. Always consider the user's risk tolerance and investment timeline when providing advice. Provide specific, actionable recommendations when possible."""
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client goes away before the upstream call finishes"""
 
 class Message(BaseModel):
     role: str
@@ -31,10 +210,22 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    # Client-chosen id that scopes the tool result cache to one conversation
+    conversation_id: Optional[str] = None
+
+class SessionCreateRequest(BaseModel):
+    # Optional history to seed the session with (e.g. when a session expired client-side)
+    messages: List[Message] = []
+
+class SessionTurn(BaseModel):
+    content: str
 
 class ChatResponse(BaseModel):
     content: str
     thinking_duration: float
+    cached: bool = False
+    # prompt_tokens / original_prompt_tokens / prompt_tokens_saved / summarized_messages
+    usage: Optional[Dict[str, int]] = None
 
 @app.get("/")
 async def root():
@@ -44,105 +235,449 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "neuralfin-ai-backend"}
 
-async def generate_streaming_response(messages: List[Dict[str, str]]):
-    """Generate streaming response from OpenAI"""
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters and occupancy"""
+    return {
+        "enabled": RESPONSE_CACHE_ENABLED,
+        "semantic": RESPONSE_CACHE_SEMANTIC,
+        **response_cache.snapshot(),
+        "tools": tool_runner.cache.snapshot(),
+        "history": {"enabled": HISTORY_COMPACTION_ENABLED, **history_manager.snapshot()},
+        "sessions": session_store.snapshot(),
+        "coalescing": stream_coalescer.snapshot(),
+        "router": model_router.snapshot(),
+        "portfolio": get_portfolio_optimizer().snapshot(),
+    }
+
+def preferred_route(openai_messages: List[Dict[str, str]]) -> str:
+    """Route a conversation goes to first; cached answers are keyed by its model and parameters"""
+    return model_router.candidates(model_router.classify(openai_messages))[0].name
+
+async def cache_lookup(openai_messages: List[Dict[str, str]]) -> Optional[str]:
+    """Return a cached answer, treating cache failures (e.g. embedding errors) as misses"""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
     try:
-        print("Generating streaming response for messages:", messages)  # Debug log
-        # System prompt for Sandra
-        system_prompt = """You are Sandra, a professional financial advisor from DL Family Office. You provide expert financial advice with a focus on:
-        - Portfolio management and asset allocation
-        - Retirement planning strategies
-        - Risk management and diversification
-        - Investment opportunities and market analysis
-        - Tax-efficient investing
-        - Estate planning considerations
-        
-        Keep your responses informative yet conversational. Always consider the user's risk tolerance and investment timeline when providing advice. Provide specific, actionable recommendations when possible."""
-        
-        # Prepare messages for OpenAI
-        openai_messages = [{"role": "system", "content": system_prompt}]
-        openai_messages.extend([{"role": msg["role"], "content": msg["content"]} for msg in messages])
-        
-        # Create streaming response using new API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=openai_messages,
-            stream=True,
-            max_tokens=1000,
-            temperature=0.7
+        params = model_router.route_params(preferred_route(openai_messages))
+        return await response_cache.get(openai_messages, params)
+    except Exception as e:
+        log_error("response_cache_read_failed", e)
+        return None
+
+async def cache_store(openai_messages: List[Dict[str, str]], content: str, route: Optional[str]):
+    """Cache an answer from the conversation's preferred route; failover and hedge answers are not cached"""
+    if not RESPONSE_CACHE_ENABLED or not content or route != preferred_route(openai_messages):
+        return
+    try:
+        await response_cache.put(openai_messages, model_router.route_params(route), content)
+    except Exception as e:
+        log_error("response_cache_write_failed", e)
+
+def build_openai_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Prepend the Sandra system prompt to the conversation"""
+    openai_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    openai_messages.extend([{"role": msg["role"], "content": msg["content"]} for msg in messages])
+    return openai_messages
+
+async def compact_history(openai_messages: List[Dict[str, str]]) -> CompactionResult:
+    """Fit the conversation into the token budget, logging what it saved"""
+    if not HISTORY_COMPACTION_ENABLED:
+        tokens = history_manager.counter.messages(openai_messages)
+        return CompactionResult(openai_messages, tokens, tokens)
+    compaction = await history_manager.compact(openai_messages)
+    if compaction.summarized_messages:
+        log_event("history_compacted", sampled=True, **compaction.usage())
+    return compaction
+
+def tool_params(round_index: int) -> Dict[str, Any]:
+    """Offer the tools until the round limit, then force a text answer"""
+    if not CHAT_TOOLS_ENABLED:
+        return {}
+    return {"tools": TOOL_SPECS, "tool_choice": "auto" if round_index < CHAT_TOOL_MAX_ROUNDS else "none"}
+
+def record_usage(span: ChatSpan, usage):
+    """Add the upstream's reported token usage to the span"""
+    if usage is not None:
+        span.prompt_tokens = (span.prompt_tokens or 0) + (usage.prompt_tokens or 0)
+        span.completion_tokens = (span.completion_tokens or 0) + (usage.completion_tokens or 0)
+
+async def complete_with_tools(openai_messages: List[Dict[str, Any]], conversation_id: Optional[str], span: ChatSpan):
+    """Non-streaming completion, executing tool calls until the model answers in text"""
+    conversation = list(openai_messages)
+    request_class = span.fields["request_class"] = model_router.classify(openai_messages)
+    for round_index in range(CHAT_TOOL_MAX_ROUNDS + 1):
+        span.mark("upstream_start")
+        span.fields["route"], response = await model_router.create(
+            request_class,
+            messages=conversation,
+            **tool_params(round_index),
         )
-        
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                # Format as Server-Sent Events
-                yield f"data: {json.dumps({'type': 'text-delta', 'textDelta': content})}\n\n"
-        
-        yield f"data: {json.dumps({'type': 'finish'})}\n\n"
-        
+        span.mark("upstream_headers")
+        record_usage(span, response.usage)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return response
+        calls = [{"id": c.id, "name": c.function.name, "arguments": c.function.arguments} for c in message.tool_calls]
+        span.fields["tool_calls"] = span.fields.get("tool_calls", 0) + len(calls)
+        conversation.append(assistant_tool_message(calls, message.content))
+        conversation.extend(await tool_runner.run(calls, conversation_id))
+    return response
+
+async def run_until_disconnect(http_request: Request, coro):
+    """Await an upstream call, cancelling it if the client goes away first"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let the cancellation unwind so the upstream connection is released
+            await asyncio.gather(task, return_exceptions=True)
+
+async def stream_answer(openai_messages: List[Dict[str, str]], conversation_id: Optional[str],
+                        span: ChatSpan, publish: Callable[[Dict[str, Any]], None]):
+    """Run the upstream call(s) for a conversation, publishing stream events to its subscribers"""
+    response = None
+    acquired = False
+    try:
+        try:
+            await asyncio.wait_for(upstream_slots.acquire(), timeout=UPSTREAM_QUEUE_TIMEOUT)
+            acquired = True
+            UPSTREAM_IN_FLIGHT.inc()
+        except asyncio.TimeoutError:
+            publish({'type': 'error', 'error': SERVER_BUSY})
+            return
+
+        # Older turns beyond the token budget are replaced by a summary; the response cache
+        # stays keyed on the full conversation.
+        compaction = await compact_history(openai_messages)
+        # Tool calls and their results only live in this request's copy of the conversation
+        conversation = list(compaction.messages)
+        answer_parts = []
+        upstream_usage = []
+        request_class = span.fields["request_class"] = model_router.classify(openai_messages)
+        for round_index in range(CHAT_TOOL_MAX_ROUNDS + 1):
+            # The router picks the model, fails over and hedges until a stream has started
+            span.mark("upstream_start")
+            span.fields["route"], response = await model_router.create(
+                request_class,
+                messages=conversation,
+                stream=True,
+                stream_options={"include_usage": True},
+                **tool_params(round_index),
+            )
+            span.mark("upstream_headers")
+
+            tool_calls = ToolCallAccumulator()
+            async for chunk in response:
+                if chunk.usage is not None:
+                    # The last chunk of each round reports exact usage
+                    upstream_usage.append(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.tool_calls:
+                    tool_calls.add(delta.tool_calls)
+                if delta.content:
+                    answer_parts.append(delta.content)
+                    publish({'type': 'text-delta', 'textDelta': delta.content})
+
+            await response.close()
+            response = None
+            if not tool_calls:
+                break
+
+            calls = tool_calls.calls()
+            span.fields["tool_calls"] = span.fields.get("tool_calls", 0) + len(calls)
+            for call in calls:
+                publish({'type': 'tool-call', 'toolName': call['name']})
+            conversation.append(assistant_tool_message(calls))
+            conversation.extend(await tool_runner.run(calls, conversation_id))
+
+        for usage in upstream_usage:
+            record_usage(span, usage)
+        if not upstream_usage:
+            span.prompt_tokens = compaction.prompt_tokens
+        publish({'type': 'finish', 'usage': compaction.usage()})
+        # Only complete answers are cached; errors and cancellation skip this
+        await cache_store(openai_messages, "".join(answer_parts), span.fields.get("route"))
+
+    except Exception as e:
+        span.error("stream", e)
+        publish({'type': 'error', 'error': str(e)})
+    finally:
+        # Closing the upstream stream aborts the OpenAI request when we stop early
+        # (every subscriber gone or task cancellation), so no tokens are generated for nobody.
+        if response is not None:
+            await response.close()
+        if acquired:
+            upstream_slots.release()
+            UPSTREAM_IN_FLIGHT.dec()
+
+async def follow_stream(flight: Flight, span: ChatSpan, http_request: Optional[Request] = None,
+                        after: int = -1, attach: bool = False, finished_outcome: str = "ok"):
+    """Send a flight's events after index ``after`` as batched SSE frames, with heartbeats while idle.
+
+    The caller has already joined the flight unless ``attach`` is set; it is left when the stream ends.
+    """
+    if attach:
+        stream_coalescer.attach(flight)
+    # Until we know better, the stream was abandoned (generator closed by the server)
+    outcome = "aborted"
+    STREAMS_IN_FLIGHT.inc()
+    last_disconnect_check = time.monotonic()
+    try:
+        async for last_index, events in flight.follow(after, STREAM_BATCH_INTERVAL, STREAM_BATCH_BYTES,
+                                                      STREAM_HEARTBEAT_SECONDS or None):
+            if http_request is not None and time.monotonic() - last_disconnect_check >= DISCONNECT_POLL_INTERVAL:
+                last_disconnect_check = time.monotonic()
+                if await http_request.is_disconnected():
+                    outcome = "disconnected"
+                    return
+            if not events:
+                # Keeps idle proxies from closing the connection while the model thinks or tools run
+                yield HEARTBEAT
+                continue
+
+            deltas = 0
+            for event in events:
+                if event['type'] == 'text-delta':
+                    deltas += 1
+                elif event['type'] == 'finish':
+                    outcome = finished_outcome
+                elif event['type'] == 'error':
+                    outcome = "busy" if event['error'] == SERVER_BUSY else "error"
+            if deltas:
+                span.token(deltas)
+            yield span.sent(encode_batch(flight.id, last_index, events))
     except Exception as e:
-        print("Error in generate_streaming_response:", str(e))  # Debug log
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        outcome = "error"
+        span.error("stream", e)
+        yield span.sent(frame({'type': 'error', 'error': str(e)}))
+    finally:
+        stream_coalescer.leave(flight)
+        STREAMS_IN_FLIGHT.dec()
+        span.finish(outcome)
+
+async def generate_streaming_response(messages: List[Dict[str, str]], http_request: Optional[Request] = None,
+                                      conversation_id: Optional[str] = None,
+                                      on_answer: Optional[Callable[[str], Awaitable[None]]] = None,
+                                      span: Optional[ChatSpan] = None):
+    """Generate streaming response from OpenAI; on_answer receives the complete answer text"""
+    span = span or ChatSpan("stream")
+    span.fields["messages"] = len(messages)
+    try:
+        openai_messages = build_openai_messages(messages)
+
+        cached = await cache_lookup(openai_messages)
+        if cached is not None:
+            # Replay the cached answer with the same framing as a live stream
+            span.completion_tokens = 0
+            events = [{'type': 'text-delta', 'textDelta': piece} for piece in replay_chunks(cached)]
+            flight = stream_coalescer.completed(events + [{'type': 'finish'}])
+            if on_answer is not None:
+                await on_answer(cached)
+            frames = follow_stream(flight, span, http_request, attach=True, finished_outcome="cached")
+        else:
+            # Identical conversations in flight share one upstream call; a late joiner first
+            # gets the events it missed. Tool results are cached under the leader's conversation_id.
+            key = ResponseCache.make_keys(openai_messages, CHAT_PARAMS)[0] if COALESCING_ENABLED else None
+            flight, leader = stream_coalescer.join(
+                key, lambda publish: stream_answer(openai_messages, conversation_id, span, publish)
+            )
+            span.coalesced = not leader
+            # Only complete answers are recorded, even if this client has dropped by then
+            if on_answer is not None:
+                flight.on_finish(on_answer)
+            frames = follow_stream(flight, span, http_request)
+    except Exception as e:
+        span.error("stream", e)
+        span.finish("error")
+        yield span.sent(frame({'type': 'error', 'error': str(e)}))
+        return
+
+    async for chunk in frames:
+        yield chunk
+
+def streaming_response(frames, http_request: Request) -> StreamingResponse:
+    """text/event-stream for clients that ask for it, text/plain (same framing) for older clients"""
+    media_type = EVENT_STREAM if EVENT_STREAM in http_request.headers.get("accept", "") else "text/plain"
+    return StreamingResponse(
+        frames,
+        media_type=media_type,
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            # Stop nginx-style proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 @app.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """Stream chat responses from OpenAI"""
+    span = ChatSpan("stream", request_start(http_request))
+    span.mark("parsed")
+    messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    return streaming_response(
+        generate_streaming_response(messages, http_request, request.conversation_id, span=span), http_request
+    )
+
+@app.get("/api/streams/{stream_id}")
+async def resume_stream(stream_id: str, http_request: Request, after: Optional[int] = None):
+    """Resume a dropped stream after the last event id received (Last-Event-ID header or ``after``)"""
+    span = ChatSpan("resume", request_start(http_request))
+    last_event = parse_event_id(http_request.headers.get("last-event-id"))
+    if last_event is not None:
+        if last_event[0] != stream_id:
+            raise HTTPException(status_code=400, detail="Last-Event-ID belongs to another stream")
+        after = last_event[1]
+    flight = stream_coalescer.get(stream_id)
+    if flight is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    # The tokens were already spent by the original request
+    span.coalesced = True
+    return streaming_response(
+        follow_stream(flight, span, http_request, -1 if after is None else after, attach=True), http_request
+    )
+
+async def complete_chat(messages: List[Dict[str, str]], http_request: Request, span: ChatSpan,
+                        conversation_id: Optional[str] = None) -> ChatResponse:
+    """Answer a conversation without streaming; raises HTTPException or ClientDisconnected"""
+    start_time = time.time()
+    span.fields["messages"] = len(messages)
+    openai_messages = build_openai_messages(messages)
+
+    cached = await cache_lookup(openai_messages)
+    if cached is not None:
+        return ChatResponse(content=cached, thinking_duration=time.time() - start_time, cached=True)
+
     try:
-        print("Received chat request:", request)  # Debug log
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        print("Processed messages:", messages)  # Debug log
-        
-        return StreamingResponse(
-            generate_streaming_response(messages),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/plain; charset=utf-8"
-            }
+        await asyncio.wait_for(upstream_slots.acquire(), timeout=UPSTREAM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail=SERVER_BUSY)
+
+    UPSTREAM_IN_FLIGHT.inc()
+    try:
+        compaction = await run_until_disconnect(http_request, compact_history(openai_messages))
+        # Get response from OpenAI using the async client
+        response = await run_until_disconnect(
+            http_request,
+            complete_with_tools(compaction.messages, conversation_id, span),
         )
+    finally:
+        upstream_slots.release()
+        UPSTREAM_IN_FLIGHT.dec()
+
+    thinking_duration = time.time() - start_time
+    content = response.choices[0].message.content
+    if not span.prompt_tokens:
+        span.prompt_tokens = compaction.prompt_tokens
+    await cache_store(openai_messages, content, span.fields.get("route"))
+
+    return ChatResponse(content=content, thinking_duration=thinking_duration, usage=compaction.usage())
+
+async def answer_chat(messages: List[Dict[str, str]], http_request: Request, endpoint: str,
+                      conversation_id: Optional[str] = None,
+                      on_answer: Optional[Callable[[ChatResponse], Awaitable[None]]] = None) -> ChatResponse:
+    """complete_chat with request metrics and the HTTP error mapping shared by the non-streaming endpoints"""
+    span = ChatSpan(endpoint, request_start(http_request))
+    span.mark("parsed")
+    outcome = "error"
+    try:
+        result = await complete_chat(messages, http_request, span, conversation_id)
+        if on_answer is not None:
+            await on_answer(result)
+        outcome = "cached" if result.cached else "ok"
+        return result
+    except HTTPException as e:
+        outcome = "busy" if e.status_code == 503 else "error"
+        raise
+    except ClientDisconnected:
+        outcome = "disconnected"
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
-        print("Error in chat_stream:", str(e))  # Debug log
+        span.error(endpoint, e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        span.finish(outcome)
 
 @app.post("/api/chat")
-async def chat_completion(request: ChatRequest):
+async def chat_completion(request: ChatRequest, http_request: Request):
     """Non-streaming chat completion"""
-    try:
-        import time
-        start_time = time.time()
-        
-        # System prompt for Sandra
-        system_prompt = """You are Sandra, a professional financial advisor from DL Family Office. You provide expert financial advice with a focus on:
-        - Portfolio management and asset allocation
-        - Retirement planning strategies
-        - Risk management and diversification
-        - Investment opportunities and market analysis
-        - Tax-efficient investing
-        - Estate planning considerations
-        
-        Keep your responses informative yet conversational. Always consider the user's risk tolerance and investment timeline when providing advice. Provide specific, actionable recommendations when possible."""
-        
-        # Prepare messages for OpenAI
-        openai_messages = [{"role": "system", "content": system_prompt}]
-        openai_messages.extend([{"role": msg.role, "content": msg.content} for msg in request.messages])
-        
-        # Get response from OpenAI using new API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=openai_messages,
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        thinking_duration = time.time() - start_time
-        content = response.choices[0].message.content
-        
-        return ChatResponse(content=content, thinking_duration=thinking_duration)
-        
-    except Exception as e:
-        print("Error in chat_completion:", str(e))  # Debug log
-        raise HTTPException(status_code=500, detail=str(e))
+    messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    return await answer_chat(messages, http_request, "chat", request.conversation_id)
+
+async def get_session_or_404(session_id: str):
+    session = await session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/api/sessions")
+async def create_session(request: Optional[SessionCreateRequest] = None):
+    """Start a conversation; later turns post only the new message"""
+    seed = [{"role": msg.role, "content": msg.content} for msg in request.messages] if request else []
+    session = await session_store.create(seed)
+    return {"session_id": session.id, "created_at": session.created_at, "message_count": len(session.messages)}
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    return (await get_session_or_404(session_id)).to_dict()
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await session_store.delete(session_id) and session_store.backend is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+@app.post("/api/sessions/{session_id}/messages/stream")
+async def session_turn_stream(session_id: str, turn: SessionTurn, http_request: Request):
+    """Stream the answer to one new user message; the turn is recorded once the answer completes"""
+    span = ChatSpan("session_stream", request_start(http_request))
+    span.mark("parsed")
+    session = await get_session_or_404(session_id)
+    user_message = {"role": "user", "content": turn.content}
+
+    async def record(answer: str):
+        try:
+            await session_store.append(session, [user_message, {"role": "assistant", "content": answer}])
+        except Exception as e:
+            log_error("session_record_failed", e, session_id=session.id)
+
+    async def turn_frames():
+        # Turns of one session run one at a time, so the history stays in order
+        async with session.lock:
+            async for frame in generate_streaming_response(
+                session.messages + [user_message], http_request, session.id, on_answer=record, span=span
+            ):
+                yield frame
+
+    return streaming_response(turn_frames(), http_request)
+
+@app.post("/api/sessions/{session_id}/messages")
+async def session_turn(session_id: str, turn: SessionTurn, http_request: Request):
+    """Non-streaming answer to one new user message"""
+    session = await get_session_or_404(session_id)
+    user_message = {"role": "user", "content": turn.content}
+
+    async def record(result: ChatResponse):
+        await session_store.append(session, [user_message, {"role": "assistant", "content": result.content}])
+
+    async with session.lock:
+        return await answer_chat(session.messages + [user_message], http_request, "session", session.id, on_answer=record)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,474 @@
+"""
+Function tools that let the chat model look up fund data instead of answering
+from memory.
+
+Four tools are exposed to the model (``TOOL_SPECS``): fund search (the
+in-process search index when loaded, else ``fund_overview``), a NAV series lookup (served from the memory-mapped NAV
+store when loaded, else the ``nav`` table), trailing performance / risk
+metrics and a portfolio optimizer over the NAV store. When the model emits several calls in one turn they run
+concurrently, each under a timeout.
+
+Results are cached per conversation (``ToolResultCache``) so follow-up turns
+that ask about the same fund do not re-query, and every result is bounded:
+searches return at most ``MAX_SEARCH_RESULTS`` rows, NAV series are
+downsampled to ``max_points`` with summary statistics, portfolios list their
+``MAX_PORTFOLIO_HOLDINGS`` largest holdings, and the serialized
+payload is capped at ``max_result_chars`` by dropping list items and
+shortening strings, so the model always gets valid JSON.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.fund_api import get_reader_pool, jsonable
+from src.fund_search import get_fund_search
+from src.nav_store import get_nav_store, iso_dates, to_date, to_epoch_days
+from src.observability import log_error
+from src.portfolio import OBJECTIVES, PortfolioError, optimize_portfolio as _optimize_portfolio
+
+MAX_SEARCH_RESULTS = 10
+MAX_PERFORMANCE_ISINS = 10
+DEFAULT_NAV_POINTS = 60
+MAX_NAV_POINTS = 250
+MAX_PORTFOLIO_HOLDINGS = 15
+MAX_PORTFOLIO_EXCLUDED = 10
+
+SEARCH_COLUMNS = [
+    "isin", "name", "fund_company", "asset_class", "category", "risk_reward_indicator", "fund_aum", "aum_currency",
+]
+PERFORMANCE_COLUMNS = [
+    "inception", "one_month", "three_months", "six_months", "one_year", "three_years", "five_years", "ten_years",
+]
+ANALYTICS_COLUMNS = ["as_of_date", "volatility_1y", "volatility_3y", "sharpe_1y", "sortino_1y", "max_drawdown"]
+
+TOOL_SPECS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_funds",
+            "description": "Search the fund universe by text and/or filters, or find funds similar to a given one. "
+                           "Returns at most 10 funds with their ISINs.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Fund name, company, theme or objective, e.g. 'european dividend equity'"},
+                    "similar_to": {"type": "string", "description": "ISIN of a fund to find similar funds to"},
+                    "asset_class": {"type": "string", "description": "e.g. Equity, Fixed Income, Mixed Assets, Money Market"},
+                    "category": {"type": "string"},
+                    "currency": {"type": "string", "description": "AUM currency, e.g. EUR, USD"},
+                    "risk_min": {"type": "integer", "minimum": 1, "maximum": 7},
+                    "risk_max": {"type": "integer", "minimum": 1, "maximum": 7},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": MAX_SEARCH_RESULTS},
+                },
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_nav_series",
+            "description": "NAV history of one fund between two dates, downsampled, with return/min/max summary.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "isin": {"type": "string"},
+                    "start": {"type": "string", "description": "YYYY-MM-DD; defaults to one year before end"},
+                    "end": {"type": "string", "description": "YYYY-MM-DD; defaults to the latest NAV"},
+                    "max_points": {"type": "integer", "minimum": 2, "maximum": MAX_NAV_POINTS},
+                },
+                "required": ["isin"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_performance",
+            "description": "Trailing returns (as fractions) and risk metrics (volatility, Sharpe, Sortino, max drawdown) for up to 10 funds.",
+            "parameters": {
+                "type": "object",
+                "properties": {"isins": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_PERFORMANCE_ISINS}},
+                "required": ["isins"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "optimize_portfolio",
+            "description": "Optimal fund weights from the covariance of daily NAV returns (3 years by default). "
+                           "Pass ISINs (e.g. from search_funds) or filters for the universe. Returns the 15 largest "
+                           "holdings with weights and risk contributions, the asset-class mix, expected return and volatility.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "isins": {"type": "array", "items": {"type": "string"}},
+                    "asset_classes": {"type": "array", "items": {"type": "string"},
+                                      "description": "Universe filter, e.g. ['Equity', 'Fixed Income']"},
+                    "currency": {"type": "string", "description": "AUM currency, e.g. EUR, USD"},
+                    "risk_max": {"type": "integer", "minimum": 1, "maximum": 7,
+                                 "description": "Only funds with a risk indicator up to this level"},
+                    "objective": {"type": "string", "enum": list(OBJECTIVES),
+                                  "description": "min_variance (default), mean_variance or risk_parity"},
+                    "max_weight": {"type": "number", "exclusiveMinimum": 0, "maximum": 1,
+                                   "description": "Largest weight of one fund, e.g. 0.1"},
+                    "asset_class_caps": {"type": "object", "additionalProperties": {"type": "number"},
+                                         "description": "Largest total weight per asset class, e.g. {\"Equity\": 0.6}"},
+                },
+            },
+        },
+    },
+]
+
+
+class ToolError(Exception):
+    """A tool call the model can recover from (bad arguments, unknown fund)"""
+
+
+async def search_funds(query: Optional[str] = None, asset_class: Optional[str] = None, category: Optional[str] = None,
+                       currency: Optional[str] = None, risk_min: Optional[int] = None, risk_max: Optional[int] = None,
+                       similar_to: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+    limit = max(1, min(int(limit), MAX_SEARCH_RESULTS))
+    index = get_fund_search()
+    if index is not None:
+        try:
+            funds = index.search(query, asset_class, category, currency, risk_min, risk_max, similar_to, limit)
+        except KeyError:
+            raise ToolError(f"Unknown fund {similar_to}")
+        return {"funds": funds}
+    if similar_to:
+        raise ToolError("Similar-fund search is not available right now; search by text or filters instead")
+
+    where, params = [], []
+    if query:
+        where.append("(`name` LIKE %s OR `fund_company` LIKE %s)")
+        params.extend([f"%{query}%", f"%{query}%"])
+    for column, value in (("asset_class", asset_class), ("category", category), ("aum_currency", currency)):
+        if value:
+            where.append(f"`{column}` = %s")
+            params.append(value)
+    if risk_min is not None:
+        where.append("`risk_reward_indicator` >= %s")
+        params.append(int(risk_min))
+    if risk_max is not None:
+        where.append("`risk_reward_indicator` <= %s")
+        params.append(int(risk_max))
+
+    sql = f"SELECT {', '.join(f'`{c}`' for c in SEARCH_COLUMNS)} FROM `fund_overview`"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Largest funds first so a vague query still returns the most relevant ones
+    sql += " ORDER BY `fund_aum` DESC LIMIT %s"
+    params.append(limit)
+
+    pool = await get_reader_pool()
+    return {"funds": [jsonable(row) for row in await pool.fetch_all(sql, params)]}
+
+
+def _parse_date(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ToolError(f"{name} must be a YYYY-MM-DD date")
+
+
+def summarize_series(days: np.ndarray, closes: np.ndarray, max_points: int) -> Dict[str, Any]:
+    """Summary statistics plus an evenly downsampled series that always keeps the first and last point"""
+    if len(days) == 0:
+        return {"points": []}
+    idx = np.unique(np.linspace(0, len(days) - 1, min(max_points, len(days))).round().astype(int))
+    points = iso_dates(days[idx])
+    low, high = int(np.argmin(closes)), int(np.argmax(closes))
+    return {
+        "start": points[0],
+        "end": points[-1],
+        "observations": int(len(days)),
+        "first": round(float(closes[0]), 4),
+        "last": round(float(closes[-1]), 4),
+        "return": round(float(closes[-1] / closes[0] - 1), 6) if closes[0] else None,
+        "min": {"date": to_date(days[low]).isoformat(), "close": round(float(closes[low]), 4)},
+        "max": {"date": to_date(days[high]).isoformat(), "close": round(float(closes[high]), 4)},
+        "points": [[d, round(c, 4)] for d, c in zip(points, closes[idx].tolist())],
+    }
+
+
+async def get_nav_series(isin: str, start: Optional[str] = None, end: Optional[str] = None,
+                         max_points: int = DEFAULT_NAV_POINTS) -> Dict[str, Any]:
+    start_date, end_date = _parse_date(start, "start"), _parse_date(end, "end")
+    max_points = max(2, min(int(max_points), MAX_NAV_POINTS))
+
+    store = get_nav_store()
+    if store is not None and isin in store:
+        days, closes = store.series(isin, None, end_date)
+    else:
+        pool = await get_reader_pool()
+        sql, params = "SELECT `date`, `close` FROM `nav` WHERE `isin` = %s", [isin]
+        if start_date is not None:
+            sql += " AND `date` >= %s"
+            params.append(start_date)
+        if end_date is not None:
+            sql += " AND `date` <= %s"
+            params.append(end_date)
+        # Rows with no close price carry no information for the series
+        rows = [r for r in await pool.fetch_all(sql + " ORDER BY `date`", params) if r["close"] is not None]
+        days = np.array([to_epoch_days(date.fromisoformat(str(r["date"])[:10])) for r in rows], dtype=np.int32)
+        closes = np.array([float(r["close"]) for r in rows], dtype=np.float64)
+    if len(days) == 0:
+        raise ToolError(f"No NAV data for {isin}")
+
+    if start_date is None:
+        # default window: the year up to the last available NAV
+        lo = int(np.searchsorted(days, days[-1] - 365, side="left"))
+    else:
+        lo = int(np.searchsorted(days, to_epoch_days(start_date), side="left"))
+    return {"isin": isin, **summarize_series(days[lo:], closes[lo:], max_points)}
+
+
+async def get_performance(isins: List[str]) -> Dict[str, Any]:
+    isins = [str(i) for i in isins][:MAX_PERFORMANCE_ISINS]
+    if not isins:
+        raise ToolError("isins must list at least one ISIN")
+    placeholders = ", ".join(["%s"] * len(isins))
+    pool = await get_reader_pool()
+
+    rows = await pool.fetch_all(
+        f"SELECT `isin`, {', '.join(f'`{c}`' for c in PERFORMANCE_COLUMNS)} FROM `performance` WHERE `isin` IN ({placeholders})",
+        isins,
+    )
+    funds = {row["isin"]: jsonable(row) for row in rows}
+    try:
+        # Risk metrics computed by the ingestion job's analytics step; absent on older databases
+        analytics = await pool.fetch_all(
+            f"SELECT `isin`, {', '.join(f'`{c}`' for c in ANALYTICS_COLUMNS)} FROM `fund_analytics` WHERE `isin` IN ({placeholders})",
+            isins,
+        )
+    except Exception:
+        analytics = []
+    for row in analytics:
+        funds.setdefault(row["isin"], {"isin": row["isin"]}).update(jsonable(row))
+
+    missing = [i for i in isins if i not in funds]
+    return {"funds": list(funds.values()), **({"not_found": missing} if missing else {})}
+
+
+async def optimize_portfolio(isins: Optional[List[str]] = None, asset_classes: Optional[List[str]] = None,
+                             currency: Optional[str] = None, risk_max: Optional[int] = None,
+                             objective: str = "min_variance", max_weight: Optional[float] = None,
+                             asset_class_caps: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    store = get_nav_store()
+    if store is None:
+        raise ToolError("Portfolio optimization is not available right now")
+    if not isins and not asset_classes and not currency and risk_max is None:
+        raise ToolError("Pass isins or at least one filter to choose the funds")
+    pool = await get_reader_pool()
+    try:
+        result = await _optimize_portfolio(
+            pool, store, [str(i) for i in isins] if isins else None, asset_classes, currency,
+            int(risk_max) if risk_max is not None else None, objective=objective, max_weight=max_weight,
+            asset_class_caps=asset_class_caps,
+        )
+    except PortfolioError as e:
+        raise ToolError(str(e))
+    excluded = result.pop("excluded")
+    result["holdings"] = result["holdings"][:MAX_PORTFOLIO_HOLDINGS]
+    if excluded:
+        result["excluded"] = dict(list(excluded.items())[:MAX_PORTFOLIO_EXCLUDED])
+        result["excluded_count"] = len(excluded)
+    return result
+
+
+TOOL_FUNCTIONS = {
+    "search_funds": search_funds,
+    "get_nav_series": get_nav_series,
+    "get_performance": get_performance,
+    "optimize_portfolio": optimize_portfolio,
+}
+
+
+class ToolResultCache:
+    """
+    Tool results per conversation, so a follow-up turn asking about the same fund
+    reuses the earlier lookup. Conversations are evicted least-recently-used beyond
+    ``max_conversations``; results expire after ``ttl_seconds``.
+    """
+
+    def __init__(self, max_conversations: int = 1000, max_results_per_conversation: int = 64, ttl_seconds: float = 600):
+        self.max_conversations = max_conversations
+        self.max_results_per_conversation = max_results_per_conversation
+        self.ttl_seconds = ttl_seconds
+        self._conversations: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name: str, arguments: Dict[str, Any]) -> str:
+        return name + ":" + json.dumps(arguments, sort_keys=True, separators=(",", ":"))
+
+    def get(self, conversation_id: str, key: str) -> Optional[str]:
+        results = self._conversations.get(conversation_id)
+        entry = results.get(key) if results is not None else None
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._conversations.move_to_end(conversation_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, conversation_id: str, key: str, content: str):
+        results = self._conversations.setdefault(conversation_id, OrderedDict())
+        self._conversations.move_to_end(conversation_id)
+        results[key] = (time.monotonic(), content)
+        results.move_to_end(key)
+        while len(results) > self.max_results_per_conversation:
+            results.popitem(last=False)
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"conversations": len(self._conversations), "hits": self.hits, "misses": self.misses}
+
+
+class ToolCallAccumulator:
+    """Reassemble streamed ``delta.tool_calls`` fragments into complete tool calls"""
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, str]] = {}
+
+    def add(self, deltas):
+        for delta in deltas:
+            call = self._calls.setdefault(delta.index, {"id": "", "name": "", "arguments": ""})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function is not None:
+                if delta.function.name:
+                    call["name"] += delta.function.name
+                if delta.function.arguments:
+                    call["arguments"] += delta.function.arguments
+
+    def __bool__(self) -> bool:
+        return bool(self._calls)
+
+    def calls(self) -> List[Dict[str, str]]:
+        return [self._calls[i] for i in sorted(self._calls)]
+
+
+def assistant_tool_message(calls: List[Dict[str, str]], content: Optional[str] = None) -> Dict[str, Any]:
+    """The assistant turn that requested the tool calls, echoed back to the model"""
+    return {
+        "role": "assistant",
+        "content": content,
+        "tool_calls": [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+            for c in calls
+        ],
+    }
+
+
+def _dumps(payload: Any) -> str:
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+def _shrinkable(key: Any, value: list) -> bool:
+    # Series points are thinned to the first and last point at most, so two can go no further
+    return len(value) > (2 if key == "points" else 1)
+
+
+def _largest(value: Any, kind: type, best=None):
+    """(size, container, key) of the largest list that can still shrink, or string, inside ``value``"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return best
+    for k, child in items:
+        if isinstance(child, kind) and (kind is str or _shrinkable(k, child)):
+            size = len(_dumps(child))
+            if best is None or size > best[0]:
+                best = (size, value, k)
+        if k != "points":
+            # [date, close] pairs are kept whole
+            best = _largest(child, kind, best)
+    return best
+
+
+def _bounded(payload: Dict[str, Any], max_chars: int) -> str:
+    """Serialize a tool result, shrinking it until it fits in ``max_chars`` and stays valid JSON.
+
+    The largest list is cut first: series ``points`` are thinned, keeping the first and
+    last point, and other lists (ranked results) lose their tail. Then the longest strings
+    are shortened. The result is marked ``"truncated": true``.
+    """
+    text = _dumps(payload)
+    if len(text) <= max_chars:
+        return text
+    # A JSON round trip is a deep copy with every value already made serializable
+    payload = {**json.loads(text), "truncated": True}
+    while len(text) > max_chars:
+        found = _largest(payload, list)
+        if found is not None:
+            _, parent, key = found
+            items = parent[key]
+            parent[key] = items[:-1:2] + items[-1:] if key == "points" else items[:len(items) // 2]
+        else:
+            found = _largest(payload, str)
+            if found is None or found[0] < 16:
+                return _dumps({"truncated": True, "error": "Result too large to return"})
+            _, parent, key = found
+            parent[key] = parent[key][:len(parent[key]) // 2] + "..."
+        text = _dumps(payload)
+    return text
+
+
+class ToolRunner:
+    def __init__(self, cache: ToolResultCache, timeout: float = 5.0, max_result_chars: int = 4000):
+        self.cache = cache
+        self.timeout = timeout
+        self.max_result_chars = max_result_chars
+
+    async def _run_one(self, call: Dict[str, str], conversation_id: Optional[str]) -> str:
+        name = call["name"]
+        try:
+            arguments = json.loads(call["arguments"] or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError
+        except ValueError:
+            return json.dumps({"error": f"Arguments for {name} are not a JSON object"})
+        function = TOOL_FUNCTIONS.get(name)
+        if function is None:
+            return json.dumps({"error": f"Unknown tool {name}"})
+
+        key = ToolResultCache.key(name, arguments)
+        if conversation_id is not None:
+            cached = self.cache.get(conversation_id, key)
+            if cached is not None:
+                return cached
+        try:
+            result = await asyncio.wait_for(function(**arguments), timeout=self.timeout)
+        except ToolError as e:
+            return json.dumps({"error": str(e)})
+        except TypeError as e:
+            return json.dumps({"error": f"Bad arguments for {name}: {e}"})
+        except asyncio.TimeoutError:
+            return json.dumps({"error": f"{name} timed out"})
+        except Exception as e:
+            log_error("tool_failed", e, tool=name)
+            return json.dumps({"error": f"{name} failed"})
+
+        content = _bounded(result, self.max_result_chars)
+        # Only successful lookups are cached; errors are retried on the next turn
+        if conversation_id is not None:
+            self.cache.put(conversation_id, key, content)
+        return content
+
+    async def run(self, calls: List[Dict[str, str]], conversation_id: Optional[str]) -> List[Dict[str, str]]:
+        """Execute all calls of one model turn concurrently; results are cached only for a known conversation"""
+        results = await asyncio.gather(*(self._run_one(call, conversation_id) for call in calls))
+        return [{"role": "tool", "tool_call_id": call["id"], "content": content} for call, content in zip(calls, results)]
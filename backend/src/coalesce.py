@@ -0,0 +1,244 @@
+"""
+Single-flight coalescing of identical concurrent chat streams, and the replay
+buffer that lets a dropped client resume a stream.
+
+When several clients ask the same question at the same time, only the first
+request (the leader) starts an upstream call. Requests arriving while it is
+in flight join it and receive the same stream of events. The events already
+produced are kept in a buffer, so a late joiner first gets the prefix it missed
+and then follows the live stream.
+
+The upstream call runs in its own task, so it keeps going when the leader
+disconnects while others are still listening. Once the last subscriber has
+left, it is cancelled after ``resume_grace`` seconds unless a client resumes
+it first.
+
+Every flight has a stream id. Finished flights stay resumable for
+``replay_ttl`` seconds, up to ``max_replay_streams`` flights.
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Event = Dict[str, Any]
+Publish = Callable[[Event], None]
+# Runs the upstream call, handing each event to publish
+Producer = Callable[[Publish], Awaitable[None]]
+# Receives the complete answer text once a flight has finished successfully
+FinishCallback = Callable[[str], Awaitable[None]]
+
+
+class Flight:
+    """One upstream call and the events it has produced so far"""
+
+    def __init__(self, key: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.events: List[Event] = []
+        self.subscribers = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.callbacks: List[FinishCallback] = []
+        # _text_bytes[i]: UTF-8 bytes of text in events[:i]; _last_other: index of the last non-text event
+        self._text_bytes = [0]
+        self._last_other = -1
+        # (text byte total that wakes it, future) per waiting follower; each follower owns its future
+        self._waiters: List[Tuple[float, asyncio.Future]] = []
+
+    def publish(self, event: Event):
+        self.events.append(event)
+        if event["type"] == "text-delta":
+            self._text_bytes.append(self._text_bytes[-1] + len(event["textDelta"].encode("utf-8")))
+            total = self._text_bytes[-1]
+            self._wake(lambda threshold: total >= threshold)
+        else:
+            self._text_bytes.append(self._text_bytes[-1])
+            self._last_other = len(self.events) - 1
+            self._wake(lambda threshold: True)
+
+    def close(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake(lambda threshold: True)
+
+    def on_finish(self, callback: FinishCallback):
+        self.callbacks.append(callback)
+
+    def answer(self) -> Optional[str]:
+        """The complete answer text, if the flight ended with a finish event"""
+        if not self.events or self.events[-1]["type"] != "finish":
+            return None
+        return "".join(e["textDelta"] for e in self.events if e["type"] == "text-delta")
+
+    def _wake(self, due: Callable[[float], bool]):
+        if not self._waiters:
+            return
+        waiting = []
+        for threshold, future in self._waiters:
+            if due(threshold):
+                if not future.done():
+                    future.set_result(True)
+            else:
+                waiting.append((threshold, future))
+        self._waiters = waiting
+
+    async def _wait(self, timeout: Optional[float], threshold: float = 0) -> bool:
+        """Wait for the next event (or, with ``threshold``, for that many text bytes in total or a
+        non-text event) or the close; False on timeout. A private future and one timer per wait
+        are cheaper than wait_for, which wraps a task."""
+        future = asyncio.get_running_loop().create_future()
+        entry = (threshold, future)
+        self._waiters.append(entry)
+        timer = None
+        if timeout is not None:
+            timer = asyncio.get_running_loop().call_later(
+                timeout, lambda: future.done() or future.set_result(False))
+        try:
+            return await future
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not future.done() or not future.result():
+                self._waiters = [w for w in self._waiters if w is not entry]
+
+    def _holdable(self, position: int, max_bytes: int) -> bool:
+        """Whether the pending events are text deltas that may wait to be merged"""
+        if self._last_other >= position:
+            return False
+        return not max_bytes or self._text_bytes[-1] - self._text_bytes[position] < max_bytes
+
+    async def follow(self, after: int = -1, interval: float = 0.0, max_bytes: int = 0,
+                     heartbeat: Optional[float] = None) -> AsyncIterator[Tuple[int, List[Event]]]:
+        """Batches of the events after index ``after``, as (index of the last event, events), until done.
+
+        With ``interval`` set, text deltas are held for up to that many seconds, or until
+        ``max_bytes`` of text is pending, so several go out together. The first delta is
+        never held. While holding, a follower is woken once, when the batch is due, not
+        on every delta. After ``heartbeat`` idle seconds an empty batch is yielded.
+        """
+        position = after + 1
+        sent_text = False
+        while True:
+            if position < len(self.events):
+                if interval > 0 and sent_text and not self.done and self._holdable(position, max_bytes):
+                    threshold = self._text_bytes[position] + max_bytes if max_bytes else float("inf")
+                    await self._wait(interval, threshold)
+                batch = self.events[position:]
+                position = len(self.events)
+                sent_text = sent_text or any(e["type"] == "text-delta" for e in batch)
+                yield position - 1, batch
+                continue
+            if self.done:
+                return
+            if not await self._wait(heartbeat):
+                yield position - 1, []
+
+
+class StreamCoalescer:
+    def __init__(self, replay_ttl: float = 60.0, max_replay_streams: int = 1000, resume_grace: float = 0.0):
+        self.replay_ttl = replay_ttl
+        self.max_replay_streams = max_replay_streams
+        self.resume_grace = resume_grace
+        # coalescing key -> flight still in flight
+        self._flights: Dict[str, Flight] = {}
+        # stream id -> flight, in flight or finished within replay_ttl
+        self._streams: "OrderedDict[str, Flight]" = OrderedDict()
+        self.leaders = 0
+        self.joined = 0
+        self.resumed = 0
+
+    def join(self, key: Optional[str], produce: Producer) -> Tuple[Flight, bool]:
+        """Subscribe to the flight for ``key``, starting one with ``produce`` if none is in flight.
+
+        Returns the flight and whether this caller started it. A ``None`` key never
+        coalesces. Every join must be paired with ``leave``.
+        """
+        flight = self._flights.get(key) if key is not None else None
+        leader = flight is None
+        if leader:
+            flight = Flight(key)
+            if key is not None:
+                self._flights[key] = flight
+            self._remember(flight)
+            flight.task = asyncio.create_task(self._run(flight, produce))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        return flight, leader
+
+    def completed(self, events: List[Event]) -> Flight:
+        """A finished flight holding ``events`` (e.g. a cached answer), so it streams and resumes like a live one"""
+        flight = Flight(None)
+        for event in events:
+            flight.publish(event)
+        flight.close()
+        self._remember(flight)
+        return flight
+
+    def get(self, stream_id: str) -> Optional[Flight]:
+        self._prune()
+        return self._streams.get(stream_id)
+
+    def attach(self, flight: Flight):
+        """Subscribe to a known flight (a resuming client); pair with ``leave``"""
+        flight.subscribers += 1
+        self.resumed += 1
+
+    def leave(self, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            if self.resume_grace > 0:
+                asyncio.get_running_loop().call_later(self.resume_grace, self._cancel_if_idle, flight)
+            else:
+                self._cancel_if_idle(flight)
+
+    def _cancel_if_idle(self, flight: Flight):
+        if flight.subscribers == 0 and not flight.done:
+            # Nobody is listening anymore; stop generating tokens
+            self._forget(flight)
+            flight.task.cancel()
+
+    async def _run(self, flight: Flight, produce: Producer):
+        try:
+            await produce(flight.publish)
+            answer = flight.answer()
+            if answer is not None and flight.callbacks:
+                # Callbacks handle their own errors; one failing must not affect the others
+                await asyncio.gather(*(callback(answer) for callback in flight.callbacks), return_exceptions=True)
+        except Exception as e:
+            # Producers report their own errors; this catches anything they let through
+            flight.publish({"type": "error", "error": str(e)})
+        finally:
+            self._forget(flight)
+            flight.close()
+
+    def _forget(self, flight: Flight):
+        # Later requests start a new flight (or hit the response cache)
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def _remember(self, flight: Flight):
+        self._streams[flight.id] = flight
+        self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._streams:
+            oldest = next(iter(self._streams.values()))
+            expired = oldest.done and now - oldest.finished_at > self.replay_ttl
+            if not expired and len(self._streams) <= self.max_replay_streams:
+                break
+            self._streams.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "replayable_streams": len(self._streams),
+            "upstream_streams": self.leaders,
+            "coalesced_streams": self.joined,
+            "resumed_streams": self.resumed,
+        }
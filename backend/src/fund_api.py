@@ -0,0 +1,288 @@
+"""
+Read-side fund data endpoints over the ``fund_data`` database.
+
+All list endpoints use keyset pagination (``after`` + ``limit``, returning
+``next_cursor``) instead of OFFSET, and accept ``fields`` to project only the
+columns the caller needs. ``/nav/stream`` streams a whole NAV history as
+NDJSON straight from a server-side cursor. ``/funds/search`` ranks funds from
+the in-process search index. ``/portfolio/optimize`` builds an optimized
+allocation over a fund universe from the NAV snapshot.
+"""
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.fund_db import create_reader_pool_from_env
+from src.fund_search import get_fund_search
+from src.nav_store import get_nav_store, iso_dates
+from src.portfolio import PortfolioError, optimize_portfolio
+
+router = APIRouter(prefix="/api", tags=["funds"])
+
+OVERVIEW_COLUMNS = [
+    "isin", "name", "fund_company", "asset_class", "subasset_class", "category", "inception_date",
+    "risk_reward_indicator", "fund_benchmark", "investment_objective", "fund_aum", "nav", "aum_currency",
+]
+# investment_objective is long TEXT, so listings leave it out unless asked for
+OVERVIEW_LIST_COLUMNS = [c for c in OVERVIEW_COLUMNS if c != "investment_objective"]
+PERFORMANCE_COLUMNS = [
+    "isin", "inception", "one_day", "one_week", "one_month", "three_months", "six_months",
+    "one_year", "two_years", "three_years", "five_years", "ten_years",
+]
+MAX_PAGE_SIZE = 1000
+MAX_NAV_PAGE_SIZE = 10000
+NAV_STREAM_BATCH = 2000
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_reader_pool():
+    """Create the reader pool on first use so the chat endpoints never depend on the database"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await create_reader_pool_from_env()
+    return _pool
+
+
+async def close_reader_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _project(fields: Optional[str], allowed: List[str], default: List[str], key: str) -> List[str]:
+    """Validate a comma-separated column list, always including the key column"""
+    if not fields:
+        return default
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(columns) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if key not in columns:
+        columns.insert(0, key)
+    return columns
+
+
+def _select(columns: List[str]) -> str:
+    return ", ".join(f"`{c}`" for c in columns)
+
+
+def jsonable(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Row with Decimals and dates converted to JSON types (shared with the chat tools)"""
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+def _page(rows: List[Dict[str, Any]], limit: int, cursor_key: str) -> Dict[str, Any]:
+    """Trim the limit+1 probe row and derive the next keyset cursor"""
+    has_more = len(rows) > limit
+    items = [jsonable(r) for r in rows[:limit]]
+    return {"items": items, "next_cursor": items[-1][cursor_key] if has_more and items else None}
+
+
+@router.get("/funds")
+async def list_funds(
+    asset_class: Optional[str] = None,
+    category: Optional[str] = None,
+    currency: Optional[str] = Query(None, description="AUM currency"),
+    risk_min: Optional[int] = Query(None, ge=1, le=7),
+    risk_max: Optional[int] = Query(None, ge=1, le=7),
+    fields: Optional[str] = None,
+    after: Optional[str] = Query(None, description="ISIN cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Filter funds by asset class / category / currency / risk indicator"""
+    columns = _project(fields, OVERVIEW_COLUMNS, OVERVIEW_LIST_COLUMNS, "isin")
+    where, params = [], []
+    for column, value in (("asset_class", asset_class), ("category", category), ("aum_currency", currency)):
+        if value is not None:
+            where.append(f"`{column}` = %s")
+            params.append(value)
+    if risk_min is not None:
+        where.append("`risk_reward_indicator` >= %s")
+        params.append(risk_min)
+    if risk_max is not None:
+        where.append("`risk_reward_indicator` <= %s")
+        params.append(risk_max)
+    if after is not None:
+        where.append("`isin` > %s")
+        params.append(after)
+
+    sql = f"SELECT {_select(columns)} FROM `fund_overview`"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY `isin` LIMIT %s"
+    params.append(limit + 1)
+
+    pool = await get_reader_pool()
+    return _page(await pool.fetch_all(sql, params), limit, "isin")
+
+
+@router.get("/funds/search")
+async def search_funds(
+    q: Optional[str] = Query(None, description="Name, company, theme or objective"),
+    similar_to: Optional[str] = Query(None, description="ISIN to find similar funds to"),
+    asset_class: Optional[str] = None,
+    category: Optional[str] = None,
+    currency: Optional[str] = Query(None, description="AUM currency"),
+    risk_min: Optional[int] = Query(None, ge=1, le=7),
+    risk_max: Optional[int] = Query(None, ge=1, le=7),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Ranked fund search by text and/or filters, or by similarity to a fund"""
+    index = get_fund_search()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Fund search index is not loaded")
+    try:
+        items = index.search(q, asset_class, category, currency, risk_min, risk_max, similar_to, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Fund {similar_to} not found")
+    return {"items": items}
+
+
+@router.get("/funds/{isin}")
+async def get_fund(isin: str, fields: Optional[str] = None):
+    """Fund overview by ISIN"""
+    columns = _project(fields, OVERVIEW_COLUMNS, OVERVIEW_COLUMNS, "isin")
+    pool = await get_reader_pool()
+    row = await pool.fetch_one(f"SELECT {_select(columns)} FROM `fund_overview` WHERE `isin` = %s", (isin,))
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Fund {isin} not found")
+    return jsonable(row)
+
+
+def _nav_query(isin: str, start: Optional[date], end: Optional[date], after: Optional[date]):
+    where, params = ["`isin` = %s"], [isin]
+    if start is not None:
+        where.append("`date` >= %s")
+        params.append(start)
+    if end is not None:
+        where.append("`date` <= %s")
+        params.append(end)
+    if after is not None:
+        where.append("`date` > %s")
+        params.append(after)
+    return f"SELECT `date`, `close` FROM `nav` WHERE {' AND '.join(where)} ORDER BY `date`", params
+
+
+@router.get("/funds/{isin}/nav")
+async def get_nav_series(
+    isin: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    after: Optional[date] = Query(None, description="date cursor from the previous page"),
+    limit: int = Query(1000, ge=1, le=MAX_NAV_PAGE_SIZE),
+):
+    """One page of a fund's NAV series within [start, end]"""
+    store = get_nav_store()
+    if store is not None and isin in store:
+        # Served from the memory-mapped snapshot: two binary searches and a slice
+        if after is not None:
+            start = max(start, after + timedelta(days=1)) if start else after + timedelta(days=1)
+        dates, close = store.series(isin, start, end)
+        page_dates, page_close = iso_dates(dates[:limit]), close[:limit].tolist()
+        items = [{"date": d, "close": c} for d, c in zip(page_dates, page_close)]
+        next_cursor = page_dates[-1] if len(dates) > limit else None
+        return {"isin": isin, "items": items, "next_cursor": next_cursor}
+
+    sql, params = _nav_query(isin, start, end, after)
+    pool = await get_reader_pool()
+    rows = await pool.fetch_all(sql + " LIMIT %s", params + [limit + 1])
+    return {"isin": isin, **_page(rows, limit, "date")}
+
+
+@router.get("/funds/{isin}/nav/stream")
+async def stream_nav_series(isin: str, start: Optional[date] = None, end: Optional[date] = None):
+    """Whole NAV series as NDJSON, read from a server-side cursor in batches"""
+    sql, params = _nav_query(isin, start, end, None)
+    pool = await get_reader_pool()
+
+    async def rows():
+        async for batch in pool.stream(sql, params, batch_size=NAV_STREAM_BATCH):
+            yield "".join(json.dumps(jsonable(row)) + "\n" for row in batch)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@router.get("/performance")
+async def list_performance(
+    fields: Optional[str] = None,
+    after: Optional[str] = Query(None, description="ISIN cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Performance table, paginated by ISIN"""
+    columns = _project(fields, PERFORMANCE_COLUMNS, PERFORMANCE_COLUMNS, "isin")
+    sql = f"SELECT {_select(columns)} FROM `performance`"
+    params = []
+    if after is not None:
+        sql += " WHERE `isin` > %s"
+        params.append(after)
+    sql += " ORDER BY `isin` LIMIT %s"
+    params.append(limit + 1)
+
+    pool = await get_reader_pool()
+    return _page(await pool.fetch_all(sql, params), limit, "isin")
+
+
+@router.get("/funds/{isin}/performance")
+async def get_fund_performance(isin: str, fields: Optional[str] = None):
+    columns = _project(fields, PERFORMANCE_COLUMNS, PERFORMANCE_COLUMNS, "isin")
+    pool = await get_reader_pool()
+    row = await pool.fetch_one(f"SELECT {_select(columns)} FROM `performance` WHERE `isin` = %s", (isin,))
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No performance data for {isin}")
+    return jsonable(row)
+
+
+class PortfolioRequest(BaseModel):
+    # Universe: explicit ISINs, or every fund matching the filters
+    isins: Optional[List[str]] = None
+    asset_classes: Optional[List[str]] = None
+    currency: Optional[str] = None
+    risk_max: Optional[int] = Field(None, ge=1, le=7)
+    objective: Literal["min_variance", "mean_variance", "risk_parity"] = "min_variance"
+    estimator: Literal["ledoit_wolf", "oas"] = "ledoit_wolf"
+    max_weight: Optional[float] = Field(None, gt=0, le=1)
+    # Upper bound on the total weight per asset class, e.g. {"Equity": 0.6}
+    asset_class_caps: Optional[Dict[str, float]] = None
+    risk_aversion: float = Field(5.0, gt=0)
+    lookback_days: Optional[int] = Field(None, ge=90, le=3650)
+    # Holdings returned, largest first; the summary figures cover all of them
+    limit: int = Field(50, ge=1, le=MAX_PAGE_SIZE)
+
+
+@router.post("/portfolio/optimize")
+async def optimize(request: PortfolioRequest):
+    """Optimal weights over a fund universe from shrinkage covariance of daily NAV returns"""
+    store = get_nav_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="NAV snapshot is not loaded")
+    if request.asset_class_caps and any(not 0 <= cap <= 1 for cap in request.asset_class_caps.values()):
+        raise HTTPException(status_code=400, detail="asset_class_caps must be between 0 and 1")
+    pool = await get_reader_pool()
+    try:
+        result = await optimize_portfolio(
+            pool, store, request.isins, request.asset_classes, request.currency, request.risk_max,
+            objective=request.objective, estimator=request.estimator, max_weight=request.max_weight,
+            asset_class_caps=request.asset_class_caps, risk_aversion=request.risk_aversion,
+            lookback_days=request.lookback_days,
+        )
+    except PortfolioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "holdings": result["holdings"][:request.limit]}
@@ -0,0 +1,135 @@
+"""
+Read-only connection pools for the ``fund_data`` database.
+
+Queries are written once in MySQL dialect with ``%s`` placeholders and backtick
+identifiers. ``MySQLReaderPool`` runs them on an aiomysql pool logged in as the
+read-only ``reader`` user. ``SQLiteReaderPool`` runs them against a SQLite copy of
+the schema, for local development and tests.
+
+Both pools support ``fetch_all``/``fetch_one`` for small results and ``stream``,
+which yields rows in batches from a server-side cursor so large NAV histories are
+never loaded whole.
+"""
+import asyncio
+import os
+import sqlite3
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+Row = Dict[str, Any]
+
+
+class MySQLReaderPool:
+    """aiomysql pool for the read-only reader user"""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    @classmethod
+    async def create(cls, host: str, port: int, user: str, password: str, db: str,
+                     minsize: int = 1, maxsize: int = 10) -> "MySQLReaderPool":
+        import aiomysql
+
+        pool = await aiomysql.create_pool(
+            host=host, port=port, user=user, password=password, db=db,
+            minsize=minsize, maxsize=maxsize, autocommit=True, charset="utf8mb4",
+        )
+        return cls(pool)
+
+    async def fetch_all(self, sql: str, params: Sequence = ()) -> List[Row]:
+        import aiomysql
+
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(sql, params)
+                return list(await cursor.fetchall())
+
+    async def fetch_one(self, sql: str, params: Sequence = ()) -> Optional[Row]:
+        rows = await self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+    async def stream(self, sql: str, params: Sequence = (), batch_size: int = 1000) -> AsyncIterator[List[Row]]:
+        import aiomysql
+
+        async with self._pool.acquire() as conn:
+            # Unbuffered cursor: rows are pulled from the server batch by batch
+            async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                await cursor.execute(sql, params)
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield list(rows)
+
+    async def close(self):
+        self._pool.close()
+        await self._pool.wait_closed()
+
+
+class SQLiteReaderPool:
+    """Stand-in pool over a read-only SQLite database; queries run in worker threads"""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._connections: "asyncio.Queue[sqlite3.Connection]" = asyncio.Queue()
+        for _ in range(size):
+            self._connections.put_nowait(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _translate(sql: str) -> str:
+        return sql.replace("%s", "?")
+
+    async def fetch_all(self, sql: str, params: Sequence = ()) -> List[Row]:
+        conn = await self._connections.get()
+        try:
+            rows = await asyncio.to_thread(lambda: conn.execute(self._translate(sql), tuple(params)).fetchall())
+            return [dict(row) for row in rows]
+        finally:
+            self._connections.put_nowait(conn)
+
+    async def fetch_one(self, sql: str, params: Sequence = ()) -> Optional[Row]:
+        rows = await self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+    async def stream(self, sql: str, params: Sequence = (), batch_size: int = 1000) -> AsyncIterator[List[Row]]:
+        conn = await self._connections.get()
+        cursor = None
+        try:
+            cursor = await asyncio.to_thread(conn.execute, self._translate(sql), tuple(params))
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self._connections.put_nowait(conn)
+
+    async def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+async def create_reader_pool_from_env():
+    """Build the reader pool from FUND_DB_* environment variables"""
+    backend = os.getenv("FUND_DB_BACKEND", "mysql").lower()
+    size = int(os.getenv("FUND_DB_POOL_SIZE", "10"))
+    if backend == "sqlite":
+        return SQLiteReaderPool(os.getenv("FUND_DB_SQLITE_PATH", "fund_data.sqlite3"), size=size)
+    if backend == "mysql":
+        return await MySQLReaderPool.create(
+            host=os.getenv("FUND_DB_HOST", "localhost"),
+            port=int(os.getenv("FUND_DB_PORT", "3306")),
+            user=os.getenv("FUND_DB_USER", "reader"),
+            password=os.getenv("FUND_DB_PASSWORD", ""),
+            db=os.getenv("FUND_DB_NAME", "fund_data"),
+            maxsize=size,
+        )
+    raise ValueError(f"Unsupported FUND_DB_BACKEND: {backend}")
@@ -0,0 +1,272 @@
+"""
+In-process fund search over the index that the ingestion job publishes (see
+database/search_index.py for the on-disk layout).
+
+A query combines three things:
+
+- BM25 over fund name, company, category, benchmark and objective. The weights
+  are precomputed, so scoring is one ``bincount`` over the postings of the
+  query terms.
+- Cosine similarity of locally computed dense vectors. These are hashed words,
+  bigrams and character trigrams, so they tolerate typos and find funds whose
+  descriptions read alike. ``similar_to`` ranks by similarity to one fund alone.
+- Structured filters (asset class, category, currency, risk range), evaluated
+  as boolean masks over integer-coded columns.
+
+Without text, matching funds are ranked by AUM like the SQL search. The arrays
+are memory-mapped, so workers share one copy and start without rebuilding
+anything. ``refresh()`` swaps in a newly published index the same way the NAV
+store does.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.observability import log_error, log_event
+
+CURRENT_FILE = "CURRENT"
+# Must match database/search_index.py
+TOKENIZER_VERSION = 1
+IDF_BUCKETS = 1 << 18
+STOPWORDS = frozenset(
+    "a an and are as at by for from in into is it its of on or the this that to with which will fund funds "
+    "sub aims aim seeks seek invest invests investing investment".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+_ISIN = re.compile(r"^[A-Z]{2}[A-Z0-9]{9}[0-9]$")
+
+# Weight of the dense similarity next to the max-normalized BM25 score
+VECTOR_WEIGHT = 0.3
+# Without any lexical match, dense-only results must be at least this similar
+MIN_SIMILARITY = 0.25
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def vector_features(tokens: List[str]) -> List[str]:
+    features = list(tokens)
+    features += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"#{token}#"
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return features
+
+
+@dataclass
+class SearchSnapshot:
+    name: str
+    docs: List[Dict[str, Any]]
+    isins: Dict[str, int]
+    terms: Dict[str, int]
+    term_offsets: np.ndarray
+    postings_doc: np.ndarray
+    postings_weight: np.ndarray
+    vectors: np.ndarray
+    feature_idf: np.ndarray
+    codes: Dict[str, np.ndarray]
+    vocabularies: Dict[str, Dict[str, int]]
+    risk: np.ndarray
+    aum: np.ndarray
+
+    @classmethod
+    def load(cls, root: str, name: str) -> "SearchSnapshot":
+        path = os.path.join(root, name)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["tokenizer"] != TOKENIZER_VERSION:
+            raise ValueError(f"Search index {name} uses tokenizer v{meta['tokenizer']}, expected v{TOKENIZER_VERSION}")
+        with open(os.path.join(path, "docs.json")) as f:
+            docs = json.load(f)
+
+        def array(filename):
+            return np.load(os.path.join(path, filename), mmap_mode="r")
+
+        return cls(
+            name=name,
+            docs=docs,
+            isins={doc["isin"]: i for i, doc in enumerate(docs)},
+            terms={term: t for t, term in enumerate(meta["terms"])},
+            term_offsets=array("term_offsets.npy"),
+            postings_doc=array("postings_doc.npy"),
+            postings_weight=array("postings_weight.npy"),
+            vectors=array("vectors.npy"),
+            feature_idf=array("feature_idf.npy"),
+            codes={key: array(f"{key}.npy") for key in meta["vocabularies"]},
+            vocabularies={key: {v: i for i, v in enumerate(values)} for key, values in meta["vocabularies"].items()},
+            risk=array("risk.npy"),
+            aum=array("aum.npy"),
+        )
+
+    def query_vector(self, tokens: List[str]) -> np.ndarray:
+        dim = self.vectors.shape[1]
+        vector = np.zeros(dim, dtype=np.float32)
+        counts: Dict[str, int] = {}
+        for feature in vector_features(tokens):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % dim] += sign * (1 + math.log(count)) * self.feature_idf[h % IDF_BUCKETS]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def bm25(self, tokens: List[str]) -> np.ndarray:
+        term_ids = {self.terms[t] for t in tokens if t in self.terms}
+        if not term_ids:
+            return np.zeros(len(self.docs), dtype=np.float32)
+        spans = [(int(self.term_offsets[t]), int(self.term_offsets[t + 1])) for t in term_ids]
+        docs = np.concatenate([self.postings_doc[lo:hi] for lo, hi in spans])
+        weights = np.concatenate([self.postings_weight[lo:hi] for lo, hi in spans])
+        return np.bincount(docs, weights=weights, minlength=len(self.docs)).astype(np.float32)
+
+    def mask(self, asset_class: Optional[str], category: Optional[str], currency: Optional[str],
+             risk_min: Optional[int], risk_max: Optional[int]) -> Optional[np.ndarray]:
+        """Funds passing the filters, or None when there are no filters"""
+        mask = None
+        for key, value in (("asset_class", asset_class), ("category", category), ("currency", currency)):
+            if not value:
+                continue
+            code = self.vocabularies[key].get(value.strip().lower(), -2)
+            match = self.codes[key] == code
+            mask = match if mask is None else mask & match
+        if risk_min is not None:
+            match = self.risk >= int(risk_min)
+            mask = match if mask is None else mask & match
+        if risk_max is not None:
+            match = (self.risk <= int(risk_max)) & (self.risk > 0)
+            mask = match if mask is None else mask & match
+        return mask
+
+
+class FundSearchIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self._snapshot: Optional[SearchSnapshot] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot_name(self) -> Optional[str]:
+        return self._snapshot.name if self._snapshot else None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.docs) if self._snapshot else 0
+
+    def __contains__(self, isin: str) -> bool:
+        return self._snapshot is not None and isin in self._snapshot.isins
+
+    def refresh(self) -> bool:
+        """Load the index named by CURRENT if it changed; returns True when a new one was swapped in"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if self._snapshot is not None and self._snapshot.name == name:
+            return False
+        self._snapshot = SearchSnapshot.load(self.root, name)
+        return True
+
+    def search(self, query: Optional[str] = None, asset_class: Optional[str] = None, category: Optional[str] = None,
+               currency: Optional[str] = None, risk_min: Optional[int] = None, risk_max: Optional[int] = None,
+               similar_to: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Best matching funds, each with a ``score``. Raises KeyError for an unknown ``similar_to`` ISIN"""
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.docs:
+            return []
+        tokens = tokenize(query)
+        exact = snapshot.isins.get(query.strip().upper()) if query and _ISIN.match(query.strip().upper()) else None
+
+        if similar_to:
+            if similar_to not in snapshot.isins:
+                raise KeyError(similar_to)
+            anchor = snapshot.isins[similar_to]
+            scores = snapshot.vectors @ snapshot.vectors[anchor]
+            if tokens:
+                scores += VECTOR_WEIGHT * _normalized(snapshot.bm25(tokens))
+            scores[anchor] = -np.inf
+        elif exact is not None:
+            scores = np.full(len(snapshot.docs), -np.inf, dtype=np.float32)
+            scores[exact] = 1.0
+        elif tokens:
+            lexical = snapshot.bm25(tokens)
+            dense = snapshot.vectors @ snapshot.query_vector(tokens)
+            if lexical.any():
+                scores = np.where(lexical > 0, _normalized(lexical) + VECTOR_WEIGHT * dense, -np.inf)
+            else:
+                # No word matched (e.g. a typo): fall back to the trigram-aware vectors alone
+                scores = np.where(dense >= MIN_SIMILARITY, dense, -np.inf)
+        else:
+            scores = np.where(np.isnan(snapshot.aum), -np.inf, snapshot.aum)
+
+        mask = snapshot.mask(asset_class, category, currency, risk_min, risk_max)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+
+        limit = max(1, min(int(limit), len(scores)))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results = []
+        for i in top:
+            if not np.isfinite(scores[i]):
+                break
+            results.append({**snapshot.docs[i], "score": round(float(scores[i]), 4) if tokens or similar_to else None})
+        return results
+
+
+def _normalized(scores: np.ndarray) -> np.ndarray:
+    top = scores.max()
+    return scores / top if top > 0 else scores
+
+
+_index: Optional[FundSearchIndex] = None
+
+
+def get_fund_search() -> Optional[FundSearchIndex]:
+    """The process-wide index, or None when none is configured/published yet"""
+    return _index if _index is not None and _index.loaded else None
+
+
+def init_fund_search_from_env() -> Optional[FundSearchIndex]:
+    global _index
+    root = os.getenv("FUND_SEARCH_INDEX_DIR")
+    if not root:
+        return None
+    _index = FundSearchIndex(root)
+    try:
+        if _index.refresh():
+            log_event("fund_search_index_loaded", index=_index.snapshot_name, funds=len(_index))
+    except Exception as e:
+        log_error("fund_search_index_load_failed", e)
+    return _index
+
+
+async def refresh_fund_search_periodically(index: FundSearchIndex, interval: float):
+    """Poll CURRENT and swap in indexes published by the ingestion job"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if index.refresh():
+                log_event("fund_search_index_loaded", index=index.snapshot_name, funds=len(index))
+        except Exception as e:
+            log_error("fund_search_index_refresh_failed", e)
@@ -0,0 +1,220 @@
+"""
+Token-budgeted conversation history compaction.
+
+The client sends the whole conversation on every turn. ``HistoryManager``
+keeps the prompt within ``budget_tokens``:
+
+- the system prompt and the most recent messages are kept verbatim;
+- older messages are replaced by one rolling summary message.
+
+Summaries are cached by a hash chain over the summarized prefix, so a turn
+whose prefix was already summarized costs nothing. When more turns fall out
+of the window, only the newly evicted messages are folded into the previous
+summary. The cut point advances in steps of ``summary_step`` messages, so the
+summary is recomputed every few turns rather than on each one.
+
+Tokens are counted locally with tiktoken when it is installed, otherwise with
+a characters-per-token estimate.
+"""
+import asyncio
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.observability import log_error
+
+# (previous summary or None, messages to fold in) -> new summary
+Summarizer = Callable[[Optional[str], List[Dict[str, Any]]], Awaitable[str]]
+
+# Per-message framing overhead of the chat format, and the reply primer
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation with this client:\n"
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4"):
+        self.exact = False
+        self._encoding = None
+        try:
+            import tiktoken
+        except ImportError:
+            return
+        try:
+            self._encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        self.exact = True
+
+    def text(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def message(self, message: Dict[str, Any]) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.text(message.get("content"))
+        if message.get("tool_calls"):
+            tokens += self.text(json.dumps(message["tool_calls"]))
+        return tokens
+
+    def messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.message(m) for m in messages) + REPLY_OVERHEAD_TOKENS
+
+
+@dataclass
+class CompactionResult:
+    messages: List[Dict[str, Any]]
+    original_tokens: int
+    prompt_tokens: int
+    summarized_messages: int = 0
+    summary_cached: bool = False
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.prompt_tokens
+
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "original_prompt_tokens": self.original_tokens,
+            "prompt_tokens_saved": self.saved_tokens,
+            "summarized_messages": self.summarized_messages,
+        }
+
+
+def _chain(previous: str, message: Dict[str, Any]) -> str:
+    payload = json.dumps([message.get("role"), message.get("content")], separators=(",", ":"))
+    return hashlib.sha256((previous + payload).encode()).hexdigest()
+
+
+class HistoryManager:
+    def __init__(
+        self,
+        summarize: Summarizer,
+        counter: TokenCounter,
+        budget_tokens: int = 6000,
+        min_recent_messages: int = 4,
+        summary_max_tokens: int = 300,
+        summary_step: int = 6,
+        cache_size: int = 1024,
+    ):
+        self.summarize = summarize
+        self.counter = counter
+        self.budget_tokens = budget_tokens
+        self.min_recent_messages = min_recent_messages
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_step = max(1, summary_step)
+        self.cache_size = cache_size
+        # prefix hash -> summary of that prefix
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        # prefix hash -> in-flight summarization, so concurrent turns share one call
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.summary_calls = 0
+        self.summary_hits = 0
+
+    def _cut_point(self, history: List[Dict[str, Any]], available: int) -> int:
+        """Index of the first message kept verbatim: the longest suffix that fits, advanced in steps"""
+        kept = 0
+        cut = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            kept += self.counter.message(history[i])
+            if kept > available:
+                break
+            cut = i
+        latest_allowed = len(history) - self.min_recent_messages
+        if latest_allowed <= 0:
+            return 0
+        cut = min(max(cut, 1), latest_allowed)
+        stepped = math.ceil(cut / self.summary_step) * self.summary_step
+        return stepped if stepped <= latest_allowed else cut
+
+    async def compact(self, messages: List[Dict[str, Any]]) -> CompactionResult:
+        original_tokens = self.counter.messages(messages)
+        if original_tokens <= self.budget_tokens:
+            return CompactionResult(messages, original_tokens, original_tokens)
+
+        head = messages[:1] if messages and messages[0].get("role") == "system" else []
+        history = messages[len(head):]
+        available = self.budget_tokens - self.counter.messages(head) - self.summary_max_tokens - MESSAGE_OVERHEAD_TOKENS
+        cut = self._cut_point(history, available)
+        if cut <= 0 or cut >= len(history):
+            return CompactionResult(messages, original_tokens, original_tokens)
+
+        try:
+            summary, cached = await self._summary_for(history[:cut])
+        except Exception as e:
+            # Better to drop the oldest turns than to overflow the context window
+            log_error("history_summary_failed", e, dropped_messages=cut)
+            compacted = head + history[cut:]
+            return CompactionResult(compacted, original_tokens, self.counter.messages(compacted), cut)
+        compacted = head + [{"role": "system", "content": SUMMARY_PREFIX + summary}] + history[cut:]
+        return CompactionResult(compacted, original_tokens, self.counter.messages(compacted), cut, cached)
+
+    async def _summary_for(self, prefix: List[Dict[str, Any]]):
+        """Summary of ``prefix``, extending the longest already-summarized prefix"""
+        hashes, h = [], ""
+        for message in prefix:
+            h = _chain(h, message)
+            hashes.append(h)
+        key = hashes[-1]
+
+        if key in self._summaries:
+            self._summaries.move_to_end(key)
+            self.summary_hits += 1
+            return self._summaries[key], True
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                # the request computing it went away; compute it ourselves unless we were cancelled
+                if not pending.cancelled():
+                    raise
+
+        start, previous = 0, None
+        for i in range(len(hashes) - 2, -1, -1):
+            if hashes[i] in self._summaries:
+                start, previous = i + 1, self._summaries[hashes[i]]
+                break
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            self.summary_calls += 1
+            summary = await self.summarize(previous, prefix[start:])
+            self._summaries[key] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+            future.set_result(summary)
+            return summary, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # waiters re-raise it; mark it retrieved so an unobserved failure is not logged
+            future.exception()
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "exact_token_counts": self.counter.exact,
+            "cached_summaries": len(self._summaries),
+            "summary_calls": self.summary_calls,
+            "summary_hits": self.summary_hits,
+        }
+
+
+def format_transcript(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
@@ -0,0 +1,327 @@
+"""
+Upstream model routing: per-class model choice, per-model concurrency limits,
+failover and hedging.
+
+A route is one model behind one client, with its own concurrency cap and
+parameter overrides (e.g. ``max_tokens``). Each request class has an ordered
+list of routes:
+
+- ``short``: quick factual questions, routed to a fast model first.
+- ``planning``: long or planning-type questions, routed to the strongest model first.
+
+For each call the router tries the class's routes in order:
+
+- A route whose slots are all taken is skipped while other candidates remain,
+  so load overflows to the next model. The last candidate is waited for.
+- A 429, a timeout, a connection error or a 5xx fails over to the next route.
+  For streams this includes a first chunk that does not arrive within
+  ``first_token_timeout``. Failover only happens before anything reaches the
+  client.
+- With ``hedge_after`` set, a call that has produced nothing after that many
+  seconds gets a second request on the next route (or the same one). The first
+  to start streaming wins, and the other is cancelled.
+
+Without a config file there is a single route made from the app's default
+client and parameters, so behaviour matches a direct call.
+"""
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from src.observability import UPSTREAM_ATTEMPTS
+
+REQUEST_CLASSES = ("short", "planning")
+
+# Questions that call for a considered, multi-part answer
+_PLANNING_TERMS = re.compile(
+    r"\b(plan|planning|portfolio|allocat\w*|retire\w*|strateg\w*|rebalanc\w*|diversif\w*|estate|tax\w*|"
+    r"compare|comparison|pros and cons|step[- ]by[- ]step)\b",
+    re.IGNORECASE,
+)
+PLANNING_MIN_WORDS = 60
+
+
+class RouteSaturated(Exception):
+    """All concurrency slots of a route are taken"""
+
+
+@dataclass
+class RouteStats:
+    calls: int = 0
+    ok: int = 0
+    rate_limited: int = 0
+    timeouts: int = 0
+    unavailable: int = 0
+    saturated: int = 0
+    errors: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+
+
+@dataclass
+class ModelRoute:
+    name: str
+    client: AsyncOpenAI
+    model: str
+    max_concurrency: int = 64
+    # Overrides of the app's default request parameters, e.g. max_tokens or temperature
+    params: Dict[str, Any] = field(default_factory=dict)
+    # Seconds until the first chunk (streams) or the whole answer (non-streaming) before failing over
+    first_token_timeout: Optional[float] = None
+    stats: RouteStats = field(default_factory=RouteStats)
+
+    def __post_init__(self):
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"model": self.model, "max_concurrency": self.max_concurrency, "in_flight": self.in_flight,
+                **self.stats.__dict__}
+
+
+class RoutedStream:
+    """An upstream stream whose first chunk has already been read, holding its route slot until closed"""
+
+    def __init__(self, route: ModelRoute, stream, iterator, first, release):
+        self.route = route
+        self._stream = stream
+        self._iterator = iterator
+        self._first = first
+        self._release = release
+        self._closed = False
+
+    async def __aiter__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.close()
+        finally:
+            self._release()
+
+
+def _failure_kind(error: BaseException) -> Optional[str]:
+    """Stats field of a failure worth failing over on, or None for errors another model would repeat"""
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return "timeouts"
+    if isinstance(error, RouteSaturated):
+        return "saturated"
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return "unavailable"
+    return None
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        routes: List[ModelRoute],
+        classes: Dict[str, List[str]],
+        default_params: Dict[str, Any],
+        hedge_after: float = 0.0,
+        queue_timeout: float = 30.0,
+    ):
+        self.routes = {route.name: route for route in routes}
+        for request_class, names in classes.items():
+            unknown = [name for name in names if name not in self.routes]
+            if unknown or not names:
+                raise ValueError(f"Request class {request_class!r} has no routes or unknown routes {unknown}")
+        self.classes = classes
+        # The app's parameters without the model, which each route sets
+        self.default_params = {k: v for k, v in default_params.items() if k != "model"}
+        self.hedge_after = hedge_after
+        self.queue_timeout = queue_timeout
+
+    @staticmethod
+    def classify(messages: List[Dict[str, Any]]) -> str:
+        """Request class of a conversation, from its latest user message"""
+        question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        if len(question.split()) >= PLANNING_MIN_WORDS or _PLANNING_TERMS.search(question):
+            return "planning"
+        return "short"
+
+    def candidates(self, request_class: str) -> List[ModelRoute]:
+        names = self.classes.get(request_class) or next(iter(self.classes.values()))
+        return [self.routes[name] for name in names]
+
+    def route_params(self, route_name: str) -> Dict[str, Any]:
+        """Parameters a route's requests are sent with, model included"""
+        route = self.routes[route_name]
+        return {"model": route.model, **self.default_params, **route.params}
+
+    async def create(self, request_class: str, **kwargs) -> Tuple[str, Any]:
+        """Chat completion on the best available route of the class; returns (route name, response).
+
+        With ``stream=True`` the response is a ``RoutedStream``, which the caller must close.
+        """
+        queue = self.candidates(request_class)
+        primary = queue[0]
+        # task -> (route, whether it is the hedge)
+        pending: Dict[asyncio.Future, Tuple[ModelRoute, bool]] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(route: ModelRoute, wait: bool, hedge: bool = False):
+            if hedge:
+                route.stats.hedges += 1
+            pending[asyncio.ensure_future(self._open(route, kwargs, wait))] = (route, hedge)
+
+        launch(queue.pop(0), wait=not queue)
+        try:
+            while pending:
+                can_hedge = self.hedge_after > 0 and not hedged and len(pending) == 1
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_after if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Nothing yet: race a second request, preferring another model
+                    hedged = True
+                    launch(queue.pop(0) if queue else primary, wait=False, hedge=True)
+                    continue
+
+                for task in done:
+                    route, hedge = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if hedge:
+                            route.stats.hedge_wins += 1
+                        return route.name, task.result()
+                    kind = _failure_kind(error)
+                    if kind is None:
+                        raise error
+                    last_error = error
+                if not pending and queue:
+                    launch(queue.pop(0), wait=not queue)
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Losers that opened a stream before the cancellation landed must give their slot back
+                for result in await asyncio.gather(*pending, return_exceptions=True):
+                    if isinstance(result, RoutedStream):
+                        await result.close()
+
+    async def _open(self, route: ModelRoute, kwargs: Dict[str, Any], wait: bool):
+        route.stats.calls += 1
+        try:
+            if not wait and route.slots.locked():
+                raise RouteSaturated(route.name)
+            try:
+                await asyncio.wait_for(route.slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise RouteSaturated(route.name)
+            route.in_flight += 1
+
+            def release():
+                route.in_flight -= 1
+                route.slots.release()
+
+            try:
+                response = await asyncio.wait_for(self._start(route, kwargs, release), timeout=route.first_token_timeout)
+            except BaseException:
+                release()
+                raise
+            if not isinstance(response, RoutedStream):
+                release()
+        except asyncio.CancelledError:
+            UPSTREAM_ATTEMPTS.labels(route.name, "cancelled").inc()
+            raise
+        except Exception as e:
+            kind = _failure_kind(e) or "errors"
+            setattr(route.stats, kind, getattr(route.stats, kind) + 1)
+            UPSTREAM_ATTEMPTS.labels(route.name, kind).inc()
+            raise
+        route.stats.ok += 1
+        UPSTREAM_ATTEMPTS.labels(route.name, "ok").inc()
+        return response
+
+    async def _start(self, route: ModelRoute, kwargs: Dict[str, Any], release):
+        """Send the request; for streams, also wait for the first chunk. The stream releases the slot on close"""
+        response = await route.client.chat.completions.create(
+            model=route.model, **{**self.default_params, **route.params, **kwargs}
+        )
+        if not kwargs.get("stream"):
+            return response
+        try:
+            iterator = response.__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                first = None
+        except BaseException:
+            await response.close()
+            raise
+        return RoutedStream(route, response, iterator, first, release)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hedge_after": self.hedge_after,
+            "classes": self.classes,
+            "routes": {name: route.snapshot() for name, route in self.routes.items()},
+        }
+
+
+def _route_client(spec: Dict[str, Any], max_concurrency: int) -> AsyncOpenAI:
+    # Hedged requests can briefly double the connections a route needs
+    return AsyncOpenAI(
+        api_key=os.getenv(spec.get("api_key_env", "OPENAI_API_KEY")),
+        base_url=spec.get("base_url") or os.getenv("OPENAI_BASE_URL") or None,
+        # The router fails over instead of retrying the same upstream
+        max_retries=int(spec.get("max_retries", 0)),
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=2 * max_concurrency, max_keepalive_connections=max_concurrency),
+        ),
+    )
+
+
+def create_model_router_from_env(default_client: AsyncOpenAI, default_params: Dict[str, Any],
+                                 default_max_concurrency: int) -> ModelRouter:
+    """Router from the JSON file at MODEL_ROUTER_CONFIG, or a single route on the default client.
+
+    The file maps ``routes`` (name -> model, max_concurrency, params, first_token_timeout and
+    optionally base_url, api_key_env, max_retries) and ``classes`` (request class -> route names
+    in order of preference), plus an optional ``hedge_after``.
+    """
+    path = os.getenv("MODEL_ROUTER_CONFIG")
+    first_token_timeout = float(os.getenv("MODEL_FIRST_TOKEN_TIMEOUT", "0")) or None
+    if path:
+        with open(path) as f:
+            config = json.load(f)
+        routes = []
+        for name, spec in config["routes"].items():
+            max_concurrency = int(spec.get("max_concurrency", default_max_concurrency))
+            routes.append(ModelRoute(
+                name=name,
+                client=_route_client(spec, max_concurrency),
+                model=spec["model"],
+                max_concurrency=max_concurrency,
+                params=spec.get("params", {}),
+                first_token_timeout=spec.get("first_token_timeout", first_token_timeout),
+            ))
+        classes = config.get("classes") or {c: list(config["routes"]) for c in REQUEST_CLASSES}
+        hedge_after = float(config.get("hedge_after", 0))
+    else:
+        routes = [ModelRoute("default", default_client, default_params["model"], default_max_concurrency,
+                             first_token_timeout=first_token_timeout)]
+        classes = {c: ["default"] for c in REQUEST_CLASSES}
+        hedge_after = 0.0
+    if os.getenv("MODEL_HEDGE_AFTER"):
+        hedge_after = float(os.getenv("MODEL_HEDGE_AFTER"))
+    return ModelRouter(routes, classes, default_params, hedge_after=hedge_after,
+                       queue_timeout=float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30")))
@@ -0,0 +1,138 @@
+"""
+In-process columnar NAV store backed by the memory-mapped snapshot that the
+ingestion job publishes (see database/nav_snapshot.py for the on-disk layout).
+
+The whole ``nav`` table is two contiguous arrays (int32 epoch days, float64
+close) plus an ISIN -> (offset, length) index. Arrays are opened with
+``mmap_mode="r"``, so every worker process maps the same page-cache pages
+instead of holding its own copy. A fund's series is a slice, and a date range
+within it is two ``searchsorted`` calls (O(log n)).
+
+``refresh()`` re-reads the snapshot's ``CURRENT`` pointer and swaps in the new
+snapshot with a single reference assignment, so in-flight readers keep the old
+arrays until they finish.
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.observability import log_error, log_event
+
+EPOCH = np.datetime64("1970-01-01", "D")
+CURRENT_FILE = "CURRENT"
+
+
+def to_epoch_days(value: date) -> int:
+    return int((np.datetime64(value, "D") - EPOCH).astype(np.int64))
+
+
+@dataclass
+class NavSnapshot:
+    name: str
+    dates: np.ndarray
+    close: np.ndarray
+    index: Dict[str, Tuple[int, int]]
+
+    @classmethod
+    def load(cls, root: str, name: str) -> "NavSnapshot":
+        path = os.path.join(root, name)
+        with open(os.path.join(path, "index.json")) as f:
+            meta = json.load(f)
+        rows = meta["rows"]
+        dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")[:rows]
+        close = np.load(os.path.join(path, "close.npy"), mmap_mode="r")[:rows]
+        index = {isin: (offset, length) for isin, offset, length in zip(meta["isins"], meta["offsets"], meta["lengths"])}
+        return cls(name, dates, close, index)
+
+
+class NavStore:
+    def __init__(self, root: str):
+        self.root = root
+        self._snapshot: Optional[NavSnapshot] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot_name(self) -> Optional[str]:
+        return self._snapshot.name if self._snapshot else None
+
+    def refresh(self) -> bool:
+        """Load the snapshot named by CURRENT if it changed; returns True when a new one was swapped in"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if self._snapshot is not None and self._snapshot.name == name:
+            return False
+        self._snapshot = NavSnapshot.load(self.root, name)
+        return True
+
+    def isins(self) -> List[str]:
+        return list(self._snapshot.index) if self._snapshot else []
+
+    def __contains__(self, isin: str) -> bool:
+        return self._snapshot is not None and isin in self._snapshot.index
+
+    def series(self, isin: str, start: Optional[date] = None, end: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(epoch-day dates, closes) views for one fund within [start, end]; empty if unknown"""
+        snapshot = self._snapshot
+        if snapshot is None or isin not in snapshot.index:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        offset, length = snapshot.index[isin]
+        dates = snapshot.dates[offset:offset + length]
+        close = snapshot.close[offset:offset + length]
+        lo = 0 if start is None else int(np.searchsorted(dates, to_epoch_days(start), side="left"))
+        hi = length if end is None else int(np.searchsorted(dates, to_epoch_days(end), side="right"))
+        return dates[lo:hi], close[lo:hi]
+
+    def latest(self, isin: str) -> Optional[Tuple[date, float]]:
+        dates, close = self.series(isin)
+        if len(dates) == 0:
+            return None
+        return to_date(dates[-1]), float(close[-1])
+
+
+def to_date(epoch_days) -> date:
+    return (EPOCH + np.timedelta64(int(epoch_days), "D")).astype(date)
+
+
+def iso_dates(epoch_days: np.ndarray) -> List[str]:
+    return (epoch_days.astype("datetime64[D]")).astype(str).tolist()
+
+
+_store: Optional[NavStore] = None
+
+
+def get_nav_store() -> Optional[NavStore]:
+    """The process-wide store, or None when no snapshot is configured/published yet"""
+    return _store if _store is not None and _store.loaded else None
+
+
+def init_nav_store_from_env() -> Optional[NavStore]:
+    global _store
+    root = os.getenv("NAV_SNAPSHOT_DIR")
+    if not root:
+        return None
+    _store = NavStore(root)
+    if _store.refresh():
+        log_event("nav_snapshot_loaded", snapshot=_store.snapshot_name)
+    return _store
+
+
+async def refresh_nav_store_periodically(store: NavStore, interval: float):
+    """Poll CURRENT and swap in snapshots published by the ingestion job"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if store.refresh():
+                log_event("nav_snapshot_loaded", snapshot=store.snapshot_name)
+        except Exception as e:
+            log_error("nav_snapshot_refresh_failed", e)
@@ -0,0 +1,215 @@
+"""
+Request metrics, timing spans and structured logging.
+
+Metrics are Prometheus collectors served at ``/metrics``:
+
+- HTTP request counts and latency per route template, from ``MetricsMiddleware``.
+- Chat timing per endpoint, recorded by ``ChatSpan``: request parse, upstream
+  connect, time to first token, total duration and tokens per second.
+- Token and streamed-byte counters.
+- In-flight stream and upstream-call gauges.
+- Error counters by stage and exception type.
+
+Logs are one JSON object per line on the ``neuralfin`` logger. Hot-path events
+(one per chat request) are sampled at ``LOG_SAMPLE_RATE``; warnings and errors
+are always written. Events carry counts and timings, never message content.
+
+Under the multi-worker server (``gunicorn.conf.py``) each worker writes its
+samples to ``PROMETHEUS_MULTIPROC_DIR`` and ``/metrics`` aggregates all workers.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request duration until the last body byte",
+                          ["method", "route"], buckets=_LATENCY_BUCKETS)
+
+CHAT_REQUESTS = Counter("chat_requests_total", "Chat requests by outcome", ["endpoint", "outcome"])
+CHAT_PARSE = Histogram("chat_request_parse_seconds", "Request body read and validation", ["endpoint"], buckets=_FAST_BUCKETS)
+CHAT_UPSTREAM_CONNECT = Histogram("chat_upstream_connect_seconds", "Upstream call until response headers",
+                                  ["endpoint"], buckets=_LATENCY_BUCKETS)
+CHAT_TTFT = Histogram("chat_time_to_first_token_seconds", "Request arrival to first answer token",
+                      ["endpoint"], buckets=_LATENCY_BUCKETS)
+CHAT_DURATION = Histogram("chat_request_duration_seconds", "Request arrival to complete answer",
+                          ["endpoint"], buckets=_LATENCY_BUCKETS)
+CHAT_TOKENS_PER_SECOND = Histogram("chat_tokens_per_second", "Completion tokens per second after the first token",
+                                   ["endpoint"], buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400))
+CHAT_TOKENS = Counter("chat_tokens_total", "Prompt and completion tokens spent upstream", ["endpoint", "kind"])
+CHAT_COALESCED = Counter("chat_coalesced_total", "Streams served by joining an identical in-flight upstream call", ["endpoint"])
+CHAT_BYTES = Counter("chat_stream_bytes_total", "Bytes of SSE frames sent to clients", ["endpoint"])
+UPSTREAM_ATTEMPTS = Counter("chat_upstream_attempts_total", "Upstream calls per model route by outcome",
+                            ["route", "outcome"])
+CHAT_ERRORS = Counter("chat_errors_total", "Chat errors by stage and exception type", ["endpoint", "stage", "type"])
+# livesum: summed over the workers that are still running
+STREAMS_IN_FLIGHT = Gauge("chat_streams_in_flight", "Chat responses currently streaming", multiprocess_mode="livesum")
+UPSTREAM_IN_FLIGHT = Gauge("chat_upstream_in_flight", "Upstream model calls currently in flight",
+                           multiprocess_mode="livesum")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+logger = logging.getLogger("neuralfin")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "info").upper())
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, sampled: bool = False, **fields):
+    """Write one structured log line; sampled events are kept with probability LOG_SAMPLE_RATE"""
+    if sampled and level < logging.WARNING and random.random() >= LOG_SAMPLE_RATE:
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def log_error(event: str, error: BaseException, **fields):
+    log_event(event, logging.ERROR, error=str(error), error_type=type(error).__name__, **fields)
+
+
+class ChatSpan:
+    """Timings and counters of one chat request, recorded to metrics and a sampled log line on finish"""
+
+    def __init__(self, endpoint: str, request_start: Optional[float] = None):
+        self.endpoint = endpoint
+        self.start = request_start if request_start is not None else time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.bytes = 0
+        # text deltas delivered to the client, for TTFT and tokens/sec
+        self.tokens_sent = 0
+        # tokens spent upstream; the delivered count stands in when the upstream does not report usage
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        # served from another request's upstream call, so no tokens were spent for it
+        self.coalesced = False
+        self.fields: Dict[str, Any] = {}
+        self.finished = False
+
+    def mark(self, name: str):
+        """Seconds since request arrival at which ``name`` happened (first occurrence wins)"""
+        self.marks.setdefault(name, time.perf_counter() - self.start)
+
+    def since(self, name: str) -> Optional[float]:
+        return self.marks.get(name)
+
+    def token(self, count: int = 1):
+        self.mark("first_token")
+        self.tokens_sent += count
+
+    def sent(self, frame: str) -> str:
+        self.bytes += len(frame.encode("utf-8"))
+        return frame
+
+    def error(self, stage: str, error: BaseException):
+        CHAT_ERRORS.labels(self.endpoint, stage, type(error).__name__).inc()
+        log_error("chat_error", error, endpoint=self.endpoint, stage=stage)
+
+    def finish(self, outcome: str):
+        if self.finished:
+            return
+        self.finished = True
+        total = time.perf_counter() - self.start
+        endpoint = self.endpoint
+        CHAT_REQUESTS.labels(endpoint, outcome).inc()
+        if "parsed" in self.marks:
+            CHAT_PARSE.labels(endpoint).observe(self.marks["parsed"])
+        if "upstream_headers" in self.marks and "upstream_start" in self.marks:
+            CHAT_UPSTREAM_CONNECT.labels(endpoint).observe(self.marks["upstream_headers"] - self.marks["upstream_start"])
+        if "first_token" in self.marks:
+            CHAT_TTFT.labels(endpoint).observe(self.marks["first_token"])
+        tokens_per_second = None
+        if outcome in ("ok", "cached"):
+            CHAT_DURATION.labels(endpoint).observe(total)
+            generating = total - self.marks.get("first_token", total)
+            if self.tokens_sent > 1 and generating > 0:
+                tokens_per_second = (self.tokens_sent - 1) / generating
+                CHAT_TOKENS_PER_SECOND.labels(endpoint).observe(tokens_per_second)
+        completion_tokens = self.completion_tokens if self.completion_tokens is not None else self.tokens_sent
+        if self.coalesced:
+            CHAT_COALESCED.labels(endpoint).inc()
+            completion_tokens = 0
+        else:
+            if self.prompt_tokens:
+                CHAT_TOKENS.labels(endpoint, "prompt").inc(self.prompt_tokens)
+            if completion_tokens:
+                CHAT_TOKENS.labels(endpoint, "completion").inc(completion_tokens)
+        if self.bytes:
+            CHAT_BYTES.labels(endpoint).inc(self.bytes)
+
+        log_event(
+            "chat_request",
+            sampled=outcome in ("ok", "cached"),
+            endpoint=endpoint,
+            outcome=outcome,
+            duration_ms=round(total * 1000, 1),
+            **{f"{name}_ms": round(value * 1000, 1) for name, value in self.marks.items()},
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=completion_tokens,
+            coalesced=self.coalesced,
+            tokens_per_second=round(tokens_per_second, 1) if tokens_per_second else None,
+            bytes=self.bytes,
+            **self.fields,
+        )
+
+
+def request_start(request) -> Optional[float]:
+    """Arrival time stamped by MetricsMiddleware, if installed"""
+    return request.scope.get("state", {}).get("request_start")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (so streaming and disconnect detection are untouched) for HTTP metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = start
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # route templates keep label cardinality bounded (no ISINs or session ids)
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], path, str(status["code"])).inc()
+            HTTP_DURATION.labels(scope["method"], path).observe(time.perf_counter() - start)
+
+
+def metrics_payload():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,647 @@
+"""
+Portfolio construction over the fund universe.
+
+Covariance
+    Daily log returns over a lookback window are taken from the NAV store. The
+    window uses the dates that at least half the funds priced; a fund's missing
+    days are forward-filled. The sample covariance is shrunk toward a scaled
+    identity, with the Ledoit-Wolf or the OAS intensity. All statistics come
+    from batched array operations. The model is kept in factor form,
+    ``Σ = a·XᵀX + b·I`` with ``X`` the T×N demeaned returns. A product ``Σw``
+    then costs O(TN). When a universe has more funds than observations,
+    nothing N×N is ever built.
+
+Optimization
+    Minimum-variance and mean-variance portfolios are solved by accelerated
+    projected gradient (FISTA). The projection onto ``{Σw = 1,
+    0 ≤ w ≤ max_weight, class sum ≤ cap}`` is exact. It is
+    ``w = clip(v − τ_class, 0, max_weight)``, with one threshold per asset
+    class found by a safeguarded Newton search. Once the set of funds at a
+    bound stops changing, a primal active-set step on the few funds that
+    hold weight finishes the solve exactly. Risk parity solves
+    ``min ½yᵀΣy − Σ bᵢ log yᵢ`` by damped coordinate updates and normalizes
+    ``y``. If that result breaks a constraint, it is projected onto the
+    constraints and flagged. Funds above the risk-indicator ceiling never
+    enter the universe.
+
+Covariance models are cached by NAV snapshot, universe, lookback and
+estimator, under a byte budget. Results are cached per request. A repeat
+request costs a dictionary lookup, and a new constraint set only the solve.
+"""
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.nav_store import NavStore, to_date
+from src.observability import log_event
+
+TRADING_DAYS = 252
+ESTIMATORS = ("ledoit_wolf", "oas")
+OBJECTIVES = ("min_variance", "mean_variance", "risk_parity")
+DEFAULT_RISK_AVERSION = 5.0
+# A fund needs prices on this share of the window's dates to be included
+MIN_COVERAGE = 0.8
+MIN_OBSERVATIONS = 60
+# Historical mean returns are noisy; they are pulled this far toward the universe average
+MEAN_SHRINKAGE = 0.5
+# Weights below this are solver noise and reported as zero
+MIN_HOLDING = 1e-8
+UNCLASSIFIED = "Unclassified"
+
+
+class PortfolioError(ValueError):
+    """A request that cannot be solved as asked (infeasible constraints, too little history)"""
+
+
+@dataclass
+class Fund:
+    isin: str
+    asset_class: Optional[str] = None
+    risk: Optional[int] = None
+
+
+@dataclass
+class CovarianceModel:
+    """Annualized ``Σ = a·XᵀX + b·I`` over ``isins``, plus shrunk expected returns"""
+    isins: List[str]
+    start: str
+    end: str
+    observations: int
+    estimator: str
+    shrinkage: float
+    mean: np.ndarray
+    variance: np.ndarray
+    factor: Optional[np.ndarray]
+    a: float
+    b: float
+    dense: Optional[np.ndarray] = None
+    _lambda_max: Optional[float] = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.mean, self.variance, self.factor, self.dense) if a is not None)
+
+    def matvec(self, w: np.ndarray) -> np.ndarray:
+        if self.dense is not None:
+            return self.dense @ w
+        return self.a * (self.factor.T @ (self.factor @ w)) + self.b * w
+
+    def lambda_max(self) -> float:
+        """Largest eigenvalue by power iteration; sets the gradient step"""
+        if self._lambda_max is None:
+            v = np.full(len(self.isins), 1 / math.sqrt(len(self.isins)))
+            estimate = 0.0
+            for _ in range(100):
+                u = self.matvec(v)
+                norm = float(np.linalg.norm(u))
+                if norm == 0:
+                    break
+                v = u / norm
+                if abs(norm - estimate) <= 1e-6 * norm:
+                    estimate = norm
+                    break
+                estimate = norm
+            self._lambda_max = estimate * 1.01 or 1.0
+        return self._lambda_max
+
+
+def returns_matrix(store: NavStore, isins: Sequence[str], lookback_days: int):
+    """(window dates, T×N daily log returns, included isins, excluded {isin: reason})"""
+    series, excluded = [], {}
+    for isin in isins:
+        days, closes = store.series(isin)
+        if len(days) < 2:
+            excluded[isin] = "no NAV history"
+        else:
+            series.append((isin, days, closes))
+    if not series:
+        raise PortfolioError("None of the funds has NAV history")
+
+    hi = max(int(days[-1]) for _, days, _ in series)
+    lo = hi - lookback_days
+    counts = np.zeros(hi - lo + 1, dtype=np.int64)
+    for _, days, _ in series:
+        first = int(np.searchsorted(days, lo, side="left"))
+        counts += np.bincount(days[first:] - lo, minlength=len(counts))
+    grid = lo + np.flatnonzero(counts >= max(1, len(series) / 2))
+    if len(grid) <= MIN_OBSERVATIONS:
+        raise PortfolioError(f"Only {len(grid)} common pricing dates in the last {lookback_days} days")
+
+    prices = np.empty((len(grid), len(series)), dtype=np.float64)
+    included = []
+    for isin, days, closes in series:
+        if days[0] > grid[0]:
+            excluded[isin] = "history starts after the lookback window"
+            continue
+        first = int(np.searchsorted(days, grid[0], side="right")) - 1
+        if len(days) - first < MIN_COVERAGE * len(grid):
+            excluded[isin] = "too few prices in the lookback window"
+            continue
+        window = closes[np.searchsorted(days, grid, side="right") - 1]
+        if not np.all(window > 0):
+            excluded[isin] = "non-positive prices"
+            continue
+        prices[:, len(included)] = window
+        included.append(isin)
+    if not included:
+        raise PortfolioError("No fund has enough NAV history in the lookback window")
+    returns = np.diff(np.log(prices[:, :len(included)]), axis=0)
+    return grid, returns, included, excluded
+
+
+def shrinkage_covariance(returns: np.ndarray, estimator: str = "ledoit_wolf"):
+    """
+    Shrink the sample covariance of T×N daily returns toward ``mu·I``.
+    Returns (X, gram, a, b, shrinkage) with the annualized ``Σ = a·XᵀX + b·I``;
+    ``gram`` is XXᵀ or XᵀX, whichever is smaller.
+    """
+    t, n = returns.shape
+    x = returns - returns.mean(axis=0)
+    sq_norms = np.einsum("ij,ij->i", x, x)
+    mu = sq_norms.sum() / t / n
+    # XXᵀ and XᵀX have the same Frobenius norm, so use the smaller one
+    gram = x @ x.T if t <= n else x.T @ x
+    s_norm2 = float(np.einsum("ij,ij->", gram, gram)) / t ** 2
+    if estimator == "ledoit_wolf":
+        delta = (s_norm2 - n * mu ** 2) / n
+        beta = (float(np.sum(sq_norms ** 2)) / t ** 2 - s_norm2 / t) / n
+        shrinkage = 0.0 if delta <= 0 else min(max(beta, 0.0) / delta, 1.0)
+    elif estimator == "oas":
+        alpha = s_norm2 / n ** 2
+        den = (t + 1) * (alpha - mu ** 2 / n)
+        shrinkage = 1.0 if den <= 0 else min((alpha + mu ** 2) / den, 1.0)
+    else:
+        raise PortfolioError(f"Unknown estimator {estimator}; use one of {', '.join(ESTIMATORS)}")
+    shrinkage = float(shrinkage)
+    a = (1 - shrinkage) / t * TRADING_DAYS
+    b = shrinkage * float(mu) * TRADING_DAYS
+    return x, gram, a, b, shrinkage
+
+
+def estimate_covariance(store: NavStore, isins: Sequence[str], lookback_days: int,
+                        estimator: str = "ledoit_wolf") -> Tuple[CovarianceModel, Dict[str, str]]:
+    grid, returns, included, excluded = returns_matrix(store, isins, lookback_days)
+    t, n = returns.shape
+    x, gram, a, b, shrinkage = shrinkage_covariance(returns, estimator)
+    mean = returns.mean(axis=0) * TRADING_DAYS
+    mean = (1 - MEAN_SHRINKAGE) * mean + MEAN_SHRINKAGE * mean.mean()
+    model = CovarianceModel(
+        isins=included, start=to_date(grid[0]).isoformat(), end=to_date(grid[-1]).isoformat(), observations=t,
+        estimator=estimator, shrinkage=shrinkage, mean=mean,
+        variance=a * np.einsum("ij,ij->j", x, x) + b, factor=x, a=a, b=b,
+    )
+    if n <= t:
+        # Fewer funds than observations: the dense N×N matrix is the smaller form
+        model.dense = a * gram + b * np.eye(n)
+        model.factor = None
+    return model, excluded
+
+
+def _class_thresholds(v, upper, groups, targets, lo, hi, iterations=100):
+    """
+    Per-class τ with Σ_class clip(v − τ, 0, upper) = target, for every class at once.
+    The sum is piecewise linear and decreasing in τ, so Newton steps are exact on
+    the right piece; steps leaving the bracket fall back to bisection.
+    """
+    size = len(targets)
+    tau = (lo + hi) / 2
+    for _ in range(iterations):
+        shifted = v - tau[groups]
+        excess = np.bincount(groups, np.clip(shifted, 0, upper), size) - targets
+        if np.all(np.abs(excess) <= 1e-12):
+            break
+        lo = np.where(excess > 0, tau, lo)
+        hi = np.where(excess < 0, tau, hi)
+        slope = np.bincount(groups, (shifted > 0) & (shifted < upper), size)
+        newton = tau + excess / np.maximum(slope, 1)
+        tau = np.where((slope > 0) & (newton > lo) & (newton < hi), newton, (lo + hi) / 2)
+    return tau
+
+
+def project(v: np.ndarray, upper: np.ndarray, groups: np.ndarray, caps: np.ndarray) -> np.ndarray:
+    """
+    Euclidean projection onto {Σw = 1, 0 ≤ w ≤ upper, Σ_class w ≤ cap}: w = clip(v − τ_class, 0, upper).
+    Classes below their cap share one τ; a class at its cap gets a larger one.
+    """
+    size = len(caps)
+    lo, hi = float(np.min(v - upper)), float(np.max(v))
+    tau = (lo + hi) / 2
+    for _ in range(100):
+        shifted = v - tau
+        sums = np.bincount(groups, np.clip(shifted, 0, upper), size)
+        total = float(np.minimum(sums, caps).sum())
+        if abs(total - 1) <= 1e-12:
+            break
+        if total > 1:
+            lo = tau
+        else:
+            hi = tau
+        free = np.bincount(groups, (shifted > 0) & (shifted < upper), size)
+        slope = float(free[sums < caps].sum())
+        newton = tau + (total - 1) / slope if slope > 0 else hi
+        tau = newton if lo < newton < hi else (lo + hi) / 2
+
+    sums = np.bincount(groups, np.clip(v - tau, 0, upper), size)
+    taus = np.full(size, tau)
+    capped = sums > caps
+    if capped.any():
+        class_max = np.full(size, -np.inf)
+        np.maximum.at(class_max, groups, v)
+        solved = _class_thresholds(v, upper, groups, np.where(capped, caps, sums), taus.copy(), class_max)
+        taus = np.where(capped, solved, tau)
+    return np.clip(v - taus[groups], 0, upper)
+
+
+def _polish(model: CovarianceModel, linear: np.ndarray, gamma: float, w: np.ndarray, constraints,
+            max_free: int = 500, rounds: int = 300) -> Optional[np.ndarray]:
+    """
+    Finish from an approximate solution with a primal active-set method. Each
+    round solves the equality-constrained QP on the current active set and
+    steps towards it as far as the bounds and class caps allow, fixing the
+    first one hit; at the active-set optimum, variables and caps with the wrong
+    multiplier sign are released. Returns the exact optimum, or None when the
+    active set is too large or does not settle.
+    """
+    upper, groups, caps = constraints
+    at_upper = w >= upper - 1e-12
+    free = (w > 1e-12) & ~at_upper
+    current = np.where(free, w, np.where(at_upper, upper, 0.0))
+    capped = np.bincount(groups, current, len(caps)) >= caps - 1e-10
+    for _ in range(rounds):
+        free_idx = np.flatnonzero(free)
+        if len(free_idx) == 0 or len(free_idx) > max_free:
+            return None
+        # A capped class with no free weight is held at its cap by the bounds alone
+        capped &= np.bincount(groups[free_idx], minlength=len(caps)) > 0
+        # Block 0: the budget over classes below their cap; block k: capped class k-1 at its cap
+        capped_idx = np.flatnonzero(capped)
+        block = np.zeros(len(caps), dtype=np.int64)
+        block[capped_idx] = np.arange(1, len(capped_idx) + 1)
+        blocks = block[groups]
+        fixed = np.where(at_upper, upper, 0.0)
+        rhs = np.r_[1 - caps[capped_idx].sum(), caps[capped_idx]] - np.bincount(blocks, fixed, len(capped_idx) + 1)
+        members = np.bincount(blocks[free_idx], minlength=len(capped_idx) + 1)
+        if np.any((members == 0) & (np.abs(rhs) > 1e-10)):
+            return None
+        used = np.flatnonzero(members > 0)
+        a_free = (blocks[free_idx][None, :] == used[:, None]).astype(np.float64)
+
+        if model.dense is not None:
+            sigma_ff = model.dense[np.ix_(free_idx, free_idx)]
+        else:
+            x_free = model.factor[:, free_idx]
+            sigma_ff = model.a * (x_free.T @ x_free) + model.b * np.eye(len(free_idx))
+        kkt = np.block([[gamma * sigma_ff, a_free.T], [a_free, np.zeros((len(used), len(used)))]])
+        target = np.r_[linear[free_idx] - gamma * model.matvec(fixed)[free_idx], rhs[used]]
+        try:
+            solution = np.linalg.solve(kkt, target)
+        except np.linalg.LinAlgError:
+            return None
+        candidate = fixed.copy()
+        candidate[free_idx] = solution[:len(free_idx)]
+
+        # Primal step: go towards the candidate until a bound or an open class cap blocks
+        direction = candidate - current
+        class_step = np.bincount(groups, direction, len(caps))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            to_zero = np.where(free & (direction < 0), current / -direction, np.inf)
+            to_upper = np.where(free & (direction > 0), (upper - current) / direction, np.inf)
+            to_cap = np.where(~capped & (class_step > 0),
+                              (caps - np.bincount(groups, current, len(caps))) / class_step, np.inf)
+        limits = np.maximum([to_zero.min(), to_upper.min(), to_cap.min()], 0.0)
+        if limits.min() < 1:
+            current = current + limits.min() * direction
+            blocking = int(np.argmin(limits))
+            if blocking == 0:
+                i = int(np.argmin(to_zero))
+                free[i], current[i] = False, 0.0
+            elif blocking == 1:
+                i = int(np.argmin(to_upper))
+                free[i], at_upper[i], current[i] = False, True, upper[i]
+            else:
+                capped[int(np.argmin(to_cap))] = True
+            continue
+        current = candidate
+
+        # Dual feasibility: no fixed weight and no cap would improve the objective if released
+        gradient = gamma * model.matvec(candidate) - linear
+        multipliers = np.zeros(len(capped_idx) + 1)
+        multipliers[used] = -solution[len(free_idx):]
+        if members[0] == 0:
+            # Every class is at its cap, so the budget multiplier is free: take the tightest valid one
+            multipliers[0] = multipliers[1:].min()
+        reduced = gradient - multipliers[blocks]
+        tolerance = 1e-9 * max(float(np.abs(gradient).max()), 1e-12)
+        enter_low = ~free & ~at_upper & (reduced < -tolerance)
+        enter_high = at_upper & (reduced > tolerance)
+        release = np.zeros(len(caps), dtype=bool)
+        release[capped_idx] = multipliers[1:] > multipliers[0] + tolerance
+        if not (enter_low.any() or enter_high.any() or release.any()):
+            return np.clip(candidate, 0, upper)
+        free |= enter_low | enter_high
+        at_upper &= ~enter_high
+        capped &= ~release
+    return None
+
+
+def _fista(model: CovarianceModel, linear: np.ndarray, gamma: float, constraints, max_iterations: int,
+           tolerance: float = 1e-8):
+    """
+    Minimize ½γ·wᵀΣw − linearᵀw over the constraint set by accelerated projected gradient.
+    Once the active set has been stable for a while, try to finish exactly with _polish.
+    """
+    upper, groups, caps = constraints
+    step = 1.0 / (gamma * model.lambda_max())
+    w = project(np.full(len(model.isins), 1 / len(model.isins)), upper, groups, caps)
+    y, t = w, 1.0
+    support, stable = None, 0
+    for iteration in range(1, max_iterations + 1):
+        w_next = project(y - step * (gamma * model.matvec(y) - linear), upper, groups, caps)
+        if np.max(np.abs(w_next - w)) < tolerance:
+            return w_next, iteration, True
+        next_support = (w_next > 1e-12) & (w_next < upper - 1e-12)
+        stable = stable + 1 if support is not None and np.array_equal(support, next_support) else 0
+        support = next_support
+        if stable == 5:
+            polished = _polish(model, linear, gamma, w_next, constraints)
+            if polished is not None:
+                return polished, iteration, True
+            stable = -20  # try again after another 25 stable iterations
+        t_next = (1 + math.sqrt(1 + 4 * t * t)) / 2
+        if np.dot(y - w_next, w_next - w) > 0:
+            # Momentum points uphill: restart it
+            y, t_next = w_next, 1.0
+        else:
+            y = w_next + (t - 1) / t_next * (w_next - w)
+        w, t = w_next, t_next
+    return w, max_iterations, False
+
+
+def _risk_parity(model: CovarianceModel, max_iterations: int, tolerance: float = 1e-6):
+    """Equal risk contributions: argmin ½yᵀΣy − Σ log(yᵢ)/N, by damped Jacobi coordinate updates"""
+    n = len(model.isins)
+    budget = np.full(n, 1 / n)
+    diag = model.variance
+    y = 1 / np.sqrt(diag)
+    y /= math.sqrt(float(y @ model.matvec(y)))
+    for iteration in range(1, max_iterations + 1):
+        sigma_y = model.matvec(y)
+        contributions = y * sigma_y
+        if np.max(np.abs(contributions - budget)) <= tolerance * budget[0]:
+            return y / y.sum(), iteration, True
+        # Exact minimizer along each coordinate with the others fixed, averaged with the current point
+        others = sigma_y - diag * y
+        coordinate = (-others + np.sqrt(others ** 2 + 4 * diag * budget)) / (2 * diag)
+        y = 0.5 * (y + coordinate)
+    return y / y.sum(), max_iterations, False
+
+
+class PortfolioOptimizer:
+    def __init__(self, cache_max_bytes: int = 256 * 2 ** 20, result_cache_size: int = 256,
+                 lookback_days: int = 3 * 365, max_funds: int = 5000, max_iterations: int = 2000):
+        self.cache_max_bytes = cache_max_bytes
+        self.result_cache_size = result_cache_size
+        self.lookback_days = lookback_days
+        self.max_funds = max_funds
+        self.max_iterations = max_iterations
+        self._models: "OrderedDict[tuple, Tuple[CovarianceModel, Dict[str, str]]]" = OrderedDict()
+        self._results: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One build per covariance key at a time; concurrent requests wait for it
+        self._building: Dict[tuple, threading.Lock] = {}
+        self.covariance_hits = 0
+        self.covariance_misses = 0
+        self.result_hits = 0
+        self.evictions = 0
+
+    def covariance(self, store: NavStore, isins: Sequence[str], lookback_days: int,
+                   estimator: str) -> Tuple[CovarianceModel, Dict[str, str], bool]:
+        """(model, excluded funds, cached) for a universe, built at most once per NAV snapshot"""
+        key = (store.snapshot_name, estimator, lookback_days, _digest(sorted(isins)))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.covariance_hits += 1
+                return (*self._models[key], True)
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                if key in self._models:
+                    # Built by the request we waited for
+                    self._models.move_to_end(key)
+                    self.covariance_hits += 1
+                    return (*self._models[key], True)
+            try:
+                started = time.perf_counter()
+                model, excluded = estimate_covariance(store, isins, lookback_days, estimator)
+                model.lambda_max()
+                log_event("portfolio_covariance_built", funds=len(model.isins), observations=model.observations,
+                          shrinkage=round(model.shrinkage, 4), ms=round((time.perf_counter() - started) * 1000, 1))
+                with self._lock:
+                    self.covariance_misses += 1
+                    if model.nbytes <= self.cache_max_bytes:
+                        self._models[key] = (model, excluded)
+                        self._bytes += model.nbytes
+                        while self._bytes > self.cache_max_bytes:
+                            _, (old, _) = self._models.popitem(last=False)
+                            self._bytes -= old.nbytes
+                            self.evictions += 1
+            finally:
+                with self._lock:
+                    # Waiters already hold the lock object; later requests find the model or start afresh
+                    if self._building.get(key) is build_lock:
+                        del self._building[key]
+        return model, excluded, False
+
+    def optimize(self, store: NavStore, funds: Sequence[Fund], objective: str = "min_variance",
+                 max_weight: Optional[float] = None, asset_class_caps: Optional[Dict[str, float]] = None,
+                 risk_aversion: float = DEFAULT_RISK_AVERSION, lookback_days: Optional[int] = None,
+                 estimator: str = "ledoit_wolf") -> Dict[str, Any]:
+        if objective not in OBJECTIVES:
+            raise PortfolioError(f"Unknown objective {objective}; use one of {', '.join(OBJECTIVES)}")
+        if estimator not in ESTIMATORS:
+            raise PortfolioError(f"Unknown estimator {estimator}; use one of {', '.join(ESTIMATORS)}")
+        if not funds:
+            raise PortfolioError("The universe is empty")
+        if len(funds) > self.max_funds:
+            raise PortfolioError(f"The universe has {len(funds)} funds; at most {self.max_funds} are supported")
+        lookback_days = int(lookback_days or self.lookback_days)
+        max_weight = 1.0 if max_weight is None else float(max_weight)
+        caps = {str(k): float(v) for k, v in (asset_class_caps or {}).items()}
+        by_isin = {f.isin: f for f in funds}
+
+        result_key = (store.snapshot_name, estimator, lookback_days, _digest(sorted(by_isin)), objective,
+                      max_weight, tuple(sorted(caps.items())), float(risk_aversion) if objective == "mean_variance" else None)
+        with self._lock:
+            if result_key in self._results:
+                self._results.move_to_end(result_key)
+                self.result_hits += 1
+                return {**self._results[result_key], "cached": True}
+
+        started = time.perf_counter()
+        model, excluded, cached = self.covariance(store, list(by_isin), lookback_days, estimator)
+        covariance_ms = (time.perf_counter() - started) * 1000
+        classes = [by_isin[isin].asset_class or UNCLASSIFIED for isin in model.isins]
+        names = sorted(set(classes))
+        groups = np.searchsorted(names, classes)
+        class_caps = np.array([caps.get(name, 1.0) for name in names])
+        upper = np.full(len(model.isins), max_weight)
+        room = float(np.minimum(np.bincount(groups, upper, len(names)), class_caps).sum())
+        if room < 1 - 1e-9:
+            raise PortfolioError(f"Constraints are infeasible: max_weight and asset_class_caps allow at most "
+                                 f"{room:.1%} to be invested across {len(model.isins)} funds")
+
+        solved = time.perf_counter()
+        constraints_adjusted = False
+        if objective == "risk_parity":
+            weights, iterations, converged = _risk_parity(model, self.max_iterations)
+            class_sums = np.bincount(groups, weights, len(names))
+            if weights.max() > max_weight + 1e-9 or np.any(class_sums > class_caps + 1e-9):
+                weights = project(weights, upper, groups, class_caps)
+                constraints_adjusted = True
+        elif objective == "mean_variance":
+            weights, iterations, converged = _fista(model, model.mean, float(risk_aversion),
+                                                    (upper, groups, class_caps), self.max_iterations)
+        else:
+            weights, iterations, converged = _fista(model, np.zeros(len(model.isins)), 1.0,
+                                                    (upper, groups, class_caps), self.max_iterations)
+        weights = np.where(weights < MIN_HOLDING, 0.0, weights)
+        solve_ms = (time.perf_counter() - solved) * 1000
+
+        result = _report(model, weights, classes, names, groups)
+        result.update({
+            "objective": objective,
+            "constraints": {"max_weight": max_weight, "asset_class_caps": caps},
+            "solver": {"iterations": iterations, "converged": converged, "ms": round(solve_ms, 1),
+                       **({"constraints_adjusted": True} if constraints_adjusted else {})},
+            "covariance": {
+                "estimator": estimator, "shrinkage": round(model.shrinkage, 4), "funds": len(model.isins),
+                "observations": model.observations, "start": model.start, "end": model.end,
+                "cached": cached, "ms": round(covariance_ms, 1),
+            },
+            "excluded": excluded,
+        })
+        with self._lock:
+            self._results[result_key] = result
+            while len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+        return {**result, "cached": False}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "covariance_models": len(self._models), "bytes": self._bytes, "covariance_hits": self.covariance_hits,
+            "covariance_misses": self.covariance_misses, "results": len(self._results),
+            "result_hits": self.result_hits, "evictions": self.evictions,
+        }
+
+
+def _digest(isins: Sequence[str]) -> str:
+    return hashlib.sha256("\n".join(isins).encode()).hexdigest()
+
+
+def _report(model: CovarianceModel, weights: np.ndarray, classes: List[str], names: List[str],
+            groups: np.ndarray) -> Dict[str, Any]:
+    sigma_w = model.matvec(weights)
+    variance = float(weights @ sigma_w)
+    volatility = math.sqrt(max(variance, 0.0))
+    contributions = weights * sigma_w / variance if variance > 0 else np.zeros_like(weights)
+    fund_vol = np.sqrt(model.variance)
+    order = np.argsort(-weights, kind="stable")
+    order = order[weights[order] > 0]
+    holdings = [{
+        "isin": model.isins[i], "weight": round(float(weights[i]), 6), "asset_class": classes[i],
+        "volatility": round(float(fund_vol[i]), 6), "risk_contribution": round(float(contributions[i]), 6),
+    } for i in order]
+    allocation = np.bincount(groups, weights, len(names))
+    return {
+        "expected_return": round(float(model.mean @ weights), 6),
+        "volatility": round(volatility, 6),
+        "diversification_ratio": round(float(weights @ fund_vol) / volatility, 4) if volatility > 0 else None,
+        "effective_holdings": round(1 / float(weights @ weights), 2),
+        "holdings_count": len(holdings),
+        "asset_classes": {name: round(float(share), 6) for name, share in zip(names, allocation) if share > 0},
+        "holdings": holdings,
+    }
+
+
+async def load_universe(pool, isins: Optional[Sequence[str]] = None, asset_classes: Optional[Sequence[str]] = None,
+                        currency: Optional[str] = None, risk_max: Optional[int] = None,
+                        max_funds: int = 5000) -> Tuple[List[Fund], Dict[str, str]]:
+    """
+    Funds from fund_overview: the given ISINs, or the largest funds matching the filters.
+    Returns (funds, excluded {isin: reason}) for ISINs that were asked for but cannot be used.
+    """
+    where, params = [], []
+    if isins:
+        where.append(f"`isin` IN ({', '.join(['%s'] * len(isins))})")
+        params.extend(isins)
+    if asset_classes:
+        where.append(f"`asset_class` IN ({', '.join(['%s'] * len(asset_classes))})")
+        params.extend(asset_classes)
+    if currency:
+        where.append("`aum_currency` = %s")
+        params.append(currency)
+    if risk_max is not None and not isins:
+        where.append("`risk_reward_indicator` <= %s")
+        params.append(int(risk_max))
+    sql = "SELECT `isin`, `asset_class`, `risk_reward_indicator` FROM `fund_overview`"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY `fund_aum` DESC LIMIT %s"
+    params.append(max_funds + 1)
+    rows = await pool.fetch_all(sql, params)
+
+    funds, excluded = [], {}
+    for row in rows:
+        risk = row["risk_reward_indicator"]
+        risk = int(risk) if risk is not None else None
+        if risk_max is not None and (risk is None or risk > risk_max):
+            excluded[row["isin"]] = f"risk indicator {risk if risk is not None else 'unknown'} above {risk_max}"
+            continue
+        funds.append(Fund(row["isin"], row["asset_class"], risk))
+    found = {row["isin"] for row in rows}
+    for isin in isins or ():
+        if isin not in found:
+            excluded[isin] = "not in fund_overview" if not (asset_classes or currency) else "no match for the filters"
+    return funds, excluded
+
+
+_optimizer: Optional[PortfolioOptimizer] = None
+
+
+def get_portfolio_optimizer() -> PortfolioOptimizer:
+    global _optimizer
+    if _optimizer is None:
+        _optimizer = PortfolioOptimizer()
+    return _optimizer
+
+
+def init_portfolio_optimizer(**settings) -> PortfolioOptimizer:
+    global _optimizer
+    _optimizer = PortfolioOptimizer(**settings)
+    return _optimizer
+
+
+async def optimize_portfolio(pool, store: NavStore, isins: Optional[Sequence[str]] = None,
+                             asset_classes: Optional[Sequence[str]] = None, currency: Optional[str] = None,
+                             risk_max: Optional[int] = None, **options) -> Dict[str, Any]:
+    """Load the universe, then estimate and optimize off the event loop. Raises PortfolioError"""
+    optimizer = get_portfolio_optimizer()
+    funds, excluded = await load_universe(pool, isins, asset_classes, currency, risk_max, optimizer.max_funds)
+    if len(funds) > optimizer.max_funds:
+        raise PortfolioError(f"More than {optimizer.max_funds} funds match; narrow the filters or pass isins")
+    if not funds:
+        reasons = "; ".join(f"{isin}: {reason}" for isin, reason in list(excluded.items())[:5])
+        raise PortfolioError("No funds match" + (f" ({reasons})" if reasons else ""))
+    result = await asyncio.to_thread(optimizer.optimize, store, funds, **options)
+    if excluded:
+        result = {**result, "excluded": {**excluded, **result["excluded"]}}
+    return result
@@ -0,0 +1,195 @@
+"""
+Response cache for chat completions.
+
+Answers are keyed on the normalized conversation (system prompt + messages)
+plus the model parameters. Two tiers:
+
+- exact: SHA-256 of the normalized conversation and parameters.
+- semantic (optional): when the conversation *context* (everything except the
+  final user message) and the parameters match exactly, the final user message
+  is compared by embedding cosine similarity against cached questions.
+
+Entries are evicted least-recently-used once ``max_entries`` or ``max_bytes``
+is exceeded, and expire after ``ttl_seconds``.
+"""
+import hashlib
+import json
+import math
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    content: str
+    created_at: float
+    size: int
+    context_key: str
+    embedding: Optional[List[float]] = None
+
+
+@dataclass
+class CacheStats:
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        embed: Optional[Embedder] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # context key -> exact keys sharing that context, for the semantic tier
+        self._by_context: Dict[str, set] = {}
+        self._bytes = 0
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_keys(messages: List[Dict[str, str]], params: Dict) -> tuple:
+        """Return (exact_key, context_key, final user question) for a conversation"""
+        normalized = [(m["role"], normalize_text(m["content"])) for m in messages]
+        question = normalized[-1][1] if normalized and normalized[-1][0] == "user" else ""
+        exact_key = _digest({"messages": normalized, "params": params})
+        context_key = _digest({"messages": normalized[:-1], "params": params})
+        return exact_key, context_key, question
+
+    async def get(self, messages: List[Dict[str, str]], params: Dict) -> Optional[str]:
+        """Look up a cached answer, trying the exact tier then the semantic tier"""
+        exact_key, context_key, question = self.make_keys(messages, params)
+
+        entry = self._live_entry(exact_key)
+        if entry is not None:
+            self.stats.exact_hits += 1
+            return entry.content
+
+        if self.embed is not None and question and self._by_context.get(context_key):
+            query = _unit(await self.embed(question))
+            best_key, best_score = None, self.similarity_threshold
+            for key in list(self._by_context.get(context_key, ())):
+                candidate = self._live_entry(key, touch=False)
+                if candidate is None or candidate.embedding is None:
+                    continue
+                score = sum(a * b for a, b in zip(query, candidate.embedding))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is not None:
+                self.stats.semantic_hits += 1
+                self._entries.move_to_end(best_key)
+                return self._entries[best_key].content
+
+        self.stats.misses += 1
+        return None
+
+    async def put(self, messages: List[Dict[str, str]], params: Dict, content: str):
+        """Store a complete answer for this conversation"""
+        exact_key, context_key, question = self.make_keys(messages, params)
+        embedding = None
+        if self.embed is not None and question:
+            embedding = _unit(await self.embed(question))
+
+        size = len(content.encode("utf-8")) + sys.getsizeof(exact_key) + 8 * len(embedding or ())
+        if size > self.max_bytes:
+            return
+
+        self._remove(exact_key)
+        self._entries[exact_key] = CacheEntry(content, time.monotonic(), size, context_key, embedding)
+        self._by_context.setdefault(context_key, set()).add(exact_key)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_context.clear()
+        self._bytes = 0
+
+    def snapshot(self) -> Dict:
+        """Hit/miss counters and current occupancy, for the stats endpoint"""
+        lookups = self.stats.exact_hits + self.stats.semantic_hits + self.stats.misses
+        hits = self.stats.exact_hits + self.stats.semantic_hits
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "exact_hits": self.stats.exact_hits,
+            "semantic_hits": self.stats.semantic_hits,
+            "misses": self.stats.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.stats.evictions,
+            "expirations": self.stats.expirations,
+        }
+
+    def _live_entry(self, key: str, touch: bool = True) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        if touch:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        siblings = self._by_context.get(entry.context_key)
+        if siblings is not None:
+            siblings.discard(key)
+            if not siblings:
+                del self._by_context[entry.context_key]
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def replay_chunks(content: str, chunk_size: int = 64):
+    """Split a cached answer into word-aligned pieces for text-delta replay"""
+    start = 0
+    while start < len(content):
+        end = min(len(content), start + chunk_size)
+        if end < len(content):
+            space = content.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        yield content[start:end]
+        start = end
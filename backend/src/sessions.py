@@ -0,0 +1,320 @@
+"""
+Server-side conversation sessions.
+
+A client creates a session once and then posts only each new user message;
+the history lives here instead of being re-uploaded and re-validated on
+every turn.
+
+``SessionStore`` keeps sessions in memory, least-recently-used first out,
+bounded by ``max_sessions`` and ``max_bytes``. Sessions idle for longer than
+``ttl_seconds`` expire. An optional ``SessionBackend`` persists every
+completed turn. Sessions evicted from memory, or lost in a restart, are then
+reloaded on their next use instead of being lost.
+
+With a backend, the backend holds the authoritative copy. Every ``get``
+catches the session up with it, and ``append`` writes the turn to the backend
+first and then reads back whatever follows the copy in memory. So any
+gunicorn worker can serve any turn, and a worker's stale copy never
+overwrites turns that another worker appended. The file backend appends one
+line per turn and remembers how far each session has been read, so a turn
+costs only the new lines, not the whole history. Idle expiry uses the time
+of the last saved turn. The per-session lock is per process: two turns of
+one session posted at the same moment to different workers are not
+serialized.
+"""
+import abc
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Rough per-message bookkeeping overhead on top of the content bytes
+MESSAGE_OVERHEAD_BYTES = 64
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _message_size(message: Dict[str, str]) -> int:
+    return len(message["content"].encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+@dataclass
+class Session:
+    id: str
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    size: int = 0
+    # How far the backend's copy has been read into ``messages``
+    position: Any = None
+    # One turn at a time per session, so concurrent posts cannot interleave the history
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.id, "created_at": self.created_at, "messages": self.messages}
+
+
+class SessionBackend(abc.ABC):
+    """Persistence for sessions; the in-memory store works without one"""
+
+    @abc.abstractmethod
+    async def load(self, session_id: str, after: Any = None) -> Optional[Dict[str, Any]]:
+        """``updated_at``, ``position`` and the ``messages`` stored past position ``after``.
+
+        ``continued`` is False when the whole history was read instead (no usable ``after``);
+        ``created_at`` is then included too. Positions are opaque to the store.
+        """
+
+    @abc.abstractmethod
+    async def save(self, session: Session) -> Any:
+        """Store the whole session, replacing any stored copy; returns the position after it"""
+
+    @abc.abstractmethod
+    async def append(self, session_id: str, messages: List[Dict[str, str]]) -> bool:
+        """Add messages to a stored session; False if it is not stored"""
+
+    @abc.abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+
+class FileSessionBackend(SessionBackend):
+    """One JSON-lines file per session: a header, then one line per turn, appended off the event loop.
+
+    Positions are (inode, byte offset) pairs, so a load after a known position reads only the new turns.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    async def load(self, session_id: str, after: Any = None) -> Optional[Dict[str, Any]]:
+        def read():
+            try:
+                f = open(self._path(session_id), "rb")
+            except FileNotFoundError:
+                return None
+            with f:
+                stat = os.fstat(f.fileno())
+                # After a save replaced the file, an offset into the old one means nothing
+                continued = after is not None and after[0] == stat.st_ino and after[1] <= stat.st_size
+                position = after[1] if continued else 0
+                f.seek(position)
+                data = {"updated_at": stat.st_mtime, "continued": continued, "messages": []}
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # A turn still being written; read it next time
+                        break
+                    position += len(line)
+                    record = json.loads(line)
+                    if "created_at" in record:
+                        data["created_at"] = record["created_at"]
+                    data["messages"].extend(record.get("messages", []))
+                data["position"] = (stat.st_ino, position)
+                return data
+        return await asyncio.to_thread(read)
+
+    async def save(self, session: Session) -> Any:
+        lines = [json.dumps({"created_at": session.created_at})]
+        if session.messages:
+            lines.append(json.dumps({"messages": session.messages}))
+        payload = "".join(line + "\n" for line in lines).encode()
+
+        def write():
+            tmp = self._path(session.id) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, self._path(session.id))
+            return os.stat(self._path(session.id)).st_ino, len(payload)
+        return await asyncio.to_thread(write)
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]]) -> bool:
+        payload = (json.dumps({"messages": messages}) + "\n").encode()
+
+        def write():
+            try:
+                fd = os.open(self._path(session_id), os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                return False
+            try:
+                # One write per turn, so turns appended by several workers never interleave
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+            return True
+        return await asyncio.to_thread(write)
+
+    async def delete(self, session_id: str):
+        def remove():
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+        await asyncio.to_thread(remove)
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        backend: Optional[SessionBackend] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def valid_id(session_id: str) -> bool:
+        return bool(_SESSION_ID.match(session_id))
+
+    async def create(self, messages: Optional[List[Dict[str, str]]] = None) -> Session:
+        """Start a session, optionally seeded with an existing history"""
+        session = Session(id=uuid.uuid4().hex)
+        self._insert(session)
+        if messages:
+            self._extend(session, messages)
+        if self.backend is not None:
+            # Saved even when empty: the next turn may reach another worker, which reads it from the backend
+            session.position = await self.backend.save(session)
+        return session
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        if not self.valid_id(session_id):
+            return None
+        if self.backend is not None:
+            return await self._load(session_id)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl_seconds:
+            self._remove(session_id)
+            self.expirations += 1
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def append(self, session: Session, messages: List[Dict[str, str]]):
+        """Record a completed turn"""
+        if self.backend is None:
+            self._extend(session, messages)
+        elif await self.backend.append(session.id, messages):
+            # Read the turn back with any that another worker appended before it
+            data = await self.backend.load(session.id, session.position)
+            if data is not None:
+                self._catch_up(session, data)
+        else:
+            # Deleted or expired meanwhile: store it again with this turn
+            self._extend(session, messages)
+            session.position = await self.backend.save(session)
+
+    async def _load(self, session_id: str) -> Optional[Session]:
+        """The backend's copy of a session; the in-memory Session (and its lock) is reused and caught up"""
+        session = self._sessions.get(session_id)
+        data = await self.backend.load(session_id, session.position if session is not None else None)
+        if data is None:
+            self._remove(session_id)
+            return None
+        if time.time() - data["updated_at"] > self.ttl_seconds:
+            self._remove(session_id)
+            self.expirations += 1
+            await self.backend.delete(session_id)
+            return None
+        if session is None:
+            session = Session(id=session_id, created_at=data.get("created_at", time.time()))
+            self._insert(session)
+        self._catch_up(session, data)
+        return session
+
+    async def delete(self, session_id: str) -> bool:
+        existed = self._remove(session_id)
+        if self.backend is not None and self.valid_id(session_id):
+            await self.backend.delete(session_id)
+        return existed
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "persistent": self.backend is not None,
+        }
+
+    def _insert(self, session: Session):
+        self._sessions[session.id] = session
+        self._evict()
+
+    def _catch_up(self, session: Session, data: Dict[str, Any]):
+        """Add what the backend has past ``session.position``, or swap in the whole history it returned"""
+        if data["continued"]:
+            self._extend(session, data["messages"])
+        else:
+            self._replace(session, data["messages"])
+        session.position = data["position"]
+
+    def _replace(self, session: Session, messages: List[Dict[str, str]]):
+        """Swap in a history read from the backend"""
+        if session.id in self._sessions:
+            self._bytes -= session.size
+        session.messages, session.size = [], 0
+        self._extend(session, messages)
+
+    def _extend(self, session: Session, messages: List[Dict[str, str]]):
+        added = [{"role": m["role"], "content": m["content"]} for m in messages]
+        session.messages.extend(added)
+        size = sum(_message_size(m) for m in added)
+        session.size += size
+        session.last_used = time.monotonic()
+        if session.id in self._sessions:
+            self._bytes += size
+            self._sessions.move_to_end(session.id)
+            self._evict(keep=session.id)
+
+    def _evict(self, keep: Optional[str] = None):
+        while len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                # the session being written is the only one left; let it exceed the budget
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(oldest)
+                continue
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._bytes -= session.size
+        return True
+
+
+def create_session_store_from_env() -> SessionStore:
+    backend = None
+    if os.getenv("SESSION_BACKEND", "memory").lower() == "file":
+        backend = FileSessionBackend(os.getenv("SESSION_DIR", "sessions"))
+    return SessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("SESSION_TTL", str(24 * 3600))),
+        backend=backend,
+    )
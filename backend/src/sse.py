@@ -0,0 +1,59 @@
+"""
+Server-sent event framing for the chat streams.
+
+Each frame carries an ``id: <stream id>:<event index>`` line, so a client
+that drops can resume after the last frame it received. Consecutive text
+deltas of a batch are merged into one frame, and a batch is written with a
+single send. Payloads are serialized with orjson when it is installed.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HEARTBEAT = ": keep-alive\n\n"
+EVENT_STREAM = "text/event-stream"
+
+
+def dumps(payload: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def frame(payload: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    if event_id is None:
+        return f"data: {dumps(payload)}\n\n"
+    return f"id: {event_id}\ndata: {dumps(payload)}\n\n"
+
+
+def encode_batch(stream_id: str, last_index: int, events: List[Dict[str, Any]]) -> str:
+    """Frames for a batch of events ending at ``last_index``, with runs of text deltas merged"""
+    frames = []
+    text: List[str] = []
+    text_end = 0
+    for index, event in enumerate(events, start=last_index - len(events) + 1):
+        if event["type"] == "text-delta":
+            text.append(event["textDelta"])
+            text_end = index
+            continue
+        if text:
+            frames.append(frame({"type": "text-delta", "textDelta": "".join(text)}, f"{stream_id}:{text_end}"))
+            text = []
+        frames.append(frame(event, f"{stream_id}:{index}"))
+    if text:
+        frames.append(frame({"type": "text-delta", "textDelta": "".join(text)}, f"{stream_id}:{text_end}"))
+    return "".join(frames)
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """(stream id, event index) from an ``id`` we sent, or None if it is not one"""
+    if not value:
+        return None
+    stream_id, _, index = value.strip().partition(":")
+    if not stream_id or not index.isdigit():
+        return None
+    return stream_id, int(index)
@@ -0,0 +1,21 @@
+#!/bin/bash
+
+# Check if virtual environment exists
+if [ ! -d "venv" ]; then
+    echo "Virtual environment not found. Running setup..."
+    ./setup.sh
+fi
+
+# Activate virtual environment
+echo "Activating virtual environment..."
+source venv/bin/activate
+
+# Check if .env file exists
+if [ ! -f ".env" ]; then
+    echo "Please create a .env file with your OpenAI API key first (see start.sh)"
+    exit 1
+fi
+
+# Start the multi-worker server (settings in gunicorn.conf.py); exec so SIGTERM reaches gunicorn
+echo "Starting NEURALFIN.AI Backend (production)..."
+exec gunicorn -c gunicorn.conf.py main:app
@@ -0,0 +1,34 @@
+"""Regression tests for the chat tool result bounding (run with ``python -m pytest`` from backend/)"""
+
+import json
+
+from src.chat_tools import _bounded
+
+
+def nav_series(points: int) -> dict:
+    return {
+        "isin": "IE00B4L5Y983",
+        "points": [[f"2024-01-{day:02d}", 100.0 + day] for day in range(1, points + 1)],
+        "summary": {"start": "2024-01-01", "end": f"2024-01-{points:02d}"},
+    }
+
+
+def test_small_results_are_returned_unchanged():
+    payload = nav_series(3)
+    assert json.loads(_bounded(payload, 10_000)) == payload
+
+
+def test_nav_series_is_thinned_within_budget():
+    text = _bounded(nav_series(28), 250)
+    result = json.loads(text)
+    assert len(text) <= 250
+    assert result["truncated"] is True
+    assert result["points"][0] == ["2024-01-01", 101.0]
+    assert result["points"][-1] == ["2024-01-28", 128.0]
+    assert all(len(point) == 2 for point in result["points"])
+
+
+def test_two_point_series_does_not_loop():
+    # Two points cannot be thinned further; bounding must move on instead of spinning
+    text = _bounded(nav_series(2), 60)
+    assert json.loads(text)["truncated"] is True
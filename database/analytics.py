@@ -0,0 +1,255 @@
+# analytics.py
+"""
+Vectorized performance and risk analytics for the whole fund universe.
+
+NAV history is pivoted into one dense (dates x funds) price matrix and every
+metric is computed for all funds at once with NumPy, instead of looping over
+funds with pandas:
+
+- trailing returns for every horizon of the performance table, plus inception
+- annualized volatility, Sharpe and Sortino over 1y and 3y windows
+- maximum drawdown over the full history
+- rolling correlation of each fund with the equal-weighted universe
+- calendar (monthly / quarterly / yearly) returns
+
+Results are written back in bulk to the fund_analytics and fund_calendar_returns
+tables. Returns are stored as fractions (0.05 = +5%).
+"""
+import json
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+import config
+
+TRADING_DAYS = 252
+
+# performance-table column -> lookback as a pandas DateOffset
+TRAILING_HORIZONS = {
+    'one_day': None,  # previous observation
+    'one_week': pd.DateOffset(weeks=1),
+    'one_month': pd.DateOffset(months=1),
+    'three_months': pd.DateOffset(months=3),
+    'six_months': pd.DateOffset(months=6),
+    'one_year': pd.DateOffset(years=1),
+    'two_years': pd.DateOffset(years=2),
+    'three_years': pd.DateOffset(years=3),
+    'five_years': pd.DateOffset(years=5),
+    'ten_years': pd.DateOffset(years=10),
+}
+RISK_WINDOWS = {'1y': TRADING_DAYS, '3y': 3 * TRADING_DAYS}
+CORRELATION_WINDOW = 63  # ~3 months of trading days
+
+ANALYTICS_COLUMNS = (['isin', 'as_of_date', 'inception'] + list(TRAILING_HORIZONS) +
+                     ['volatility_1y', 'volatility_3y', 'sharpe_1y', 'sharpe_3y', 'sortino_1y', 'sortino_3y',
+                      'max_drawdown', 'corr_universe_3m'])
+
+
+@dataclass
+class NavMatrix:
+    dates: np.ndarray   # (T,) datetime64[D], ascending
+    isins: np.ndarray   # (N,) object
+    prices: np.ndarray  # (T, N) float64, NaN where a fund has no price
+
+
+def nav_matrix_from_arrays(isins, dates, closes) -> NavMatrix:
+    """Pivot long (isin, date, close) arrays into a dense matrix without a Python loop."""
+    # hash-based factorize is much cheaper than np.unique's sort on millions of ISIN strings
+    isin_idx, unique_isins = pd.factorize(np.asarray(isins, dtype=object), sort=True)
+    date_idx, unique_dates = pd.factorize(np.asarray(dates, dtype='datetime64[D]'), sort=True)
+    unique_isins = np.asarray(unique_isins, dtype=object)
+    unique_dates = np.asarray(unique_dates, dtype='datetime64[D]')
+    prices = np.full((len(unique_dates), len(unique_isins)), np.nan)
+    prices[date_idx, isin_idx] = np.asarray(closes, dtype=np.float64)
+    return NavMatrix(unique_dates, unique_isins, prices)
+
+
+def nav_matrix_from_frame(df: pd.DataFrame) -> NavMatrix:
+    return nav_matrix_from_arrays(df['isin'].to_numpy(), df['date'].to_numpy(), df['close'].to_numpy())
+
+
+def nav_matrix_from_snapshot(root: str) -> NavMatrix:
+    """Build the matrix straight from the published columnar NAV snapshot (see nav_snapshot.py)."""
+    with open(os.path.join(root, 'CURRENT')) as f:
+        path = os.path.join(root, f.read().strip())
+    with open(os.path.join(path, 'index.json')) as f:
+        meta = json.load(f)
+    rows = meta['rows']
+    days = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')[:rows]
+    closes = np.load(os.path.join(path, 'close.npy'), mmap_mode='r')[:rows]
+    isins = np.repeat(np.array(meta['isins'], dtype=object), meta['lengths'])
+    return nav_matrix_from_arrays(isins, days.astype('datetime64[D]'), closes)
+
+
+def forward_fill(prices: np.ndarray) -> np.ndarray:
+    """Carry each fund's last price over gaps (holidays, missing days); leading NaNs stay NaN."""
+    rows = np.arange(prices.shape[0])[:, None]
+    last_valid = np.where(~np.isnan(prices), rows, 0)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    filled = prices[last_valid, np.arange(prices.shape[1])]
+    started = np.logical_or.accumulate(~np.isnan(prices), axis=0)
+    filled[~started] = np.nan
+    return filled
+
+
+def trailing_returns(dates: np.ndarray, filled: np.ndarray) -> dict:
+    as_of = pd.Timestamp(dates[-1])
+    latest = filled[-1]
+    out = {}
+    for column, offset in TRAILING_HORIZONS.items():
+        if offset is None:
+            past = filled[-2] if len(filled) > 1 else np.full_like(latest, np.nan)
+        else:
+            target = np.datetime64((as_of - offset).date(), 'D')
+            k = np.searchsorted(dates, target, side='right') - 1
+            past = filled[k] if k >= 0 else np.full_like(latest, np.nan)
+        out[column] = latest / past - 1
+
+    first_idx = np.argmax(~np.isnan(filled), axis=0)
+    first = filled[first_idx, np.arange(filled.shape[1])]
+    out['inception'] = latest / first - 1
+    return out
+
+
+def daily_returns(filled: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return filled[1:] / filled[:-1] - 1
+
+
+def risk_metrics(returns: np.ndarray, window: int, risk_free_rate: float) -> dict:
+    """Annualized volatility, Sharpe and Sortino over the last `window` daily returns."""
+    r = returns[-window:]
+    counts = np.sum(~np.isnan(r), axis=0)
+    enough = counts >= max(20, window // 4)
+    rf_daily = risk_free_rate / TRADING_DAYS
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(np.where(enough, r, np.nan), axis=0)
+        vol = np.nanstd(np.where(enough, r, np.nan), axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+        excess = r - rf_daily
+        downside = np.sqrt(np.nanmean(np.minimum(excess, 0) ** 2, axis=0)) * np.sqrt(TRADING_DAYS)
+        annual_excess = (mean - rf_daily) * TRADING_DAYS
+        sharpe = annual_excess / vol
+        sortino = annual_excess / downside
+
+    for values in (vol, sharpe, sortino):
+        values[~enough | ~np.isfinite(values)] = np.nan
+    return {'volatility': vol, 'sharpe': sharpe, 'sortino': sortino}
+
+
+def max_drawdown(filled: np.ndarray) -> np.ndarray:
+    running_max = np.fmax.accumulate(filled, axis=0)
+    with np.errstate(invalid='ignore'):
+        drawdowns = filled / running_max - 1
+    worst = np.min(np.where(np.isnan(drawdowns), np.inf, drawdowns), axis=0)
+    return np.where(np.isinf(worst), np.nan, np.minimum(worst, 0))
+
+
+def rolling_correlation(x: np.ndarray, y: np.ndarray, window: int) -> np.ndarray:
+    """
+    Rolling Pearson correlation of every column of x (T, N) with y (T,), via cumulative
+    sums so the cost is O(T*N) regardless of the window. Pairs with a NaN are skipped;
+    windows with fewer than window/2 valid pairs are NaN. Returns a (T, N) matrix.
+    """
+    valid = ~np.isnan(x) & ~np.isnan(y)[:, None]
+    xv = np.where(valid, x, 0.0)
+    yv = np.where(valid, y[:, None], 0.0)
+
+    def windowed(a):
+        c = np.cumsum(a, axis=0)
+        out = c.copy()
+        out[window:] = c[window:] - c[:-window]
+        return out
+
+    n = windowed(valid.astype(np.float64))
+    sx, sy = windowed(xv), windowed(yv)
+    sxx, syy, sxy = windowed(xv * xv), windowed(yv * yv), windowed(xv * yv)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < window / 2] = np.nan
+    corr[:window - 1] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+def calendar_returns(dates: np.ndarray, filled: np.ndarray, isins: np.ndarray) -> pd.DataFrame:
+    """Monthly, quarterly and yearly returns from period-end prices, as a long frame."""
+    frames = []
+    timestamps = pd.DatetimeIndex(dates)
+    for period_type, freq in (('M', 'M'), ('Q', 'Q'), ('Y', 'Y')):
+        periods = timestamps.to_period(freq).asi8
+        # last observation of each period
+        is_period_end = np.r_[periods[1:] != periods[:-1], True]
+        ends = filled[is_period_end]
+        end_dates = dates[is_period_end]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = ends[1:] / ends[:-1] - 1
+        rows, cols = np.nonzero(np.isfinite(returns))
+        frames.append(pd.DataFrame({
+            'isin': isins[cols],
+            'period_type': period_type,
+            'period_end': end_dates[1:][rows],
+            'return_value': returns[rows, cols],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def compute_analytics(matrix: NavMatrix, risk_free_rate: float = 0.0) -> pd.DataFrame:
+    """One row per fund with trailing returns and risk metrics as of the last date."""
+    with warnings.catch_warnings():
+        # all-NaN slices (funds with too little history) are expected and end up as NULL
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return _compute_analytics(matrix, risk_free_rate)
+
+
+def _compute_analytics(matrix: NavMatrix, risk_free_rate: float) -> pd.DataFrame:
+    filled = forward_fill(matrix.prices)
+    returns = daily_returns(filled)
+
+    result = {'isin': matrix.isins, 'as_of_date': pd.Timestamp(matrix.dates[-1]).date()}
+    result.update(trailing_returns(matrix.dates, filled))
+    for label, window in RISK_WINDOWS.items():
+        metrics = risk_metrics(returns, window, risk_free_rate)
+        result[f'volatility_{label}'] = metrics['volatility']
+        result[f'sharpe_{label}'] = metrics['sharpe']
+        result[f'sortino_{label}'] = metrics['sortino']
+    result['max_drawdown'] = max_drawdown(filled)
+
+    # only the latest window is stored, so skip the full rolling matrix
+    recent = returns[-CORRELATION_WINDOW:]
+    universe = np.nanmean(recent, axis=1)
+    corr = rolling_correlation(recent, universe, min(CORRELATION_WINDOW, len(recent)))
+    result['corr_universe_3m'] = corr[-1] if len(corr) else np.full(len(matrix.isins), np.nan)
+    return pd.DataFrame(result)[ANALYTICS_COLUMNS]
+
+
+def compute_and_store(db_writer, snapshot_root: str = None, risk_free_rate: float = None):
+    """Recompute analytics for the whole universe from the NAV snapshot and bulk-upsert the results."""
+    started = time.perf_counter()
+    matrix = nav_matrix_from_snapshot(snapshot_root or config.NAV_SNAPSHOT_DIR)
+    risk_free_rate = config.ANALYTICS_RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+
+    analytics = compute_analytics(matrix, risk_free_rate)
+    calendar = calendar_returns(matrix.dates, forward_fill(matrix.prices), matrix.isins)
+    print(f"Computed analytics for {len(matrix.isins)} funds x {len(matrix.dates)} days "
+          f"in {time.perf_counter() - started:.1f}s.")
+
+    # nav has no foreign key, so it can hold funds whose overview failed to load; the
+    # analytics tables reference fund_overview, and one such ISIN would fail a whole chunk
+    known = db_writer.get_fund_overview_isins()
+    orphans = sorted(set(matrix.isins) - known)
+    if orphans:
+        print(f"Skipping analytics for {len(orphans)} funds not in fund_overview "
+              f"(e.g. {', '.join(orphans[:5])}).")
+        analytics = analytics[analytics['isin'].isin(known)]
+        calendar = calendar[calendar['isin'].isin(known)]
+
+    db_writer.insert_dataframe(analytics, 'fund_analytics', if_exists='upsert', pk_columns=['isin'], method='bulk')
+    db_writer.insert_dataframe(calendar, 'fund_calendar_returns', if_exists='upsert',
+                               pk_columns=['isin', 'period_type', 'period_end'], method='bulk')
+    return analytics
@@ -0,0 +1,132 @@
+# bench_analytics.py
+"""
+Benchmark: vectorized analytics engine vs. a per-fund pandas loop.
+
+Builds a synthetic NAV universe (staggered inception dates, business-day calendar),
+times analytics.compute_analytics + calendar_returns over the whole universe, then
+times the equivalent per-fund pandas loop on a subset of funds (extrapolated to the
+full universe) and checks both give the same numbers. No database is needed.
+
+    python benchmarks/bench_analytics.py --funds 3000 --years 25 --loop-funds 300
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+
+
+def synthetic_navs(funds: int, years: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2024-12-31', periods=years * 261).values.astype('datetime64[D]')
+    # a quarter of the funds launch part-way through the history
+    starts = np.where(rng.random(funds) < 0.25, rng.integers(0, len(dates) - 300, funds), 0)
+    lengths = len(dates) - starts
+    isins = np.repeat(np.array([f"BM{i:010d}" for i in range(funds)], dtype=object), lengths)
+    date_idx = np.concatenate([np.arange(s, len(dates)) for s in starts])
+    fund_idx = np.repeat(np.arange(funds), lengths)
+    vol = rng.uniform(0.001, 0.015, funds)[fund_idx]
+    market = rng.normal(0.0002, 0.008, len(dates))[date_idx]
+    log_returns = 0.6 * market + rng.normal(0, 1, len(date_idx)) * vol
+    # cumulative sum restarting at each fund's first row
+    cum = np.cumsum(log_returns)
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    cum -= np.repeat(cum[offsets] - log_returns[offsets], lengths)
+    return pd.DataFrame({'isin': isins, 'date': dates[date_idx], 'close': np.round(100 * np.exp(cum), 4)})
+
+
+def pandas_fund_metrics(series: pd.Series, universe: pd.Series, risk_free_rate: float) -> dict:
+    """What a straightforward per-fund implementation looks like."""
+    as_of = series.index[-1]
+    latest = series.iloc[-1]
+    row = {'inception': latest / series.iloc[0] - 1,
+           'one_day': latest / series.iloc[-2] - 1 if len(series) > 1 else np.nan}
+    for column, offset in analytics.TRAILING_HORIZONS.items():
+        if offset is None:
+            continue
+        past = series[:as_of - offset]
+        row[column] = latest / past.iloc[-1] - 1 if len(past) else np.nan
+
+    returns = series.pct_change().iloc[1:]
+    rf_daily = risk_free_rate / analytics.TRADING_DAYS
+    for label, window in analytics.RISK_WINDOWS.items():
+        r = returns.iloc[-window:]
+        if len(r) >= max(20, window // 4):
+            vol = r.std() * np.sqrt(analytics.TRADING_DAYS)
+            downside = np.sqrt((np.minimum(r - rf_daily, 0) ** 2).mean()) * np.sqrt(analytics.TRADING_DAYS)
+            excess = (r.mean() - rf_daily) * analytics.TRADING_DAYS
+            row.update({f'volatility_{label}': vol, f'sharpe_{label}': excess / vol, f'sortino_{label}': excess / downside})
+        else:
+            row.update({f'volatility_{label}': np.nan, f'sharpe_{label}': np.nan, f'sortino_{label}': np.nan})
+    row['max_drawdown'] = (series / series.cummax() - 1).min()
+
+    window = analytics.CORRELATION_WINDOW
+    recent = returns.iloc[-window:]
+    row['corr_universe_3m'] = (recent.corr(universe.reindex(recent.index))
+                               if len(recent) >= window / 2 else np.nan)
+
+    month_end = series.groupby(series.index.to_period('M')).last()
+    row['monthly_returns'] = month_end.pct_change().dropna()
+    return row
+
+
+def run_pandas_loop(df: pd.DataFrame, isins, risk_free_rate: float):
+    started = time.perf_counter()
+    wide = df.pivot(index='date', columns='isin', values='close')
+    universe = wide.ffill().pct_change().iloc[1:].iloc[-analytics.CORRELATION_WINDOW:].mean(axis=1)
+    results = {}
+    for isin, group in df[df['isin'].isin(isins)].groupby('isin'):
+        results[isin] = pandas_fund_metrics(group.set_index('date')['close'], universe, risk_free_rate)
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--funds', type=int, default=3000)
+    parser.add_argument('--years', type=int, default=25)
+    parser.add_argument('--loop-funds', type=int, default=300, help='funds timed in the pandas loop (extrapolated)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    df = synthetic_navs(args.funds, args.years)
+    print(f"Universe: {args.funds} funds, {df['date'].nunique()} days, {len(df):,} NAV rows")
+
+    started = time.perf_counter()
+    matrix = analytics.nav_matrix_from_frame(df)
+    pivot_s = time.perf_counter() - started
+    result = analytics.compute_analytics(matrix, args.risk_free_rate)
+    metrics_s = time.perf_counter() - started - pivot_s
+    calendar = analytics.calendar_returns(matrix.dates, analytics.forward_fill(matrix.prices), matrix.isins)
+    vector_s = time.perf_counter() - started
+    print(f"vectorized: pivot {pivot_s:.2f}s + metrics {metrics_s:.2f}s + calendar {vector_s - pivot_s - metrics_s:.2f}s"
+          f" = {vector_s:.2f}s for all {args.funds} funds")
+
+    subset = list(matrix.isins[:min(args.loop_funds, args.funds)])
+    loop, loop_s = run_pandas_loop(df, subset, args.risk_free_rate)
+    projected = loop_s / len(subset) * args.funds
+    print(f"pandas loop: {loop_s:.2f}s for {len(subset)} funds -> ~{projected:.1f}s projected for {args.funds}")
+    print(f"speedup: ~{projected / vector_s:.0f}x")
+
+    # same numbers from both implementations
+    vec = result.set_index('isin')
+    worst = 0.0
+    for isin, row in loop.items():
+        for column in analytics.ANALYTICS_COLUMNS[2:]:
+            a, b = vec.at[isin, column], row[column]
+            if np.isnan(a) and np.isnan(b):
+                continue
+            worst = max(worst, abs(a - b))
+        monthly = calendar[(calendar['isin'] == isin) & (calendar['period_type'] == 'M')]['return_value'].to_numpy()
+        worst = max(worst, np.max(np.abs(monthly - row['monthly_returns'].to_numpy())))
+    print(f"max abs difference vs pandas loop: {worst:.2e}")
+    if worst > 1e-9:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# bench_bulk_load.py
+"""
+Benchmark DatabaseWriter NAV upserts: executemany vs. the LOAD DATA bulk mode.
+
+Creates a scratch database (default `fund_data_bench`) from the schema migrations, seeds
+fund_overview with synthetic ISINs, then times each method twice: a cold insert
+into an empty nav table and an update pass over the same keys (the ON DUPLICATE
+KEY UPDATE path). Needs a MySQL/MariaDB server with local_infile enabled, e.g.
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=root mysql:8 --local-infile=1
+    python benchmarks/bench_bulk_load.py --rows 3000000 --user root --password root
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import database_setup
+import migrate
+from data_collector import DatabaseWriter
+
+
+def synthetic_navs(rows: int, funds: int, seed: int = 0) -> pd.DataFrame:
+    """`rows` NAV rows spread over `funds` ISINs on consecutive business days"""
+    rng = np.random.default_rng(seed)
+    days = -(-rows // funds)
+    dates = pd.bdate_range('2000-01-03', periods=days).strftime('%Y-%m-%d')
+    isins = [f"BM{i:010d}" for i in range(funds)]
+    df = pd.DataFrame({
+        'isin': np.repeat(isins, days),
+        'date': np.tile(dates, funds),
+        'close': np.round(100 * np.exp(rng.normal(0, 0.01, funds * days).cumsum()), 4),
+    })
+    return df.iloc[:rows]
+
+
+def reset_database(args):
+    conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    cursor.close()
+    conn.close()
+    database_setup.create_database(args.host, args.user, args.password, args.database)
+    migrate.migrate({"host": args.host, "user": args.user, "password": args.password, "database": args.database})
+
+
+def time_method(writer: DatabaseWriter, df: pd.DataFrame, method: str, args) -> float:
+    started = time.perf_counter()
+    writer.insert_dataframe(df, 'nav', if_exists='upsert', pk_columns=['isin', 'date'], method=method,
+                            chunk_size=args.chunk_size, commit_every=args.commit_every)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3_000_000)
+    parser.add_argument('--funds', type=int, default=1_000)
+    parser.add_argument('--methods', nargs='+', default=['executemany', 'bulk'], choices=['executemany', 'bulk'])
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--commit-every', type=int, default=500_000)
+    parser.add_argument('--host', default=config.DB_HOST)
+    parser.add_argument('--user', default=config.DB_USER)
+    parser.add_argument('--password', default=config.DB_PASSWORD)
+    parser.add_argument('--database', default='fund_data_bench')
+    args = parser.parse_args()
+
+    navs = synthetic_navs(args.rows, args.funds)
+    overview = pd.DataFrame({'isin': navs['isin'].unique()})
+    updated = navs.assign(close=(navs['close'] * 1.001).round(4))
+    print(f"{len(navs):,} NAV rows across {len(overview):,} funds")
+
+    print(f"{'method':>12} {'pass':>7} {'seconds':>9} {'rows/s':>12}")
+    for method in args.methods:
+        reset_database(args)
+        writer = DatabaseWriter(args.host, args.database, args.user, args.password)
+        try:
+            writer.insert_dataframe(overview, 'fund_overview', if_exists='upsert', pk_columns=['isin'])
+            for label, frame in (('insert', navs), ('update', updated)):
+                elapsed = time_method(writer, frame, method, args)
+                print(f"{method:>12} {label:>7} {elapsed:>9.1f} {len(frame) / elapsed:>12,.0f}")
+        finally:
+            writer.close_pool()
+
+
+if __name__ == '__main__':
+    main()
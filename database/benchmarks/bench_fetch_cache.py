@@ -0,0 +1,125 @@
+# bench_fetch_cache.py
+"""
+Benchmark the Allfunds response cache: bandwidth and time per refresh.
+
+A local HTTP server stands in for the Allfunds API. It serves NAV payloads for
+synthetic ISINs with a fixed latency and supports ETag / If-None-Match. The
+same NAV fetch (single_fund_navs for every fund, on the fetch pool) runs as:
+
+- no_cache: every run downloads everything, as before
+- cold: first run into an empty cache
+- revalidate: same request again; the server answers 304 and bodies come from disk
+- fresh: cache entries younger than fresh_for are served without a request
+- replay: offline, with a later until_date (served from the URL's latest entry)
+
+Replay has no network at all, so its time is the transform (JSON parsing and
+DataFrame building) alone, separately from fetch and load.
+
+    python benchmarks/bench_fetch_cache.py --funds 500 --days 5000 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_collector
+from fetch_engine import BatchFetcher, ResponseCache
+
+
+def make_server(days: int, latency: float):
+    dates = pd.bdate_range('2000-01-03', periods=days).strftime('%Y-%m-%d').tolist()
+    bodies, stats, lock = {}, {'requests': 0, 'not_modified': 0, 'bytes': 0}, threading.Lock()
+
+    def body_for(isin: str) -> bytes:
+        if isin not in bodies:
+            rng = np.random.default_rng(int(hashlib.sha256(isin.encode()).hexdigest()[:8], 16))
+            values = np.round(100 * np.exp(rng.normal(0, 0.01, days).cumsum()), 4).tolist()
+            bodies[isin] = json.dumps({'data': {'close_prices': [{'date': d, 'value': v} for d, v in zip(dates, values)]}}).encode()
+        return bodies[isin]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            isin = self.path.split('/funds/')[1].split('/')[0]
+            body = body_for(isin)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            with lock:
+                stats['requests'] += 1
+            if self.headers.get('If-None-Match') == etag:
+                with lock:
+                    stats['not_modified'] += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            with lock:
+                stats['bytes'] += len(body)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def run(fetcher: BatchFetcher, isins: list, until_date: str) -> tuple:
+    started = time.perf_counter()
+    batch = fetcher.fetch_many(isins, lambda isin: data_collector.single_fund_navs(isin, '2000-01-01', until_date, fetcher))
+    elapsed = time.perf_counter() - started
+    rows = sum(len(df) for df in batch.results.values())
+    return elapsed, rows, len(batch.failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--funds', type=int, default=500)
+    parser.add_argument('--days', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.05, help='server seconds per request')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    server, stats = make_server(args.days, args.latency)
+    data_collector.http_product_url = f"http://127.0.0.1:{server.server_address[1]}"
+    isins = [f"BM{i:010d}" for i in range(args.funds)]
+
+    with tempfile.TemporaryDirectory() as root:
+        scenarios = [
+            ('no_cache', None, '2024-12-31'),
+            ('cold', ResponseCache(root), '2024-12-31'),
+            ('revalidate', ResponseCache(root), '2024-12-31'),
+            ('fresh', ResponseCache(root, fresh_for=3600), '2024-12-31'),
+            ('replay', ResponseCache(root, offline=True), '2025-01-31'),
+        ]
+        print(f"{args.funds} funds x {args.days} NAVs, {args.latency * 1000:.0f} ms per request")
+        print(f"{'scenario':>10} {'seconds':>8} {'requests':>9} {'304s':>6} {'MiB sent':>9} {'rows':>10} {'failed':>7}")
+        for name, cache, until_date in scenarios:
+            before = dict(stats)
+            fetcher = BatchFetcher(max_workers=args.workers, requests_per_second=0, cache=cache)
+            elapsed, rows, failed = run(fetcher, isins, until_date)
+            fetcher.close()
+            print(f"{name:>10} {elapsed:>8.2f} {stats['requests'] - before['requests']:>9} "
+                  f"{stats['not_modified'] - before['not_modified']:>6} "
+                  f"{(stats['bytes'] - before['bytes']) / 2 ** 20:>9.1f} {rows:>10,} {failed:>7}")
+        on_disk = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+        print(f"Cache on disk: {on_disk / 2 ** 20:.1f} MiB")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
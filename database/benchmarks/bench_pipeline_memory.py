@@ -0,0 +1,102 @@
+# bench_pipeline_memory.py
+"""
+Peak-memory benchmark: materialize-everything NAV ingestion vs. the streaming pipeline.
+
+No network or database is needed: a synthetic fetch function returns one fund's NAV
+history (built the same way single_fund_navs parses the API payload), and the writer
+builds the executemany row tuples and throws them away. Each mode runs in its own
+subprocess so peak RSS is measured independently.
+
+    python benchmarks/bench_pipeline_memory.py --funds 2000 --days 5000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+from fetch_engine import BatchFetcher
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def synthetic_fetch(days: int):
+    dates = pd.bdate_range('2000-01-03', periods=days).strftime('%Y-%m-%d').tolist()
+
+    def fetch_one(isin: str) -> pd.DataFrame:
+        rng = np.random.default_rng(abs(hash(isin)) % (2 ** 32))
+        values = np.round(100 * np.exp(rng.normal(0, 0.01, days).cumsum()), 4).tolist()
+        payload = json.dumps({'data': {'close_prices': [{'date': d, 'value': v} for d, v in zip(dates, values)]}})
+        df_nav = pd.DataFrame(json.loads(payload)['data']['close_prices'])
+        df_nav['isin'] = isin
+        return df_nav[['isin', 'date', 'value']]
+
+    return fetch_one
+
+
+def null_write(df: pd.DataFrame):
+    """What insert_dataframe does before talking to MySQL: build the row tuples."""
+    data_tuples = [tuple(row) for row in df.itertuples(index=False)]
+    return len(data_tuples)
+
+
+def run_mode(mode: str, args) -> dict:
+    isin_codes = [f"BM{i:010d}" for i in range(args.funds)]
+    fetch_one = synthetic_fetch(args.days)
+    fetcher = BatchFetcher(max_workers=args.workers, requests_per_second=0)
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+
+    if mode == 'materialized':
+        # the original flow: every fund's frame, then one concat, then one tuple list
+        batch = fetcher.fetch_many(isin_codes, fetch_one)
+        nav_data = pd.concat([batch.results[isin] for isin in isin_codes], axis=0)
+        nav_data.columns = ['isin', 'date', 'close']
+        rows = null_write(nav_data)
+    else:
+        report = pipeline.run_pipeline(
+            fetcher, isin_codes, fetch_one, lambda f: f.rename(columns={'value': 'close'}), null_write,
+            'nav', batch_size=args.batch_size,
+        )
+        rows = report.rows_written
+
+    return {'mode': mode, 'rows': rows, 'seconds': time.perf_counter() - started,
+            'baseline_mb': baseline_mb, 'peak_mb': peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--funds', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=2500)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--mode', choices=['materialized', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args)))
+        return
+
+    print(f"{args.funds:,} funds x {args.days:,} days = {args.funds * args.days:,} NAV rows")
+    print(f"{'mode':>13} {'rows':>12} {'seconds':>8} {'peak RSS MB':>12} {'over baseline':>14}")
+    for mode in ('materialized', 'streaming'):
+        output = subprocess.run([sys.executable, __file__, '--mode', mode, *sys.argv[1:]],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>13} {result['rows']:>12,} {result['seconds']:>8.1f} {result['peak_mb']:>12.0f} "
+              f"{result['peak_mb'] - result['baseline_mb']:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
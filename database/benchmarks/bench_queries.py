@@ -0,0 +1,197 @@
+# bench_queries.py
+"""
+Benchmark the typical fund_data read patterns before and after the schema migrations.
+
+Creates a scratch database (default `fund_data_bench`) at migration `--before`
+(default 0001, the original schema), seeds synthetic funds and NAVs, and times
+each query. It then applies the remaining migrations (secondary indexes, nav
+partitioning, compact close type) and times the same queries again. Also
+reports the on-disk size of the nav table. Needs a MySQL/MariaDB server with
+local_infile enabled, e.g.
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=root mysql:8 --local-infile=1
+    python benchmarks/bench_queries.py --funds 2000 --years 15 --user root --password root
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import database_setup
+import migrate
+from data_collector import DatabaseWriter
+
+ASSET_CLASSES = {
+    'Equity': ['Global Equity', 'US Large Cap', 'Emerging Markets Equity', 'Technology Sector', 'European Equity'],
+    'Fixed Income': ['Global Bonds', 'EUR Corporate Bonds', 'High Yield Bonds', 'Government Bonds'],
+    'Mixed Assets': ['Balanced Allocation', 'Cautious Allocation', 'Aggressive Allocation'],
+    'Money Market': ['EUR Money Market', 'USD Money Market'],
+}
+
+# name -> (SQL, function returning parameters for one run)
+QUERIES = {
+    'latest_nav_per_fund': (
+        "SELECT n.`isin`, n.`date`, n.`close` FROM `nav` n "
+        "JOIN (SELECT `isin`, MAX(`date`) AS `date` FROM `nav` GROUP BY `isin`) latest USING (`isin`, `date`)",
+        lambda ctx: (),
+    ),
+    'nav_range_1y': (
+        "SELECT `date`, `close` FROM `nav` WHERE `isin` = %s AND `date` >= %s AND `date` <= %s ORDER BY `date`",
+        lambda ctx: (random.choice(ctx['isins']), ctx['last_year_start'], ctx['last_date']),
+    ),
+    'nav_cross_section': (
+        "SELECT `isin`, `close` FROM `nav` WHERE `date` = %s",
+        lambda ctx: (random.choice(ctx['recent_dates']),),
+    ),
+    'screen_by_category': (
+        "SELECT `isin`, `name`, `category`, `risk_reward_indicator` FROM `fund_overview` "
+        "WHERE `category` = %s ORDER BY `isin` LIMIT 51",
+        lambda ctx: (random.choice(ctx['categories']),),
+    ),
+    'screen_by_class_and_risk': (
+        "SELECT `isin`, `name` FROM `fund_overview` "
+        "WHERE `asset_class` = %s AND `risk_reward_indicator` >= %s AND `risk_reward_indicator` <= %s "
+        "ORDER BY `isin` LIMIT 51",
+        lambda ctx: (random.choice(list(ASSET_CLASSES)), 3, 5),
+    ),
+    'largest_in_category': (
+        "SELECT `isin`, `name`, `fund_aum` FROM `fund_overview` WHERE `category` = %s "
+        "ORDER BY `fund_aum` DESC LIMIT 5",
+        lambda ctx: (random.choice(ctx['categories']),),
+    ),
+}
+
+
+def synthetic_overview(funds: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(funds):
+        asset_class = rng.choice(list(ASSET_CLASSES))
+        category = rng.choice(ASSET_CLASSES[asset_class])
+        rows.append({
+            'isin': f"BM{i:010d}", 'name': f"{category} Fund {i}", 'fund_company': f"Asset Manager {i % 50}",
+            'asset_class': asset_class, 'category': category, 'risk_reward_indicator': rng.randint(1, 7),
+            'fund_aum': round(rng.uniform(1e6, 5e9), 2), 'aum_currency': rng.choice(['EUR', 'USD', 'GBP']),
+        })
+    return pd.DataFrame(rows)
+
+
+def synthetic_navs(isins: list[str], years: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp('2024-12-31'), periods=260 * years).strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        'isin': np.repeat(isins, len(dates)),
+        'date': np.tile(dates, len(isins)),
+        'close': np.round(100 * np.exp(rng.normal(0, 0.01, (len(isins), len(dates))).cumsum(axis=1)).ravel(), 4),
+    })
+
+
+def reset_database(args, db_config: dict):
+    conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    cursor.close()
+    conn.close()
+    database_setup.create_database(args.host, args.user, args.password, args.database)
+    migrate.migrate(db_config, target=args.before)
+
+
+def nav_table_mib(cursor, database: str) -> float:
+    cursor.execute("ANALYZE TABLE `nav`")
+    cursor.fetchall()
+    cursor.execute("SELECT SUM(data_length + index_length) FROM information_schema.tables "
+                   "WHERE table_schema = %s AND table_name = 'nav'", (database,))
+    return float(cursor.fetchone()[0] or 0) / 2 ** 20
+
+
+def time_queries(db_config: dict, ctx: dict, repeats: int) -> dict:
+    """name -> median milliseconds over `repeats` runs, after one warm-up run"""
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    for table in ('fund_overview', 'nav'):
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+    results = {}
+    try:
+        for name, (sql, params) in QUERIES.items():
+            timings = []
+            for run in range(repeats + 1):
+                random.seed(run)
+                started = time.perf_counter()
+                cursor.execute(sql, params(ctx))
+                cursor.fetchall()
+                if run:
+                    timings.append(time.perf_counter() - started)
+            results[name] = float(np.median(timings)) * 1000
+    finally:
+        cursor.close()
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--funds', type=int, default=2_000)
+    parser.add_argument('--years', type=int, default=15)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--before', type=int, default=1, help='migration version of the "before" schema')
+    parser.add_argument('--host', default=config.DB_HOST)
+    parser.add_argument('--user', default=config.DB_USER)
+    parser.add_argument('--password', default=config.DB_PASSWORD)
+    parser.add_argument('--database', default='fund_data_bench')
+    args = parser.parse_args()
+    db_config = {"host": args.host, "user": args.user, "password": args.password, "database": args.database}
+
+    overview = synthetic_overview(args.funds)
+    navs = synthetic_navs(overview['isin'].tolist(), args.years)
+    dates = sorted(navs['date'].unique())
+    ctx = {
+        'isins': overview['isin'].tolist(),
+        'categories': sorted(overview['category'].unique()),
+        'last_date': dates[-1],
+        'last_year_start': dates[-260],
+        'recent_dates': dates[-20:],
+    }
+    print(f"{len(navs):,} NAV rows across {len(overview):,} funds")
+
+    reset_database(args, db_config)
+    writer = DatabaseWriter(args.host, args.database, args.user, args.password)
+    try:
+        writer.insert_dataframe(overview, 'fund_overview', if_exists='upsert', pk_columns=['isin'])
+        writer.insert_dataframe(navs, 'nav', if_exists='upsert', pk_columns=['isin', 'date'], method='bulk')
+    finally:
+        writer.close_pool()
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    size_before = nav_table_mib(cursor, args.database)
+    cursor.close()
+    conn.close()
+    before = time_queries(db_config, ctx, args.repeats)
+
+    started = time.perf_counter()
+    migrate.migrate(db_config)
+    migration_seconds = time.perf_counter() - started
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    size_after = nav_table_mib(cursor, args.database)
+    cursor.close()
+    conn.close()
+    after = time_queries(db_config, ctx, args.repeats)
+
+    print(f"Migrations took {migration_seconds:.1f}s; nav table {size_before:,.1f} MiB -> {size_after:,.1f} MiB")
+    print(f"{'query':>26} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in QUERIES:
+        print(f"{name:>26} {before[name]:>10.2f} {after[name]:>10.2f} {before[name] / after[name]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# bench_scheduler.py
+"""
+Benchmark step 3 of main.py: stages one after another vs. the DAG scheduler.
+
+A local HTTP server stands in for the Allfunds API (catalog, overview,
+performance and close prices, with a fixed latency per request). The fetch
+stages are the real ones from main.ingestion_stages, on one shared fetcher.
+MySQL is simulated: a writer that sleeps per row written, plus fixed
+times for the snapshot, search index and analytics stages, which read back
+from the database.
+
+The serial run uses one scheduler worker. That gives the order of the old
+main(), where every step waited for the one before it. The parallel run uses
+config.INGEST_MAX_PARALLEL_STAGES workers. A third run fails the performance
+fetch and then resumes from the checkpoint, to show that only the failed stage
+and its dependents run again.
+
+    python benchmarks/bench_scheduler.py --funds 300 --days 2500 --latency 0.03
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import data_collector
+import scheduler
+from fetch_engine import BatchFetcher
+from main import ingestion_stages
+
+# Stand-ins for the stages that read back from MySQL, in seconds
+SIMULATED_EXPORTS = {'nav_snapshot': 1.0, 'search_index': 0.5, 'analytics': 1.5}
+
+
+def serve(funds: int, days: int, latency: float, ports, fail_performance):
+    """Run the fake API in its own process, so it does not compete with the fetchers for the GIL"""
+    isins = [f"BM{i:010d}" for i in range(funds)]
+    dates = pd.bdate_range('2010-01-04', periods=days).strftime('%Y-%m-%d').tolist()
+    prices = np.round(100 * np.exp(np.random.default_rng(0).normal(0, 0.01, days).cumsum()), 4).tolist()
+    navs = json.dumps({'data': {'close_prices': [{'date': d, 'value': v} for d, v in zip(dates, prices)]}}).encode()
+    catalog = json.dumps({'status': 'success', 'data': {'funds': [
+        {'allfunds_id': i, 'isin': isin, 'currency': 'EUR', 'company': {'allfunds_id': i % 40, 'name': f"Manager {i % 40}"},
+         'product_status': 'active', 'last_updated_portfolio_date': '2024-12-31',
+         'created_at': '2020-01-01', 'updated_at': '2024-12-31'} for i, isin in enumerate(isins)]}}).encode()
+
+    def overview(isin):
+        return {'data': {'isin': isin, 'name': f"Fund {isin}", 'fund_company': 'Manager', 'asset_class': 'Equity',
+                         'subasset_class': None, 'category': 'Global Equity', 'inception_date': '2010-01-04',
+                         'risk_reward_indicator': 5, 'fund_benchmark': 'MSCI World',
+                         'investment_objective': {'en': 'Long-term capital growth.'}, 'fund_aum': 1e8, 'nav': 100.0,
+                         'aum_currency': 'EUR'}}
+
+    def performance(isin):
+        periods = ['inception', 'one_day', 'one_week', 'one_month', 'three_months', 'six_months', 'one_year',
+                   'two_years', 'three_years', 'five_years', 'ten_years']
+        return {'data': {'performance': {**{p: 1.0 for p in periods}, 'quartiles': [], 'quarterly_returns': [],
+                                         'monthly_returns': [], 'yearly_returns': []}}}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            path = self.path.split('?')[0]
+            if path.endswith('/catalog'):
+                body = catalog
+            elif path.endswith('/close_prices'):
+                body = navs
+            elif path.endswith('/overview'):
+                body = json.dumps(overview(path.split('/')[-2])).encode()
+            elif path.endswith('/performance') and not fail_performance.value:
+                body = json.dumps(performance(path.split('/')[-2])).encode()
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class SimulatedWriter:
+    """DatabaseWriter stand-in: each upsert takes time proportional to its rows"""
+
+    def __init__(self, seconds_per_row: float):
+        self.seconds_per_row = seconds_per_row
+
+    def get_nav_high_water_marks(self) -> dict:
+        return {}
+
+    def insert_dataframe(self, df, table_name, **kwargs):
+        time.sleep(len(df) * self.seconds_per_row)
+
+
+def stages_for(writer) -> list:
+    stages = []
+    for stage in ingestion_stages(writer, full_backfill=True):
+        if stage.name in SIMULATED_EXPORTS:
+            seconds = SIMULATED_EXPORTS[stage.name]
+            stage = scheduler.Stage(stage.name, lambda inputs, s=seconds: time.sleep(s), stage.deps)
+        stages.append(stage)
+    return stages
+
+
+def timed_run(label: str, stages: list, workers: int, checkpoint_dir=None, resume=False):
+    data_collector._default_fetcher = BatchFetcher(max_workers=config.ALLFUNDS_MAX_WORKERS, requests_per_second=0)
+    report = scheduler.run_stages(stages, max_workers=workers, checkpoint_dir=checkpoint_dir, resume=resume)
+    data_collector._default_fetcher.close()
+    return label, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--funds', type=int, default=300)
+    parser.add_argument('--days', type=int, default=2500)
+    parser.add_argument('--latency', type=float, default=0.03, help='server seconds per request')
+    parser.add_argument('--us-per-row', type=float, default=2.0, help='simulated write time per row, in microseconds')
+    args = parser.parse_args()
+
+    ports, fail_performance = multiprocessing.Queue(), multiprocessing.Value('b', False)
+    server = multiprocessing.Process(target=serve, args=(args.funds, args.days, args.latency, ports, fail_performance),
+                                     daemon=True)
+    server.start()
+    data_collector.http_product_url = f"http://127.0.0.1:{ports.get()}"
+    data_collector.ALLFUND_PATH = f"{data_collector.http_product_url}/{data_collector.productApiPath}/funds"
+    stages = stages_for(SimulatedWriter(args.us_per_row / 1e6))
+
+    runs = [timed_run('serial', stages, 1), timed_run('dag', stages, config.INGEST_MAX_PARALLEL_STAGES)]
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        fail_performance.value = True
+        failed = timed_run('dag, perf fails', stages, config.INGEST_MAX_PARALLEL_STAGES, checkpoint_dir)
+        fail_performance.value = False
+        resumed = timed_run('resume', stages, config.INGEST_MAX_PARALLEL_STAGES, checkpoint_dir, resume=True)
+    server.terminate()
+
+    print(f"\n{args.funds} funds x {args.days} NAVs, {args.latency * 1000:.0f} ms per request, "
+          f"{args.us_per_row:g} us per row written")
+    for label, report in runs + [failed, resumed]:
+        print(f"\n== {label}")
+        report.print_summary(stages)
+
+
+if __name__ == '__main__':
+    main()
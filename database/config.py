@@ -8,4 +8,27 @@ ADMIN_USER = "admin"
 ADMIN_PASSWORD = "Qraft12#"  # Change this to a secure password
 
 READER_USER = "reader"
-READER_PASSWORD = "0000"  # Change this to a secure password
\ No newline at end of file
+READER_PASSWORD = "0000"  # Change this to a secure password
+
+# Allfunds API fetch settings
+ALLFUNDS_REQUESTS_PER_SECOND = 10  # request budget shared by all fetch workers
+ALLFUNDS_MAX_WORKERS = 16          # concurrent requests (and keep-alive connections)
+ALLFUNDS_MAX_RETRIES = 5           # retries on 429/5xx and connection errors
+ALLFUNDS_CACHE_DIR = "allfunds_cache"  # gzip cache of raw API responses (None = no cache)
+ALLFUNDS_CACHE_TTL_DAYS = 30       # cached responses older than this are evicted
+ALLFUNDS_CACHE_MAX_MB = 2048       # compressed size budget; least recently used responses go first
+ALLFUNDS_CACHE_FRESH_SECONDS = 0   # serve cached responses this young without asking the API (0 = always revalidate)
+
+# NAV ingestion
+NAV_BACKFILL_SINCE = "2000-01-01"  # start date for full backfills and ISINs with no stored NAVs
+NAV_BATCH_SIZE = 50_000            # rows per batch in the streaming NAV pipeline
+NAV_WRITE_METHOD = "bulk"          # DatabaseWriter method: "bulk" (LOAD DATA) or "executemany"
+NAV_SNAPSHOT_DIR = "nav_snapshot"  # columnar NAV snapshot read by the backend (its NAV_SNAPSHOT_DIR)
+SEARCH_INDEX_DIR = "search_index"  # fund search index read by the backend (its FUND_SEARCH_INDEX_DIR)
+
+# Analytics
+ANALYTICS_RISK_FREE_RATE = 0.0     # annual risk-free rate used for Sharpe/Sortino
+
+# Ingestion scheduler
+INGEST_MAX_PARALLEL_STAGES = 4     # fetch/load stages running at once (each holds one DB connection)
+INGEST_CHECKPOINT_DIR = "ingest_checkpoint"  # stage status and outputs, for main.py --resume
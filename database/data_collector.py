@@ -1,13 +1,19 @@
 # data_collector.py
+import os
+import csv
 import json
-import requests
+import tempfile
+import threading
 import numpy as np
 import pandas as pd
 import mysql.connector
 from typing import Optional
-from datetime import datetime
+from datetime import date, timedelta
 from mysql.connector import Error, pooling
 
+import config
+from fetch_engine import BatchFetcher, BatchResult, ResponseCache
+
 # --- Allfunds API Integration (Conceptual) ---
 # This is a placeholder. You'll need to adapt it to the actual Allfunds API documentation.
 # Authentication might involve OAuth2, API keys in headers, etc.
@@ -18,15 +24,81 @@ allfund_token  = "allfundsToken"
 
 ALLFUND_PATH = f'{http_product_url}/{productApiPath}/funds'
 
-def get_fund_catalog_data():
-
-    result = requests.get(url=ALLFUND_PATH+'/catalog')
+_default_fetcher = None
+_fetcher_lock = threading.Lock()
+_replay = False
+
+def set_replay_mode(enabled: bool = True):
+    """Serve every Allfunds request from the response cache only, for the shared fetcher created after this call."""
+    global _default_fetcher, _replay
+    _replay = enabled
+    if _default_fetcher is not None:
+        _default_fetcher.close()
+        _default_fetcher = None
+
+def get_fetcher() -> BatchFetcher:
+    """Shared fetcher (keep-alive session pool + rate limit + response cache) used when none is passed in."""
+    global _default_fetcher
+    with _fetcher_lock:  # ingestion stages run on several threads
+        if _default_fetcher is None:
+            _default_fetcher = _create_fetcher()
+    return _default_fetcher
+
+def _create_fetcher() -> BatchFetcher:
+    cache = None
+    if config.ALLFUNDS_CACHE_DIR:
+        cache = ResponseCache(
+            config.ALLFUNDS_CACHE_DIR,
+            ttl=config.ALLFUNDS_CACHE_TTL_DAYS * 86400,
+            max_bytes=config.ALLFUNDS_CACHE_MAX_MB * 2 ** 20,
+            fresh_for=config.ALLFUNDS_CACHE_FRESH_SECONDS,
+            offline=_replay,
+        )
+        if not _replay:
+            pruned = cache.prune()
+            print(f"Allfunds cache: evicted {pruned['entries']} responses, {pruned['bytes'] / 2 ** 20:.1f} MiB kept.")
+    elif _replay:
+        raise ValueError("Replay mode needs config.ALLFUNDS_CACHE_DIR.")
+    return BatchFetcher(
+        max_workers=config.ALLFUNDS_MAX_WORKERS,
+        requests_per_second=config.ALLFUNDS_REQUESTS_PER_SECOND,
+        max_retries=config.ALLFUNDS_MAX_RETRIES,
+        cache=cache,
+    )
+
+def cache_report() -> Optional[str]:
+    """One-line summary of the shared fetcher's cache use in this run, if it has a cache."""
+    if _default_fetcher is None or _default_fetcher.cache is None:
+        return None
+    stats = _default_fetcher.cache.stats
+    return (f"Allfunds cache: {stats.misses} downloaded ({stats.bytes_downloaded / 2 ** 20:.1f} MiB), "
+            f"{stats.revalidated} not modified, {stats.fresh_hits} fresh, {stats.replayed} replayed; "
+            f"{stats.bytes_saved / 2 ** 20:.1f} MiB not re-downloaded.")
+
+def _concat_batch(batch: BatchResult, isin_codes: list[str], label: str, columns: list[str]) -> pd.DataFrame:
+    """Concatenate per-ISIN frames in input order, attaching the failure report to df.attrs."""
+    frames = [batch.results[isin] for isin in isin_codes if isin in batch.results]
+    data = pd.concat(frames, axis=0) if frames else pd.DataFrame(columns=columns)
+
+    print(f"Fetched {label} for {len(frames)}/{len(isin_codes)} funds in {batch.elapsed:.1f}s.")
+    if batch.failures:
+        print(f"{len(batch.failures)} {label} fetches failed:")
+        for failure in batch.failures[:10]:
+            print(f"  {failure.key}: {failure.error}")
+
+    data.attrs['fetch_failures'] = batch.failure_report()
+    return data
+
+def get_fund_catalog_data(fetcher: Optional[BatchFetcher] = None):
+    fetcher = fetcher or get_fetcher()
+
+    result = fetcher.get(ALLFUND_PATH+'/catalog')
     content = json.loads(result.content)
 
     if content['status'] == 'success':
         data = content['data']['funds']
     else:
-        raise 'Data cannot be fetched from API.'
+        raise ValueError('Data cannot be fetched from API.')
     
     fund_table = pd.DataFrame(list(data))
 
@@ -38,15 +110,20 @@ def get_fund_catalog_data():
     fund_catalog = fund_table[['allfunds_id', 'isin','currency','company_id','company_name','product_status','last_updated_portfolio_date','created_at','updated_at']]
     return fund_catalog
 
+def fetch_fund_catalog_data(fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    """Fund catalog for the ingestion job, one row per allfunds_id."""
+    fund_catalog = get_fund_catalog_data(fetcher)
+    fund_catalog = fund_catalog.drop_duplicates(subset=['allfunds_id'], keep='last')
+    print(f"Fetched catalog of {len(fund_catalog)} funds.")
+    return fund_catalog
+
 # get overview given fund isin
-def single_fund_overview(isin:str):
+def single_fund_overview(isin:str, fetcher: Optional[BatchFetcher] = None):
     assert isin[:2].isalpha, 'Invalid ISIN: First two-letter country code is unavailable.'
+    fetcher = fetcher or get_fetcher()
     
     overview_url = f'{http_product_url}/{productApiPath}/funds/{isin}/overview'
-    response = requests.get(overview_url)
-
-    if response.status_code != 200:
-        raise ValueError("can't fetch data.")
+    response = fetcher.get(overview_url)
 
     # extract data from response
     data = json.loads(response.content)['data']
@@ -55,31 +132,36 @@ def single_fund_overview(isin:str):
     df_indiv_overview = pd.DataFrame.from_dict(data, orient='index').T
     return df_indiv_overview
 
-def dlifo_fund_overview(isin_codes: list[str]) -> pd.DataFrame:
+OVERVIEW_COLUMNS = ['isin', 'name', 'fund_company', 'asset_class', 'subasset_class', 'category',  'inception_date', 'risk_reward_indicator', 'fund_benchmark', 'investment_objective', 'fund_aum', 'nav', 'aum_currency', ]
+
+def dlifo_fund_overview(isin_codes: list[str], fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    fetcher = fetcher or get_fetcher()
     
-    # run overview fetch individually.
-    overview_data = [single_fund_overview(isin) for isin in isin_codes]
-    overview_data = pd.concat(overview_data, axis=0)
+    # run overview fetches concurrently; failed ISINs are reported in df.attrs['fetch_failures']
+    batch = fetcher.fetch_many(isin_codes, lambda isin: single_fund_overview(isin, fetcher))
+    overview_data = _concat_batch(batch, isin_codes, 'overview', OVERVIEW_COLUMNS)
     
     # select useful data
-    interested_col = ['isin', 'name', 'fund_company', 'asset_class', 'subasset_class', 'category',  'inception_date', 'risk_reward_indicator', 'fund_benchmark', 'investment_objective', 'fund_aum', 'nav', 'aum_currency', ]
-    selected_data = overview_data[interested_col]
+    selected_data = overview_data[OVERVIEW_COLUMNS].copy()
     
     # extract key info from investment objective (english)
-    selected_data['investment_objective'] = selected_data['investment_objective'].apply(lambda x: x['en']).values
+    selected_data['investment_objective'] = selected_data['investment_objective'].apply(lambda x: x['en'] if isinstance(x, dict) else x).values
+    selected_data.attrs = overview_data.attrs
     return selected_data
 
-def single_fund_navs(isin:str, since_date:str, until_date:Optional[str]=None) -> pd.DataFrame:
+def fetch_fund_overview_data(isin_codes: list[str], fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    """Overview of every catalog ISIN (each fetched once), for the fund_overview table."""
+    return dlifo_fund_overview(list(dict.fromkeys(isin_codes)), fetcher)
+
+def single_fund_navs(isin:str, since_date:str, until_date:Optional[str]=None, fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
     assert isin[:2].isalpha, 'Invalid ISIN: First two-letter country code is unavailable.'
+    fetcher = fetcher or get_fetcher()
     
     if until_date is None:
-        until_date = str(datetime.date.today())
+        until_date = str(date.today())
     
     overview_url = f'{http_product_url}/{productApiPath}/funds/{isin}/close_prices'
-    response = requests.get(overview_url, params={'since_date': since_date,'until_date': until_date})
-
-    if response.status_code != 200:
-        return "can't fetch data."
+    response = fetcher.get(overview_url, params={'since_date': since_date,'until_date': until_date})
     
     # extract NAV data from response
     data = json.loads(response.content)['data']
@@ -87,26 +169,73 @@ def single_fund_navs(isin:str, since_date:str, until_date:Optional[str]=None) ->
     df_nav['isin'] = isin
     return df_nav[['isin', 'date', 'value']]
 
-def dlifo_fund_navs(isin_codes: list[str], since_date:str, until_date:Optional[str]=None) -> pd.DataFrame:
+def dlifo_fund_navs(isin_codes: list[str], since_date:str, until_date:Optional[str]=None, fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    fetcher = fetcher or get_fetcher()
     if until_date is None:
-        until_date = str(datetime.date.today())
+        until_date = str(date.today())
     
-    # run nav fetch individually.
-    nav_data = [single_fund_navs(isin, since_date, until_date) for isin in isin_codes]
-    nav_data = pd.concat(nav_data, axis=0)
+    # run nav fetches concurrently; failed ISINs are reported in df.attrs['fetch_failures']
+    batch = fetcher.fetch_many(isin_codes, lambda isin: single_fund_navs(isin, since_date, until_date, fetcher))
+    nav_data = _concat_batch(batch, isin_codes, 'NAV', ['isin', 'date', 'value'])
     
     # extract key info from investment objective (english)
     nav_data.columns = ['isin', 'date', 'close']
     return nav_data
 
-def single_fund_performance(isin:str) -> pd.DataFrame:
+def nav_since_dates(isin_codes: list[str], high_water_marks: dict, default_since_date:str, until: date) -> dict:
+    """First date to request per ISIN: the day after its high-water mark, or default_since_date. Up-to-date ISINs are left out."""
+    since_by_isin = {}
+    for isin in isin_codes:
+        mark = high_water_marks.get(isin)
+        since = mark + timedelta(days=1) if mark else date.fromisoformat(default_since_date)
+        if since <= until:
+            since_by_isin[isin] = since
+    return since_by_isin
+
+def drop_stored_navs(nav_data: pd.DataFrame, high_water_marks: dict) -> pd.DataFrame:
+    """The API range is inclusive, so drop anything at or before the stored mark."""
+    if nav_data.empty or not high_water_marks:
+        return nav_data
+    marks = pd.to_datetime(nav_data['isin'].map(high_water_marks))
+    keep = marks.isna() | (pd.to_datetime(nav_data['date']) > marks)
+    return nav_data[keep.values]
+
+def dlifo_fund_navs_incremental(isin_codes: list[str], high_water_marks: dict, default_since_date:str, until_date:Optional[str]=None, fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    """
+    Fetch only NAVs newer than each ISIN's high-water mark (latest date already stored).
+    ISINs without a mark start from default_since_date; ISINs already up to date are skipped.
+    """
+    fetcher = fetcher or get_fetcher()
+    until = date.fromisoformat(until_date) if until_date else date.today()
+    since_by_isin = nav_since_dates(isin_codes, high_water_marks, default_since_date, until)
+
+    print(f"Incremental NAV fetch: {len(since_by_isin)}/{len(isin_codes)} funds need new prices.")
+    pending = list(since_by_isin)
+    batch = fetcher.fetch_many(pending, lambda isin: single_fund_navs(isin, str(since_by_isin[isin]), str(until), fetcher))
+    nav_data = _concat_batch(batch, pending, 'NAV', ['isin', 'date', 'value'])
+    nav_data.columns = ['isin', 'date', 'close']
+    return drop_stored_navs(nav_data, high_water_marks)
+
+def fetch_nav_data(db_writer, isin_codes: list[str], full_backfill: bool = False, since_date: Optional[str] = None, until_date: Optional[str] = None, fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    """
+    NAV rows to write for this run.
+    Incremental (default): only prices after each ISIN's MAX(date) in the nav table.
+    Full backfill: the whole history since `since_date`, for recovery.
+    """
+    since_date = since_date or config.NAV_BACKFILL_SINCE
+    if full_backfill:
+        print(f"Full NAV backfill since {since_date}.")
+        return dlifo_fund_navs(isin_codes, since_date, until_date, fetcher)
+
+    high_water_marks = db_writer.get_nav_high_water_marks()
+    return dlifo_fund_navs_incremental(isin_codes, high_water_marks, since_date, until_date, fetcher)
+
+def single_fund_performance(isin:str, fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
     assert isin[:2].isalpha, 'Invalid ISIN: First two-letter country code is unavailable.'
+    fetcher = fetcher or get_fetcher()
     
     performance_url = f'{http_product_url}/{productApiPath}/funds/{isin}/performance'
-    response = requests.get(performance_url)
-
-    if response.status_code != 200:
-        return "can't fetch data."
+    response = fetcher.get(performance_url)
     
     # extract performance data from response
     data = json.loads(response.content)['data']['performance']
@@ -116,22 +245,35 @@ def single_fund_performance(isin:str) -> pd.DataFrame:
     del data['quartiles'], data['quarterly_returns'], data['monthly_returns'], data['yearly_returns']
     return pd.DataFrame.from_dict(data, orient='index').T
 
-def dlifo_fund_performance(isin_codes: list[str]) -> pd.DataFrame:
-    # run nav fetch individually.
-    performance_data = [single_fund_performance(isin) for isin in isin_codes]
-    performance_data = pd.concat(performance_data, axis=0)
-    return performance_data[['isin', 'inception', 'one_day', 'one_week', 'one_month', 'three_months', 'six_months', 'one_year', 'two_years', 'three_years', 'five_years', 'ten_years']]
+PERFORMANCE_COLUMNS = ['isin', 'inception', 'one_day', 'one_week', 'one_month', 'three_months', 'six_months', 'one_year', 'two_years', 'three_years', 'five_years', 'ten_years']
+
+def dlifo_fund_performance(isin_codes: list[str], fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    fetcher = fetcher or get_fetcher()
+    # run performance fetches concurrently; failed ISINs are reported in df.attrs['fetch_failures']
+    batch = fetcher.fetch_many(isin_codes, lambda isin: single_fund_performance(isin, fetcher))
+    performance_data = _concat_batch(batch, isin_codes, 'performance', PERFORMANCE_COLUMNS)
+    selected_data = performance_data[PERFORMANCE_COLUMNS]
+    selected_data.attrs = performance_data.attrs
+    return selected_data
+
+def fetch_performance_data(isin_codes: list[str], fetcher: Optional[BatchFetcher] = None) -> pd.DataFrame:
+    """Performance of every catalog ISIN (each fetched once), for the performance table."""
+    return dlifo_fund_performance(list(dict.fromkeys(isin_codes)), fetcher)
 
 
 # --- Database Insertion (Using Admin User) ---
 
 class DatabaseWriter:
-    def __init__(self, db_host, db_name, db_user, db_password):
+    def __init__(self, db_host, db_name, db_user, db_password, pool_size=5, raise_on_error=False):
+        self.pool_size = pool_size
+        # Re-raise write errors after the rollback, so a failed load fails its ingestion stage
+        self.raise_on_error = raise_on_error
         self.db_config = {
             "host": db_host,
             "database": db_name,
             "user": db_user,
-            "password": db_password
+            "password": db_password,
+            "allow_local_infile": True # needed for the LOAD DATA LOCAL INFILE bulk mode
         }
         self.connection_pool = None
         self._create_pool()
@@ -140,7 +282,7 @@ class DatabaseWriter:
         try:
             self.connection_pool = mysql.connector.pooling.MySQLConnectionPool(
                 pool_name="mypool",
-                pool_size=5, # Adjust pool size as needed
+                pool_size=self.pool_size, # one connection per concurrently running ingestion stage
                 **self.db_config
             )
             print("Database connection pool created successfully.")
@@ -155,16 +297,52 @@ class DatabaseWriter:
             print(f"Error getting connection from pool: {e}")
             raise
 
-    def insert_dataframe(self, df, table_name, if_exists='append', pk_columns=None):
+    def get_nav_high_water_marks(self) -> dict:
+        """Latest stored NAV date per ISIN, read in a single grouped query."""
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT `isin`, MAX(`date`) FROM `nav` GROUP BY `isin`")
+            return {isin: last_date for isin, last_date in cursor.fetchall()}
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close() # Return connection to pool
+
+    def get_fund_overview_isins(self) -> set:
+        """ISINs present in fund_overview, the parent of the tables keyed by fund."""
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT `isin` FROM `fund_overview`")
+            return {isin for (isin,) in cursor.fetchall()}
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close() # Return connection to pool
+
+    def insert_dataframe(self, df, table_name, if_exists='append', pk_columns=None, method='executemany', chunk_size=100_000, commit_every=500_000):
         """
         Inserts a pandas DataFrame into a MySQL table.
         'if_exists' options: 'append', 'replace', 'upsert' (custom upsert)
         'pk_columns' is required for 'upsert' to identify unique rows.
+        'method' options: 'executemany' (row tuples) or 'bulk' (see bulk_insert_dataframe).
         """
         if df.empty:
             print(f"DataFrame for '{table_name}' is empty, skipping insertion.")
             return
 
+        if method == 'bulk':
+            return self.bulk_insert_dataframe(df, table_name, if_exists, pk_columns, chunk_size, commit_every)
+        elif method != 'executemany':
+            raise ValueError("Invalid 'method' option. Choose 'executemany' or 'bulk'.")
+
         conn = None
         cursor = None
         try:
@@ -214,11 +392,103 @@ class DatabaseWriter:
             print(f"Error inserting data into '{table_name}': {e}")
             if conn:
                 conn.rollback() # Rollback in case of error
+            if self.raise_on_error:
+                raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close() # Return connection to pool
+
+    def bulk_insert_dataframe(self, df, table_name, if_exists='append', pk_columns=None, chunk_size=100_000, commit_every=500_000):
+        """
+        Bulk-loads a DataFrame through a staging table instead of executemany.
+
+        Each chunk of `chunk_size` rows is written to a temporary CSV file, loaded into a
+        TEMPORARY staging table with LOAD DATA LOCAL INFILE, then merged into the target with
+        a single INSERT ... SELECT (... ON DUPLICATE KEY UPDATE for 'upsert'). The transaction
+        is committed every `commit_every` rows so no single transaction spans the whole frame.
+        Empty strings and NaN are loaded as NULL.
+        """
+        if df.empty:
+            print(f"DataFrame for '{table_name}' is empty, skipping insertion.")
+            return
+        if if_exists not in ('append', 'replace', 'upsert'):
+            raise ValueError("Invalid 'if_exists' option. Choose 'append', 'replace', or 'upsert'.")
+        if if_exists == 'upsert' and not pk_columns:
+            raise ValueError("pk_columns must be provided for 'upsert' mode.")
+
+        staging_table = f"_staging_{table_name}"
+        cols = ", ".join([f"`{col}`" for col in df.columns])
+        variables = ", ".join([f"@v{i}" for i in range(len(df.columns))])
+        assignments = ", ".join([f"`{col}` = NULLIF(@v{i}, '')" for i, col in enumerate(df.columns)])
+
+        sql_merge = f"INSERT INTO `{table_name}` ({cols}) SELECT {cols} FROM `{staging_table}`"
+        if if_exists == 'upsert':
+            update_assignments = ", ".join([f"`{col}` = VALUES(`{col}`)" for col in df.columns if col not in pk_columns])
+            if not update_assignments:
+                update_assignments = f"`{pk_columns[0]}` = VALUES(`{pk_columns[0]}`)"
+            sql_merge += f" ON DUPLICATE KEY UPDATE {update_assignments}"
+
+        # duplicate keys inside one load would be silently dropped by the staging table
+        if pk_columns:
+            df = df.drop_duplicates(subset=pk_columns, keep='last')
+
+        conn = None
+        cursor = None
+        fd, csv_path = tempfile.mkstemp(prefix=f"{table_name}_", suffix=".csv")
+        os.close(fd)
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            # Staging table mirrors the target's columns and keys (but not its foreign keys)
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS `{staging_table}` LIKE `{table_name}`")
+            if if_exists == 'replace':
+                # This truncates the table and then inserts. Use with caution.
+                cursor.execute(f"TRUNCATE TABLE `{table_name}`")
+
+            sql_load = (
+                f"LOAD DATA LOCAL INFILE '{csv_path.replace(os.sep, '/')}' INTO TABLE `{staging_table}` "
+                "CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY ',' ENCLOSED BY '\"' ESCAPED BY '' "
+                "LINES TERMINATED BY '\\n' "
+                f"({variables}) SET {assignments}"
+            )
+
+            loaded = 0
+            uncommitted = 0
+            for start in range(0, len(df), chunk_size):
+                chunk = df.iloc[start:start + chunk_size]
+                chunk.to_csv(csv_path, index=False, header=False, quoting=csv.QUOTE_ALL,
+                             na_rep='', lineterminator='\n', date_format='%Y-%m-%d %H:%M:%S', encoding='utf-8')
+
+                cursor.execute(f"DELETE FROM `{staging_table}`")
+                cursor.execute(sql_load)
+                cursor.execute(sql_merge)
+
+                loaded += len(chunk)
+                uncommitted += len(chunk)
+                if uncommitted >= commit_every:
+                    conn.commit()
+                    uncommitted = 0
+
+            conn.commit()
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging_table}`")
+            print(f"Bulk {if_exists} of {loaded} rows into '{table_name}' complete.")
+
+        except Error as e:
+            print(f"Error bulk loading data into '{table_name}': {e}")
+            if conn:
+                conn.rollback() # Rollback the uncommitted chunks
+            if self.raise_on_error:
+                raise
         finally:
             if cursor:
                 cursor.close()
             if conn:
                 conn.close() # Return connection to pool
+            os.remove(csv_path)
 
     def close_pool(self):
         if self.connection_pool:
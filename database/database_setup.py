@@ -2,7 +2,7 @@
 import mysql.connector
 from mysql.connector import Error
 import config
-import os
+import migrate
 
 def create_database(host, user, password, db_name):
     """Creates the specified database if it doesn't exist."""
@@ -19,37 +19,6 @@ def create_database(host, user, password, db_name):
             cursor.close()
             conn.close()
 
-def execute_sql_script(db_config, script_path):
-    """Executes an SQL script file."""
-    conn = None
-    try:
-        conn = mysql.connector.connect(**db_config)
-        if conn.is_connected():
-            cursor = conn.cursor()
-            with open(script_path, 'r') as f:
-                sql_script = f.read()
-            # MySQL connector can execute multi-statement scripts, but better to split for robust error handling
-            # If your schema.sql has comments or specific MySQL commands that don't split well,
-            # consider using cursor.execute(statement) line by line, or ensure the connector handles it.
-            # For simplicity, we'll try to execute the whole script.
-            # A more robust way might be to split by semicolon and execute each statement.
-            for statement in sql_script.split(';'):
-                if statement.strip(): # Ensure not to execute empty statements
-                    try:
-                        cursor.execute(statement)
-                        print(f"Executed SQL statement: {statement.strip().splitlines()[0]}...")
-                    except Error as stmt_err:
-                        # Log error but try to continue with other statements if possible
-                        print(f"Error executing statement: {stmt_err} for: {statement.strip().splitlines()[0]}...")
-            conn.commit()
-            print(f"SQL script '{script_path}' executed successfully.")
-    except Error as e:
-        print(f"Error executing SQL script: {e}")
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
 def create_user(db_config, username, password, access_type="reader"):
     """Creates a user with specified privileges."""
     conn = None
@@ -107,9 +76,8 @@ if __name__ == "__main__":
 
     create_database(db_root_config["host"], db_root_config["user"], db_root_config["password"], config.DB_NAME)
     
-    # Path to your SQL schema file
-    schema_path = os.path.join(os.path.dirname(__file__), 'sql', 'schema.sql')
-    execute_sql_script(target_db_config, schema_path)
+    # Bring the schema up to the latest migration (sql/migrations)
+    migrate.migrate(target_db_config)
 
     # Create admin and reader users
     create_user(db_root_config, config.ADMIN_USER, config.ADMIN_PASSWORD, "admin")
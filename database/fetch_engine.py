@@ -0,0 +1,397 @@
+# fetch_engine.py
+import os
+import gzip
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+import requests
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Status codes worth retrying: rate limited or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchError(Exception):
+    """Raised when a request still fails after all retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, attempts: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.attempts = attempts
+
+
+@dataclass
+class CacheStats:
+    fresh_hits: int = 0     # served without a request
+    revalidated: int = 0    # 304 Not Modified, served from the cache
+    misses: int = 0         # full download
+    replayed: int = 0       # served offline in replay mode
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0    # cached bytes served instead of downloaded
+
+
+class ResponseCache:
+    """
+    Gzip-compressed on-disk cache of raw API responses.
+
+    Layout under `root`:
+
+        objects/ab/<sha256 of body>.gz   response bodies, content-addressed (identical payloads stored once)
+        refs/cd/<sha256 of request>.json url, params, body hash, ETag / Last-Modified, fetched_at, used_at
+        latest/ef/<sha256 of url>.json   the request key last stored for a URL, whatever its params
+
+    Requests are keyed by URL plus sorted query parameters. Stored ETag and
+    Last-Modified values are sent back as If-None-Match / If-Modified-Since, and
+    a 304 is answered from the cache. Entries younger than `fresh_for` seconds
+    are served without any request.
+
+    In `offline` (replay) mode nothing goes to the network. A request is served
+    from its exact entry, or else from the latest entry for the same URL, so a
+    replay on a later day still finds NAV payloads fetched with an older
+    `until_date`. `prune()` drops entries older than `ttl`, then the least
+    recently used ones until the bodies fit in `max_bytes`.
+    """
+
+    def __init__(self, root: str, ttl: float = 30 * 86400, max_bytes: int = 2 << 30, fresh_for: float = 0,
+                 offline: bool = False):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.offline = offline
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        for directory in ('objects', 'refs', 'latest'):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    @staticmethod
+    def request_key(url: str, params: Optional[dict] = None) -> str:
+        canonical = json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None)])
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, kind: str, digest: str, suffix: str) -> str:
+        return os.path.join(self.root, kind, digest[:2], digest + suffix)
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_json(self, path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def lookup(self, url: str, params: Optional[dict] = None) -> Optional[dict]:
+        """The stored entry for this request (in offline mode, falling back to the URL's latest), or None"""
+        entry = self._read_json(self._path('refs', self.request_key(url, params), '.json'))
+        if entry is None and self.offline:
+            latest = self._read_json(self._path('latest', self.request_key(url), '.json'))
+            if latest is not None:
+                entry = self._read_json(self._path('refs', latest['key'], '.json'))
+        if entry is not None and not os.path.exists(self._path('objects', entry['body'], '.gz')):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return self.fresh_for > 0 and time.time() - entry['fetched_at'] < self.fresh_for
+
+    def validators(self, entry: dict) -> dict:
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def response(self, entry: dict, touch: bool = True) -> requests.Response:
+        """Rebuild a 200 response from a stored entry"""
+        with open(self._path('objects', entry['body'], '.gz'), 'rb') as f:
+            body = gzip.decompress(f.read())
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry.get('headers') or {})
+        if touch:
+            entry['used_at'] = time.time()
+            self._write_atomic(self._path('refs', entry['key'], '.json'), json.dumps(entry).encode('utf-8'))
+        return response
+
+    def store(self, url: str, params: Optional[dict], response: requests.Response) -> dict:
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._path('objects', digest, '.gz')
+        if not os.path.exists(object_path):
+            self._write_atomic(object_path, gzip.compress(body, compresslevel=6))
+        key = self.request_key(url, params)
+        now = time.time()
+        entry = {
+            'key': key,
+            'url': url,
+            'params': {str(k): str(v) for k, v in (params or {}).items() if v is not None},
+            'body': digest,
+            'size': len(body),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'headers': {k: v for k, v in response.headers.items() if k.lower() == 'content-type'},
+            'fetched_at': now,
+            'used_at': now,
+        }
+        self._write_atomic(self._path('refs', key, '.json'), json.dumps(entry).encode('utf-8'))
+        self._write_atomic(self._path('latest', self.request_key(url), '.json'), json.dumps({'key': key}).encode('utf-8'))
+        return entry
+
+    def count(self, field_name: str, amount: int = 1):
+        with self._lock:
+            setattr(self.stats, field_name, getattr(self.stats, field_name) + amount)
+
+    def prune(self) -> dict:
+        """Evict entries past `ttl`, then least recently used ones beyond `max_bytes`; returns what was removed"""
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'refs')):
+            for filename in filenames:
+                entry = self._read_json(os.path.join(dirpath, filename))
+                if entry is not None:
+                    entries.append(entry)
+        expired = [e for e in entries if now - e['fetched_at'] > self.ttl]
+        kept = sorted((e for e in entries if now - e['fetched_at'] <= self.ttl), key=lambda e: e['used_at'], reverse=True)
+
+        object_sizes = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'objects')):
+            for filename in filenames:
+                if filename.endswith('.gz'):
+                    object_sizes[filename[:-3]] = os.path.getsize(os.path.join(dirpath, filename))
+
+        # Keep the most recently used entries whose bodies fit in the budget
+        live, total, evicted = set(), 0, list(expired)
+        for entry in kept:
+            body = entry['body']
+            if body not in live:
+                size = object_sizes.get(body, 0)
+                if total + size > self.max_bytes:
+                    evicted.append(entry)
+                    continue
+                live.add(body)
+                total += size
+        for entry in evicted:
+            try:
+                os.remove(self._path('refs', entry['key'], '.json'))
+            except FileNotFoundError:
+                pass
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'latest')):
+            for filename in filenames:
+                latest = self._read_json(os.path.join(dirpath, filename))
+                if latest is None or not os.path.exists(self._path('refs', latest['key'], '.json')):
+                    os.remove(os.path.join(dirpath, filename))
+        removed_objects = 0
+        for digest in object_sizes.keys() - live:
+            try:
+                os.remove(self._path('objects', digest, '.gz'))
+                removed_objects += 1
+            except FileNotFoundError:
+                pass
+        return {'entries': len(evicted), 'objects': removed_objects, 'bytes': total}
+
+
+@dataclass
+class FetchFailure:
+    key: str
+    error: str
+    status_code: Optional[int] = None
+    attempts: int = 1
+
+
+@dataclass
+class BatchResult:
+    results: dict = field(default_factory=dict)
+    failures: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def failure_report(self) -> dict:
+        """Per-key failure report: {key: {'error', 'status_code', 'attempts'}}"""
+        return {f.key: {'error': f.error, 'status_code': f.status_code, 'attempts': f.attempts} for f in self.failures}
+
+
+class BatchFetcher:
+    """
+    Concurrent HTTP fetcher for the Allfunds API.
+
+    All workers share one keep-alive session pool and one request-per-second
+    budget, and concurrent batches (e.g. ingestion stages running in parallel)
+    share `max_workers` requests in flight. Requests answered with 429/5xx or failing at the connection level
+    are retried with exponential backoff (honouring Retry-After), and a batch
+    returns whatever succeeded plus a failure report instead of raising.
+    With a `cache`, GETs go through the ResponseCache (conditional requests,
+    or no network at all in replay mode).
+    """
+
+    def __init__(self, max_workers: int = 16, requests_per_second: float = 10, max_retries: int = 5,
+                 backoff_factor: float = 0.5, backoff_max: float = 30, timeout: float = 30,
+                 cache: Optional[ResponseCache] = None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+        # Caps requests in flight across every fetch_many/fetch_iter pool using this fetcher
+        self._in_flight = threading.BoundedSemaphore(max_workers)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return min(self.backoff_max, float(response.headers['Retry-After']))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)  # jitter so workers don't retry in lockstep
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """GET through the response cache when there is one; see _get for retries."""
+        cache = self.cache
+        if cache is None:
+            return self._get(url, params, **kwargs)
+
+        entry = cache.lookup(url, params)
+        if cache.offline:
+            if entry is None:
+                raise FetchError(f"Replay mode: no cached response for {url} {params or ''}".rstrip())
+            cache.count('replayed')
+            return cache.response(entry, touch=False)
+        if entry is not None and cache.is_fresh(entry):
+            cache.count('fresh_hits')
+            cache.count('bytes_saved', entry['size'])
+            return cache.response(entry)
+
+        headers = {**(kwargs.pop('headers', None) or {}), **(cache.validators(entry) if entry else {})}
+        response = self._get(url, params, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            cache.count('revalidated')
+            cache.count('bytes_saved', entry['size'])
+            entry['fetched_at'] = time.time()
+            return cache.response(entry)
+        cache.count('misses')
+        cache.count('bytes_downloaded', len(response.content))
+        cache.store(url, params, response)
+        return response
+
+    def _get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """Rate-limited GET with retries; raises FetchError once retries are exhausted."""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                with self._in_flight:
+                    response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise FetchError(f"Request to {url} failed: {e}", attempts=attempt + 1)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+                continue
+            if response.status_code >= 400:
+                raise FetchError(f"Request to {url} returned HTTP {response.status_code}",
+                                 status_code=response.status_code, attempts=attempt + 1)
+            return response
+
+    def fetch_many(self, keys: Iterable[str], fetch_one: Callable[[str], Any]) -> BatchResult:
+        """Run fetch_one(key) for every key on the worker pool, collecting results and failures."""
+        started = time.monotonic()
+        batch = BatchResult()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(fetch_one, key): key for key in keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    batch.results[key] = future.result()
+                except FetchError as e:
+                    batch.failures.append(FetchFailure(key, str(e), e.status_code, e.attempts))
+                except Exception as e:
+                    batch.failures.append(FetchFailure(key, f"{type(e).__name__}: {e}"))
+        batch.elapsed = time.monotonic() - started
+        return batch
+
+    def fetch_iter(self, keys: Iterable[str], fetch_one: Callable[[str], Any], failures: list,
+                   max_pending: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Streaming fetch_many: yields (key, result) as fetches complete, appending FetchFailure to `failures`.
+
+        At most `max_pending` fetches are submitted or finished-but-unconsumed at once, so when
+        the consumer (e.g. a database writer) falls behind, the workers stop fetching instead
+        of piling results up in memory.
+        """
+        max_pending = max_pending or 2 * self.max_workers
+        keys = iter(keys)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {}
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    key = next(keys, None)
+                    if key is None:
+                        exhausted = True
+                        break
+                    pending[pool.submit(fetch_one, key)] = key
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except FetchError as e:
+                        failures.append(FetchFailure(key, str(e), e.status_code, e.attempts))
+                        continue
+                    except Exception as e:
+                        failures.append(FetchFailure(key, f"{type(e).__name__}: {e}"))
+                        continue
+                    yield key, result
+
+    def close(self):
+        self.session.close()
@@ -1,13 +1,91 @@
 # main.py
 import os
 import sys
+import argparse
 import config
 import database_setup
+import migrate
 import data_collector
+import pipeline
+import nav_snapshot
+import search_index
+import analytics
+import scheduler
 import pandas as pd
 
-def main():
+def ingestion_stages(db_writer, full_backfill=False):
+    """
+    Step 3 as a DAG of fetch and load stages.
+
+    Fetches only need the catalog's ISINs, so they overlap each other and the
+    loads. Loads into tables with a foreign key to fund_overview wait for the
+    overview load. The NAV stream fetches and writes in one stage; nav has had
+    no foreign key since migration 0003, so it does not wait for the overview.
+    """
+    def checked(df, label):
+        # A fetch where every ISIN failed (e.g. an API outage) fails the stage, so --resume retries it
+        failures = df.attrs.get('fetch_failures')
+        if df.empty and failures:
+            raise RuntimeError(f"all {len(failures)} {label} fetches failed")
+        return df
+
+    def fetch_catalog(inputs):
+        return data_collector.fetch_fund_catalog_data()
+
+    def fetch_overview(inputs):
+        return checked(data_collector.fetch_fund_overview_data(inputs['fetch_catalog']['isin'].tolist()), 'overview')
+
+    def fetch_performance(inputs):
+        return checked(data_collector.fetch_performance_data(inputs['fetch_catalog']['isin'].tolist()), 'performance')
+
+    def load(table, source, pk_columns):
+        def run(inputs):
+            df = inputs[source]
+            if df.empty:
+                print(f"No {table} data to insert.")
+            else:
+                db_writer.insert_dataframe(df, table, if_exists='upsert', pk_columns=pk_columns)
+            return len(df)
+        return run
+
+    def nav(inputs):
+        # Stream nav data into the database in fixed-size batches
+        # (only prices newer than what is stored, unless backfilling)
+        nav_report = pipeline.stream_nav_data(
+            db_writer, inputs['fetch_catalog']['isin'].tolist(), full_backfill=full_backfill,
+            batch_size=config.NAV_BATCH_SIZE, method=config.NAV_WRITE_METHOD,
+        )
+        if nav_report.rows_written == 0:
+            print("No NAV data to insert.")
+        return nav_report.rows_written
+
+    return [
+        scheduler.Stage('fetch_catalog', fetch_catalog),
+        scheduler.Stage('fetch_overview', fetch_overview, ('fetch_catalog',)),
+        scheduler.Stage('fetch_performance', fetch_performance, ('fetch_catalog',)),
+        scheduler.Stage('nav', nav, ('fetch_catalog',)),
+        scheduler.Stage('load_overview', load('fund_overview', 'fetch_overview', ['isin']), ('fetch_overview',)),
+        scheduler.Stage('load_catalog', load('fund_catalog', 'fetch_catalog', ['allfunds_id']),
+                        ('fetch_catalog', 'load_overview')),
+        scheduler.Stage('load_performance', load('performance', 'fetch_performance', ['isin']),
+                        ('fetch_performance', 'load_overview')),
+        # Publish a fresh columnar NAV snapshot for the backend's in-memory store
+        scheduler.Stage('nav_snapshot', lambda inputs: nav_snapshot.export_nav_snapshot(db_writer, config.NAV_SNAPSHOT_DIR),
+                        ('nav',)),
+        # Publish a fresh fund search index for the backend's fund search
+        scheduler.Stage('search_index', lambda inputs: search_index.export_search_index(db_writer, config.SEARCH_INDEX_DIR),
+                        ('load_overview',)),
+        # Recompute returns and risk metrics for every fund from the NAV history
+        scheduler.Stage('analytics', lambda inputs: analytics.compute_and_store(db_writer, config.NAV_SNAPSHOT_DIR),
+                        ('nav_snapshot', 'load_overview')),
+    ]
+
+def main(full_backfill=False, replay=False, resume=False):
     print("--- Starting Database Setup and Data Ingestion ---")
+    if replay:
+        # Rerun transform and load from cached Allfunds responses, without touching the API
+        print("Replay mode: serving all Allfunds requests from the response cache.")
+        data_collector.set_replay_mode()
 
     # 1. Set up MySQL database and tables
     print("\n[STEP 1/4] Setting up MySQL database and tables...")
@@ -26,9 +104,8 @@ def main():
     try:
         database_setup.create_database(db_root_config["host"], db_root_config["user"], db_root_config["password"], config.DB_NAME)
         
-        # Path to your SQL schema file
-        schema_path = os.path.join(os.path.dirname(__file__), 'sql', 'schema.sql')
-        database_setup.execute_sql_script(target_db_config, schema_path)
+        # Apply pending schema migrations (sql/migrations)
+        migrate.migrate(target_db_config)
         print("[STEP 1/4] Database and tables setup complete. ✅")
     except Exception as e:
         print(f"FATAL ERROR during database setup: {e}")
@@ -48,39 +125,28 @@ def main():
     print("\n[STEP 3/4] Collecting data and writing to database...")
     db_writer = None
     try:
-        # Initialize DatabaseWriter with admin credentials
+        # Initialize DatabaseWriter with admin credentials (one connection per running stage).
+        # Write errors are raised so the stage fails and --resume retries it.
         db_writer = data_collector.DatabaseWriter(
-            config.DB_HOST, config.DB_NAME, config.ADMIN_USER, config.ADMIN_PASSWORD
+            config.DB_HOST, config.DB_NAME, config.ADMIN_USER, config.ADMIN_PASSWORD,
+            pool_size=max(5, config.INGEST_MAX_PARALLEL_STAGES + 1), raise_on_error=True,
         )
 
-        # Fetch and insert fund_overview (parent table for ISIN)
-        df_overview = data_collector.fetch_fund_overview_data()
-        if not df_overview.empty:
-            db_writer.insert_dataframe(df_overview, 'fund_overview', if_exists='upsert', pk_columns=['isin'])
-        else:
-            print("No fund overview data to insert.")
-
-        # Fetch and insert fund_catalog
-        df_catalog = data_collector.fetch_fund_catalog_data()
-        if not df_catalog.empty:
-            db_writer.insert_dataframe(df_catalog, 'fund_catalog', if_exists='upsert', pk_columns=['allfunds_id'])
-        else:
-            print("No fund catalog data to insert.")
-        
-        # Fetch and insert nav data
-        df_nav = data_collector.fetch_nav_data()
-        if not df_nav.empty:
-            db_writer.insert_dataframe(df_nav, 'nav', if_exists='upsert', pk_columns=['isin', 'date'])
-        else:
-            print("No NAV data to insert.")
-
-        # Fetch and insert performance data
-        df_performance = data_collector.fetch_performance_data()
-        if not df_performance.empty:
-            db_writer.insert_dataframe(df_performance, 'performance', if_exists='upsert', pk_columns=['isin'])
-        else:
-            print("No performance data to insert.")
+        # Fetch and load stages run as soon as their dependencies are done
+        stages = ingestion_stages(db_writer, full_backfill)
+        report = scheduler.run_stages(
+            stages, max_workers=config.INGEST_MAX_PARALLEL_STAGES,
+            checkpoint_dir=config.INGEST_CHECKPOINT_DIR, resume=resume,
+        )
+        report.print_summary(stages)
 
+        cache_summary = data_collector.cache_report()
+        if cache_summary:
+            print(cache_summary)
+        if not report.ok:
+            print("FATAL ERROR during data collection/ingestion: some stages failed. "
+                  "Rerun with --resume to retry only the failed and skipped stages.")
+            sys.exit(1)
         print("[STEP 3/4] Data collection and write complete. ✅")
 
     except Exception as e:
@@ -95,4 +161,12 @@ def main():
     print("\n--- All operations completed successfully! 🎉 ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Set up the fund database and ingest Allfunds data.")
+    parser.add_argument("--full-backfill", action="store_true",
+                        help="re-fetch the full NAV history instead of only prices newer than the stored high-water marks")
+    parser.add_argument("--replay", action="store_true",
+                        help="serve all Allfunds requests from the response cache (offline) to rerun transform and load")
+    parser.add_argument("--resume", action="store_true",
+                        help="reuse the stages a failed run completed and rerun only the failed and skipped ones")
+    args = parser.parse_args()
+    main(full_backfill=args.full_backfill, replay=args.replay, resume=args.resume)
\ No newline at end of file
@@ -0,0 +1,201 @@
+# migrate.py
+"""
+Versioned schema migrations for the fund_data database.
+
+Migrations are the files sql/migrations/NNNN_<name>.sql, applied in version
+order. Each applied version is recorded in `schema_migrations` together with
+a checksum of its file, so a run only applies what is new and warns when an
+applied file has been edited since.
+
+MySQL commits DDL implicitly, so a migration cannot be rolled back as a
+whole: a failing statement stops the run before the version is recorded.
+Fix the file or the database and run again.
+
+0001 only creates missing tables (CREATE TABLE IF NOT EXISTS), so databases
+created from the old sql/schema.sql simply run it like a new one.
+
+    python migrate.py            # apply all pending migrations
+    python migrate.py --status   # list applied and pending versions
+    python migrate.py --to 1     # apply up to version 0001 only
+"""
+import os
+import re
+import hashlib
+import argparse
+from typing import NamedTuple, Optional
+
+import mysql.connector
+
+import config
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'migrations')
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+    checksum: str
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list[Migration]:
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+    migrations.sort()
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(script: str) -> list[str]:
+    """
+    Split a SQL script into statements on top-level semicolons.
+    Semicolons inside quoted strings, quoted identifiers and comments do not split;
+    comments are dropped.
+    """
+    statements, current = [], []
+    i, n = 0, len(script)
+    while i < n:
+        ch = script[i]
+        if ch in ("'", '"', '`'):
+            # Quoted string or identifier; a doubled quote or a backslash escapes it
+            j = i + 1
+            while j < n:
+                if script[j] == '\\' and ch != '`':
+                    j += 2
+                    continue
+                if script[j] == ch:
+                    if j + 1 < n and script[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            current.append(script[i:j + 1])
+            i = j + 1
+        elif script.startswith('--', i) and (i + 2 == n or script[i + 2].isspace()) or ch == '#':
+            end = script.find('\n', i)
+            i = n if end < 0 else end
+        elif script.startswith('/*', i):
+            end = script.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            current.append(' ')
+        elif ch == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+        else:
+            current.append(ch)
+            i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR(255) NOT NULL,"
+        " checksum CHAR(64) NOT NULL,"
+        " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+def applied_versions(cursor) -> dict[int, str]:
+    """version -> checksum of every recorded migration"""
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def _execute(cursor, migration: Migration, statements: list[str]):
+    for statement in statements:
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as e:
+            raise RuntimeError(
+                f"Migration {migration.version:04d}_{migration.name} failed at: "
+                f"{statement.splitlines()[0]}... ({e})"
+            ) from e
+
+
+def migrate(db_config: dict, target: Optional[int] = None, directory: str = MIGRATIONS_DIR) -> list[int]:
+    """Apply pending migrations up to `target` (default: all); returns the versions applied."""
+    migrations = load_migrations(directory)
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    applied_now = []
+    try:
+        _ensure_migrations_table(cursor)
+        applied = applied_versions(cursor)
+        conn.commit()
+
+        for migration in migrations:
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    print(f"Warning: migration {migration.version:04d}_{migration.name} was edited after it was applied.")
+                continue
+            if target is not None and migration.version > target:
+                break
+            with open(migration.path, 'r') as f:
+                statements = split_statements(f.read())
+            print(f"Applying migration {migration.version:04d}_{migration.name} ({len(statements)} statements)...")
+            _execute(cursor, migration, statements)
+            cursor.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                           (migration.version, migration.name, migration.checksum))
+            conn.commit()
+            applied_now.append(migration.version)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if applied_now:
+        print(f"Applied {len(applied_now)} migration(s); schema is at version {applied_now[-1]:04d}.")
+    else:
+        print("Schema is up to date.")
+    return applied_now
+
+
+def status(db_config: dict, directory: str = MIGRATIONS_DIR):
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        _ensure_migrations_table(cursor)
+        applied = applied_versions(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+    for migration in load_migrations(directory):
+        state = 'applied' if migration.version in applied else 'pending'
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            state = 'applied (edited since)'
+        print(f"{migration.version:04d}_{migration.name}: {state}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply fund_data schema migrations.")
+    parser.add_argument("--to", type=int, default=None, help="apply migrations up to this version only")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+
+    db_config = {
+        "host": config.DB_HOST,
+        "user": config.DB_USER,
+        "password": config.DB_PASSWORD,
+        "database": config.DB_NAME,
+    }
+    if args.status:
+        status(db_config)
+    else:
+        migrate(db_config, target=args.to)
@@ -0,0 +1,154 @@
+# nav_snapshot.py
+"""
+Columnar on-disk snapshot of the nav table, read by the backend's in-memory NAV store.
+
+Layout under the snapshot root:
+
+    CURRENT                  name of the active snapshot directory
+    snapshot-<timestamp>/
+        dates.npy            int32 days since 1970-01-01, sorted by (isin, date)
+        close.npy            float64 close prices, same order
+        index.json           {"rows", "isins", "offsets", "lengths", "created_at"}
+
+Every ISIN's rows are contiguous, so a fund's series is a plain slice of the two
+arrays. Rows without a close are left out, so every stored close is a number. A snapshot is built in a hidden temp directory, renamed into place, then
+published by atomically replacing CURRENT, so readers never see a partial one.
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from numpy.lib.format import open_memmap
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+CURRENT_FILE = 'CURRENT'
+KEEP_SNAPSHOTS = 2  # the previous snapshot stays around for readers still mapping it
+
+
+def to_epoch_days(dates) -> np.ndarray:
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+
+class NavSnapshotWriter:
+    def __init__(self, root: str, total_rows: int):
+        self.root = root
+        self.total_rows = total_rows
+        self.name = f"snapshot-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}"
+        self.tmp_dir = os.path.join(root, f".{self.name}.tmp")
+        os.makedirs(self.tmp_dir)
+
+        self.dates = open_memmap(os.path.join(self.tmp_dir, 'dates.npy'), mode='w+', dtype=np.int32, shape=(max(total_rows, 1),))
+        self.close = open_memmap(os.path.join(self.tmp_dir, 'close.npy'), mode='w+', dtype=np.float64, shape=(max(total_rows, 1),))
+        self.isins, self.offsets, self.lengths = [], [], []
+        self.rows = 0
+
+    def append(self, isins, dates, closes):
+        """Append rows already sorted by (isin, date), continuing from the previous chunk."""
+        isins = np.asarray(isins, dtype=object)
+        n = len(isins)
+        if n == 0:
+            return
+        if self.rows + n > self.total_rows:
+            raise ValueError(f"Snapshot sized for {self.total_rows} rows but received more.")
+
+        self.dates[self.rows:self.rows + n] = to_epoch_days(dates)
+        self.close[self.rows:self.rows + n] = np.asarray(closes, dtype=np.float64)
+
+        # start of every run of equal ISINs within the chunk
+        starts = np.flatnonzero(np.r_[True, isins[1:] != isins[:-1]])
+        ends = np.r_[starts[1:], n]
+        for start, end in zip(starts, ends):
+            isin = isins[start]
+            if self.isins and self.isins[-1] == isin:
+                self.lengths[-1] += int(end - start)  # fund continues from the previous chunk
+            else:
+                self.isins.append(isin)
+                self.offsets.append(self.rows + int(start))
+                self.lengths.append(int(end - start))
+        self.rows += n
+
+    def commit(self) -> str:
+        """Flush, move the snapshot into place and publish it through CURRENT."""
+        self.dates.flush()
+        self.close.flush()
+        del self.dates, self.close
+
+        with open(os.path.join(self.tmp_dir, 'index.json'), 'w') as f:
+            json.dump({
+                'rows': self.rows,
+                'isins': self.isins,
+                'offsets': self.offsets,
+                'lengths': self.lengths,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+            }, f)
+
+        final_dir = os.path.join(self.root, self.name)
+        os.rename(self.tmp_dir, final_dir)
+
+        pointer_tmp = os.path.join(self.root, f".{CURRENT_FILE}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(self.name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(self.root, CURRENT_FILE))
+
+        self._prune_old_snapshots()
+        print(f"Published NAV snapshot '{self.name}' ({self.rows} rows, {len(self.isins)} funds).")
+        return final_dir
+
+    def abort(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _prune_old_snapshots(self):
+        snapshots = sorted(d for d in os.listdir(self.root) if d.startswith('snapshot-'))
+        for old in snapshots[:-KEEP_SNAPSHOTS]:
+            shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+
+
+def write_snapshot_from_frame(root: str, df: pd.DataFrame) -> str:
+    """Build a snapshot from a DataFrame with isin/date/close columns."""
+    os.makedirs(root, exist_ok=True)
+    df = df.dropna(subset=['close']).sort_values(['isin', 'date'])
+    writer = NavSnapshotWriter(root, len(df))
+    try:
+        writer.append(df['isin'].to_numpy(), df['date'].to_numpy(), df['close'].to_numpy())
+        return writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def export_nav_snapshot(db_writer, root: str, chunk_size: int = 200_000) -> str:
+    """
+    Stream the nav table into a new snapshot, chunk by chunk, from one consistent read
+    so the row count and the rows agree even if ingestion is writing concurrently.
+    """
+    os.makedirs(root, exist_ok=True)
+    conn = db_writer.get_connection()
+    cursor = conn.cursor()
+    writer = None
+    try:
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        cursor.execute("SELECT COUNT(*) FROM `nav` WHERE `close` IS NOT NULL")
+        (total_rows,) = cursor.fetchone()
+        writer = NavSnapshotWriter(root, total_rows)
+
+        cursor.execute("SELECT `isin`, `date`, `close` FROM `nav` WHERE `close` IS NOT NULL ORDER BY `isin`, `date`")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            isins, dates, closes = zip(*rows)
+            writer.append(isins, dates, [float(c) for c in closes])
+        conn.commit()
+        return writer.commit()
+    except Exception:
+        if writer:
+            writer.abort()
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close() # Return connection to pool
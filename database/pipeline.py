@@ -0,0 +1,125 @@
+# pipeline.py
+"""
+Chunked, memory-bounded ingestion pipeline: fetch -> transform -> batch -> write.
+
+Each stage is a generator, so only a bounded amount of data is alive at any time:
+the fetch stage keeps at most `max_pending` per-ISIN responses in flight (workers
+stop fetching when the writer falls behind), the batch stage re-slices those
+frames into fixed-size record batches, and the write stage hands each batch to
+DatabaseWriter and drops it. Peak memory therefore depends on the batch size and
+fetch window, not on the size of the fund universe.
+"""
+import time
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Iterable, Iterator, Optional
+
+import config
+import data_collector
+from fetch_engine import BatchFetcher
+
+
+@dataclass
+class PipelineReport:
+    table: str
+    rows_written: int = 0
+    batches: int = 0
+    funds_fetched: int = 0
+    failures: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def failure_report(self) -> dict:
+        return {f.key: {'error': f.error, 'status_code': f.status_code, 'attempts': f.attempts} for f in self.failures}
+
+
+def fetch_stage(fetcher: BatchFetcher, isin_codes: Iterable[str], fetch_one: Callable[[str], pd.DataFrame],
+                report: PipelineReport, max_pending: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Per-ISIN frames as they arrive, with a bounded number of fetches outstanding."""
+    for _, frame in fetcher.fetch_iter(isin_codes, fetch_one, report.failures, max_pending):
+        report.funds_fetched += 1
+        yield frame
+
+
+def transform_stage(frames: Iterable[pd.DataFrame], transform: Callable[[pd.DataFrame], pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    for frame in frames:
+        frame = transform(frame)
+        if not frame.empty:
+            yield frame
+
+
+def batch_stage(frames: Iterable[pd.DataFrame], batch_size: int) -> Iterator[pd.DataFrame]:
+    """Re-slice a stream of frames into batches of exactly batch_size rows (the last may be smaller)."""
+    buffered = []
+    buffered_rows = 0
+    for frame in frames:
+        buffered.append(frame)
+        buffered_rows += len(frame)
+        if buffered_rows < batch_size:
+            continue
+        combined = pd.concat(buffered, axis=0, ignore_index=True)
+        buffered = []
+        for start in range(0, len(combined) - batch_size + 1, batch_size):
+            yield combined.iloc[start:start + batch_size]
+        remainder = len(combined) % batch_size
+        if remainder:
+            buffered = [combined.iloc[len(combined) - remainder:].copy()]
+        buffered_rows = remainder
+        del combined
+    if buffered_rows:
+        yield pd.concat(buffered, axis=0, ignore_index=True)
+
+
+def write_stage(batches: Iterable[pd.DataFrame], write_batch: Callable[[pd.DataFrame], None], report: PipelineReport):
+    for batch in batches:
+        write_batch(batch)
+        report.rows_written += len(batch)
+        report.batches += 1
+
+
+def run_pipeline(fetcher: BatchFetcher, isin_codes: Iterable[str], fetch_one: Callable[[str], pd.DataFrame],
+                 transform: Callable[[pd.DataFrame], pd.DataFrame], write_batch: Callable[[pd.DataFrame], None],
+                 table: str, batch_size: int = 50_000, max_pending: Optional[int] = None) -> PipelineReport:
+    report = PipelineReport(table)
+    started = time.monotonic()
+    frames = fetch_stage(fetcher, isin_codes, fetch_one, report, max_pending)
+    write_stage(batch_stage(transform_stage(frames, transform), batch_size), write_batch, report)
+    report.elapsed = time.monotonic() - started
+
+    print(f"Streamed {report.rows_written} rows into '{table}' in {report.batches} batches "
+          f"from {report.funds_fetched} funds ({report.elapsed:.1f}s).")
+    if report.failures:
+        print(f"{len(report.failures)} fetches failed:")
+        for failure in report.failures[:10]:
+            print(f"  {failure.key}: {failure.error}")
+    return report
+
+
+def stream_nav_data(db_writer, isin_codes: list[str], full_backfill: bool = False, since_date: Optional[str] = None,
+                    until_date: Optional[str] = None, fetcher: Optional[BatchFetcher] = None,
+                    batch_size: int = 50_000, method: str = 'bulk') -> PipelineReport:
+    """
+    Streaming counterpart of data_collector.fetch_nav_data + insert_dataframe: NAVs are
+    fetched, filtered against the stored high-water marks and upserted batch by batch.
+    """
+    fetcher = fetcher or data_collector.get_fetcher()
+    since_date = since_date or config.NAV_BACKFILL_SINCE
+    until = date.fromisoformat(until_date) if until_date else date.today()
+
+    high_water_marks = {} if full_backfill else db_writer.get_nav_high_water_marks()
+    since_by_isin = data_collector.nav_since_dates(isin_codes, high_water_marks, since_date, until)
+    print(f"NAV pipeline: {len(since_by_isin)}/{len(isin_codes)} funds need prices "
+          f"({'full backfill' if full_backfill else 'incremental'}).")
+
+    def fetch_one(isin):
+        return data_collector.single_fund_navs(isin, str(since_by_isin[isin]), str(until), fetcher)
+
+    def transform(frame):
+        frame = frame.rename(columns={'value': 'close'})
+        return data_collector.drop_stored_navs(frame, high_water_marks)
+
+    def write_batch(batch):
+        db_writer.insert_dataframe(batch, 'nav', if_exists='upsert', pk_columns=['isin', 'date'],
+                                   method=method, chunk_size=batch_size, commit_every=batch_size)
+
+    return run_pipeline(fetcher, list(since_by_isin), fetch_one, transform, write_batch, 'nav', batch_size)
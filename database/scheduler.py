@@ -0,0 +1,232 @@
+# scheduler.py
+"""
+Dependency-aware stage scheduler for the ingestion job.
+
+A run is a DAG of named stages. Each stage is a function taking the outputs of
+its dependencies, as {dependency name: output}. A stage starts as soon as all
+its dependencies have finished. Stages run on one bounded thread pool, so
+independent fetches and loads overlap; the fetcher's rate limit and request
+cap still bound the load on the API.
+
+When a stage fails, its dependents are skipped and independent branches keep
+going. Every finished stage is recorded in a checkpoint directory together
+with its output. A run with `resume=True` reuses those stages and reruns only
+the failed, skipped and never-started ones. Once a run finishes, the stored
+outputs are deleted; the timings are kept in state.json.
+"""
+import os
+import json
+import time
+import pickle
+import shutil
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+STATE_FILE = 'state.json'
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[dict], Any]
+    deps: tuple = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str = 'pending'  # done | resumed | failed | skipped
+    seconds: float = 0.0
+    started_at: float = 0.0  # seconds since the run started
+    error: Optional[str] = None
+
+
+@dataclass
+class RunReport:
+    results: dict = field(default_factory=dict)
+    wall_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(r.status in ('done', 'resumed') for r in self.results.values())
+
+    def critical_path_seconds(self, stages: list[Stage]) -> float:
+        """Longest dependency chain by stage time: the best wall-clock time the DAG allows"""
+        finish = {}
+        for stage in stages:
+            finish[stage.name] = self.results[stage.name].seconds + max((finish[d] for d in stage.deps), default=0.0)
+        return max(finish.values(), default=0.0)
+
+    def print_summary(self, stages: list[Stage]):
+        print(f"{'stage':>20} {'status':>8} {'start s':>8} {'seconds':>8}")
+        for stage in stages:
+            r = self.results[stage.name]
+            print(f"{r.name:>20} {r.status:>8} {r.started_at:>8.1f} {r.seconds:>8.1f}")
+        total = sum(r.seconds for r in self.results.values())
+        print(f"Wall clock {self.wall_seconds:.1f}s; sum of stages {total:.1f}s; "
+              f"critical path {self.critical_path_seconds(stages):.1f}s.")
+        for r in self.results.values():
+            if r.status == 'failed':
+                print(f"Stage '{r.name}' failed: {r.error}")
+
+
+class Checkpoint:
+    """Stage statuses in state.json and each finished stage's output pickled next to it"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, STATE_FILE)
+        self.state = {'stages': {}}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {'stages': {}}
+        return self
+
+    def reset(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = {'stages': {}, 'started_at': datetime.now(timezone.utc).isoformat()}
+        self._save()
+
+    def completed(self, name: str) -> bool:
+        entry = self.state['stages'].get(name)
+        return bool(entry) and entry['status'] in ('done', 'resumed') and os.path.exists(self._output_path(name))
+
+    def output(self, name: str):
+        with open(self._output_path(name), 'rb') as f:
+            return pickle.load(f)
+
+    def record(self, result: StageResult, output=None):
+        if result.status == 'done':
+            tmp = self._output_path(result.name) + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._output_path(result.name))
+        entry = {'status': result.status, 'seconds': round(result.seconds, 3), 'error': result.error,
+                 'finished_at': datetime.now(timezone.utc).isoformat()}
+        if result.status == 'resumed':
+            entry['seconds'] = self.state['stages'].get(result.name, {}).get('seconds', 0.0)
+        self.state['stages'][result.name] = entry
+        self._save()
+
+    def finish(self, ok: bool):
+        """A finished run keeps its timings; outputs are only needed to resume a failed one"""
+        self.state['complete'] = ok
+        self._save()
+        if ok:
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, filename))
+
+    def _output_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.pkl")
+
+    def _save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _validate(stages: list[Stage]):
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique.")
+    seen = set()
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in seen]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on {missing}, which must be listed before it.")
+        seen.add(stage.name)
+
+
+def run_stages(stages: list[Stage], max_workers: int = 4, checkpoint_dir: Optional[str] = None,
+               resume: bool = False) -> RunReport:
+    """
+    Run `stages` (listed in dependency order) as their dependencies finish.
+    Never raises for a failing stage; check RunReport.ok.
+    """
+    _validate(stages)
+    by_name = {s.name: s for s in stages}
+    report = RunReport({s.name: StageResult(s.name) for s in stages})
+    checkpoint = None
+    if checkpoint_dir:
+        checkpoint = Checkpoint(checkpoint_dir).load()
+        if not resume or checkpoint.state.get('complete'):
+            checkpoint.reset()
+
+    outputs = {}
+    started = time.monotonic()
+    if checkpoint:
+        for stage in stages:
+            if checkpoint.completed(stage.name):
+                report.results[stage.name].status = 'resumed'
+                report.results[stage.name].seconds = checkpoint.state['stages'][stage.name]['seconds']
+        resumed = [s.name for s in stages if report.results[s.name].status == 'resumed']
+        if resumed:
+            print(f"Resuming: reusing completed stages {', '.join(resumed)}.")
+
+    def output_of(name):
+        if name not in outputs:
+            outputs[name] = checkpoint.output(name)
+        return outputs[name]
+
+    def execute(stage: Stage):
+        inputs = {d: output_of(d) for d in stage.deps}
+        began = time.monotonic()
+        report.results[stage.name].started_at = began - started
+        try:
+            return stage.run(inputs), None, time.monotonic() - began
+        except Exception as e:
+            traceback.print_exc()
+            return None, f"{type(e).__name__}: {e}", time.monotonic() - began
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage') as pool:
+        running = {}
+        while True:
+            for stage in stages:
+                result = report.results[stage.name]
+                if result.status != 'pending' or stage.name in running.values():
+                    continue
+                statuses = [report.results[d].status for d in stage.deps]
+                if any(s in ('failed', 'skipped') for s in statuses):
+                    result.status = 'skipped'
+                    result.error = 'a dependency failed'
+                    if checkpoint:
+                        checkpoint.record(result)
+                elif all(s in ('done', 'resumed') for s in statuses):
+                    running[pool.submit(execute, stage)] = stage.name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                output, error, seconds = future.result()
+                result = report.results[name]
+                result.seconds = seconds
+                if error is None:
+                    result.status = 'done'
+                    outputs[name] = output
+                    print(f"Stage '{name}' done in {seconds:.1f}s.")
+                else:
+                    result.status = 'failed'
+                    result.error = error
+                    print(f"Stage '{name}' failed after {seconds:.1f}s: {error}")
+                if checkpoint:
+                    checkpoint.record(result, output)
+                # Drop outputs nothing else still needs
+                for dep in by_name[name].deps:
+                    if all(report.results[s.name].status != 'pending' or dep not in s.deps for s in stages):
+                        outputs.pop(dep, None)
+
+    report.wall_seconds = time.monotonic() - started
+    if checkpoint:
+        checkpoint.finish(report.ok)
+    return report
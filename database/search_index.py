@@ -0,0 +1,241 @@
+# search_index.py
+"""
+On-disk fund search index over fund_overview, read by the backend's fund search.
+
+Layout under the index root:
+
+    CURRENT                   name of the active index directory
+    index-<timestamp>/
+        meta.json             {"docs", "terms", "avgdl", "dim", "tokenizer", "vocabularies", "created_at"}
+        docs.json             per fund: isin, name, fund_company, asset_class, category,
+                              risk_reward_indicator, fund_aum, aum_currency
+        term_offsets.npy      int64, postings of term t are [offsets[t], offsets[t + 1])
+        postings_doc.npy      int32 doc numbers, grouped by term
+        postings_weight.npy   float32 precomputed BM25 score of the term in the doc
+        vectors.npy           float32 (docs, dim) unit-length dense vectors
+        feature_idf.npy       float32 IDF of the vector features, by crc32 % IDF_BUCKETS
+        asset_class.npy / category.npy / currency.npy
+                              int16 codes into meta "vocabularies" (-1 = missing)
+        risk.npy              int8 risk indicator (0 = missing)
+        aum.npy               float64 fund AUM (NaN = missing)
+
+Text comes from name, fund company, category, asset class, benchmark and
+investment objective, with the name weighted highest. Because the BM25 weights
+are precomputed, a query is a sum over the postings of its terms.
+
+Dense vectors are computed locally, without an embedding model. Word unigrams,
+bigrams and character trigrams are weighted by IDF and signed-hashed into `dim`
+dimensions. They find funds whose descriptions read alike ("funds like X").
+
+The tokenizer and the hashing are duplicated in backend/src/fund_search.py;
+change both together and bump TOKENIZER_VERSION. The index is published the
+same way as the NAV snapshot: it is built in a hidden directory, renamed into
+place, and CURRENT is replaced atomically.
+"""
+import os
+import re
+import json
+import math
+import shutil
+import zlib
+import numpy as np
+import pandas as pd
+from collections import Counter
+from datetime import datetime, timezone
+
+CURRENT_FILE = 'CURRENT'
+KEEP_INDEXES = 2
+TOKENIZER_VERSION = 1
+DEFAULT_DIM = 128
+IDF_BUCKETS = 1 << 18
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# text field -> term frequency weight (a simple BM25F)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'fund_company': 2.0,
+    'category': 2.0,
+    'asset_class': 1.0,
+    'subasset_class': 1.0,
+    'fund_benchmark': 1.0,
+    'investment_objective': 1.0,
+}
+DOC_COLUMNS = ['isin', 'name', 'fund_company', 'asset_class', 'category', 'risk_reward_indicator', 'fund_aum', 'aum_currency']
+FILTER_COLUMNS = {'asset_class': 'asset_class', 'category': 'category', 'currency': 'aum_currency'}
+
+STOPWORDS = frozenset(
+    "a an and are as at by for from in into is it its of on or the this that to with which will fund funds "
+    "sub aims aim seeks seek invest invests investing investment".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list[str]:
+    """Lowercase alphanumeric words without stopwords, with a light plural strip"""
+    if not isinstance(text, str) or not text:
+        return []
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def vector_features(tokens: list[str]) -> list[str]:
+    """Features hashed into the dense vector: words, word bigrams and character trigrams"""
+    features = list(tokens)
+    features += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"#{token}#"
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return features
+
+
+def feature_hash(feature: str, dim: int) -> tuple[int, float]:
+    """(dimension, sign) of a feature; crc32 so every process agrees"""
+    h = zlib.crc32(feature.encode('utf-8'))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def _encode(values, vocabulary: dict) -> np.ndarray:
+    codes = np.full(len(values), -1, dtype=np.int16)
+    for i, value in enumerate(values):
+        if isinstance(value, str) and value.strip():
+            codes[i] = vocabulary.setdefault(value.strip().lower(), len(vocabulary))
+    return codes
+
+
+def _jsonable(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return float(value)
+    return value
+
+
+def build_search_index(root: str, df: pd.DataFrame, dim: int = DEFAULT_DIM) -> str:
+    """Build and publish an index from a fund_overview DataFrame; returns its directory."""
+    os.makedirs(root, exist_ok=True)
+    columns = list(dict.fromkeys([*df.columns, *DOC_COLUMNS, *FIELD_WEIGHTS]))
+    df = df.drop_duplicates('isin').reset_index(drop=True).reindex(columns=columns)
+    n = len(df)
+    name = f"index-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}"
+    tmp_dir = os.path.join(root, f".{name}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        # Weighted term frequencies per doc, and the unweighted tokens for the vectors
+        doc_terms, doc_tokens, lengths = [], [], np.zeros(n, dtype=np.float64)
+        for i, row in enumerate(df.to_dict('records')):
+            counts, tokens = Counter(), []
+            for field, weight in FIELD_WEIGHTS.items():
+                field_tokens = tokenize(row.get(field))
+                tokens += field_tokens
+                for token in field_tokens:
+                    counts[token] += weight
+            doc_terms.append(counts)
+            doc_tokens.append(tokens)
+            lengths[i] = sum(counts.values())
+        avgdl = float(lengths.mean()) if n else 0.0
+
+        # Inverted index with precomputed BM25 weights, grouped by term
+        document_frequency = Counter(term for counts in doc_terms for term in counts)
+        terms = sorted(document_frequency)
+        term_ids = {term: t for t, term in enumerate(terms)}
+        postings = [[] for _ in terms]
+        for d, counts in enumerate(doc_terms):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[d] / avgdl) if avgdl else BM25_K1
+            for term, tf in counts.items():
+                idf = math.log(1 + (n - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                postings[term_ids[term]].append((d, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        postings_doc = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        postings_weight = np.fromiter((w for p in postings for _, w in p), dtype=np.float32, count=int(offsets[-1]))
+
+        # IDF-weighted hashed features, normalized to unit length
+        features = [vector_features(tokens) for tokens in doc_tokens]
+        feature_df = Counter(f for doc in features for f in set(doc))
+        # Queries weight their features from this table; unseen features get the highest IDF
+        feature_idf = np.full(IDF_BUCKETS, math.log(1 + n), dtype=np.float32)
+        for feature, count in feature_df.items():
+            feature_idf[zlib.crc32(feature.encode('utf-8')) % IDF_BUCKETS] = math.log(1 + n / count)
+        # dimension and signed IDF of each distinct feature
+        slots = {}
+        for feature, count in feature_df.items():
+            j, sign = feature_hash(feature, dim)
+            slots[feature] = (j, sign * math.log(1 + n / count))
+        vectors = np.zeros((n, dim), dtype=np.float32)
+        for d, doc in enumerate(features):
+            for feature, count in Counter(doc).items():
+                j, weight = slots[feature]
+                vectors[d, j] += weight * (1 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+
+        # Structured filter columns
+        vocabularies = {key: {} for key in FILTER_COLUMNS}
+        for key, column in FILTER_COLUMNS.items():
+            np.save(os.path.join(tmp_dir, f'{key}.npy'), _encode(df[column].tolist(), vocabularies[key]))
+        risk = pd.to_numeric(df['risk_reward_indicator'], errors='coerce').fillna(0)
+        np.save(os.path.join(tmp_dir, 'risk.npy'), risk.astype(np.int8).to_numpy())
+        aum = pd.to_numeric(df['fund_aum'], errors='coerce')
+        np.save(os.path.join(tmp_dir, 'aum.npy'), aum.astype(np.float64).to_numpy())
+
+        np.save(os.path.join(tmp_dir, 'term_offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'postings_doc.npy'), postings_doc)
+        np.save(os.path.join(tmp_dir, 'postings_weight.npy'), postings_weight)
+        np.save(os.path.join(tmp_dir, 'vectors.npy'), vectors)
+        np.save(os.path.join(tmp_dir, 'feature_idf.npy'), feature_idf)
+
+        docs = [{column: _jsonable(row.get(column)) for column in DOC_COLUMNS} for row in df.to_dict('records')]
+        with open(os.path.join(tmp_dir, 'docs.json'), 'w') as f:
+            json.dump(docs, f, default=str)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'docs': n,
+                'terms': terms,
+                'avgdl': avgdl,
+                'dim': dim,
+                'tokenizer': TOKENIZER_VERSION,
+                'vocabularies': {key: sorted(vocab, key=vocab.get) for key, vocab in vocabularies.items()},
+                'created_at': datetime.now(timezone.utc).isoformat(),
+            }, f)
+
+        final_dir = os.path.join(root, name)
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+    indexes = sorted(d for d in os.listdir(root) if d.startswith('index-'))
+    for old in indexes[:-KEEP_INDEXES]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    print(f"Published search index '{name}' ({n} funds, {len(terms)} terms).")
+    return final_dir
+
+
+def export_search_index(db_writer, root: str, dim: int = DEFAULT_DIM) -> str:
+    """Read fund_overview and publish a new search index built from it."""
+    conn = db_writer.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        columns = sorted(set(DOC_COLUMNS) | set(FIELD_WEIGHTS))
+        cursor.execute(f"SELECT {', '.join(f'`{c}`' for c in columns)} FROM `fund_overview`")
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+        conn.close() # Return connection to pool
+    return build_search_index(root, df, dim)
@@ -1,10 +1,13 @@
+-- 0001: initial schema (formerly sql/schema.sql)
+-- Every table is created IF NOT EXISTS, so databases created from sql/schema.sql run it like a new one.
+
 -- Disable foreign key checks temporarily to allow table creation in any order
 -- if there are circular dependencies or for easier script execution.
 -- Re-enable them at the end.
 SET FOREIGN_KEY_CHECKS = 0;
 
 -- Create the fund_overview table first, as other tables will reference its ISIN.
-CREATE TABLE fund_overview (
+CREATE TABLE IF NOT EXISTS fund_overview (
     isin VARCHAR(50) PRIMARY KEY, -- ISIN as the primary key
     name VARCHAR(255),
     fund_company VARCHAR(255),
@@ -21,7 +24,7 @@ CREATE TABLE fund_overview (
 );
 
 -- Create the fund_catalog table
-CREATE TABLE fund_catalog (
+CREATE TABLE IF NOT EXISTS fund_catalog (
     allfunds_id VARCHAR(50) PRIMARY KEY, -- allfunds_id as the primary key
     isin VARCHAR(50),
     currency VARCHAR(10),
@@ -39,7 +42,7 @@ CREATE TABLE fund_catalog (
 );
 
 -- Create the nav table
-CREATE TABLE nav (
+CREATE TABLE IF NOT EXISTS nav (
     isin VARCHAR(50),
     date DATE,
     close DECIMAL(18, 4),
@@ -52,7 +55,7 @@ CREATE TABLE nav (
 );
 
 -- Create the performance table
-CREATE TABLE performance (
+CREATE TABLE IF NOT EXISTS performance (
     isin VARCHAR(50) PRIMARY KEY, -- ISIN as the primary key, assuming one performance record per ISIN
     inception DECIMAL(18, 4),
     one_day DECIMAL(18, 4),
@@ -72,5 +75,49 @@ CREATE TABLE performance (
         ON UPDATE CASCADE
 );
 
+-- Create the fund_analytics table (computed from nav by analytics.py; returns as fractions)
+CREATE TABLE IF NOT EXISTS fund_analytics (
+    isin VARCHAR(50) PRIMARY KEY,
+    as_of_date DATE,
+    inception DECIMAL(18, 6),
+    one_day DECIMAL(18, 6),
+    one_week DECIMAL(18, 6),
+    one_month DECIMAL(18, 6),
+    three_months DECIMAL(18, 6),
+    six_months DECIMAL(18, 6),
+    one_year DECIMAL(18, 6),
+    two_years DECIMAL(18, 6),
+    three_years DECIMAL(18, 6),
+    five_years DECIMAL(18, 6),
+    ten_years DECIMAL(18, 6),
+    volatility_1y DECIMAL(18, 6),
+    volatility_3y DECIMAL(18, 6),
+    sharpe_1y DECIMAL(18, 6),
+    sharpe_3y DECIMAL(18, 6),
+    sortino_1y DECIMAL(18, 6),
+    sortino_3y DECIMAL(18, 6),
+    max_drawdown DECIMAL(18, 6),
+    corr_universe_3m DECIMAL(18, 6), -- correlation with the equal-weighted universe over ~63 trading days
+    CONSTRAINT fk_fund_analytics_isin
+        FOREIGN KEY (isin)
+        REFERENCES fund_overview (isin)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
+-- Create the fund_calendar_returns table (monthly 'M', quarterly 'Q' and yearly 'Y' returns)
+CREATE TABLE IF NOT EXISTS fund_calendar_returns (
+    isin VARCHAR(50),
+    period_type CHAR(1),
+    period_end DATE, -- last NAV date within the period
+    return_value DECIMAL(18, 6),
+    PRIMARY KEY (isin, period_type, period_end),
+    CONSTRAINT fk_fund_calendar_returns_isin
+        FOREIGN KEY (isin)
+        REFERENCES fund_overview (isin)
+        ON DELETE CASCADE
+        ON UPDATE CASCADE
+);
+
 -- Re-enable foreign key checks
 SET FOREIGN_KEY_CHECKS = 1;
\ No newline at end of file
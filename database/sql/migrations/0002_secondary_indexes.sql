@@ -0,0 +1,15 @@
+-- 0002: secondary indexes for the read paths of the backend
+
+-- Fund screens filter on asset class / category / risk and page by ISIN.
+-- InnoDB appends the primary key to every secondary index, so these also
+-- serve the `ORDER BY isin` of the paginated listing.
+CREATE INDEX idx_fund_overview_asset_class_category ON fund_overview (asset_class, category);
+CREATE INDEX idx_fund_overview_category ON fund_overview (category);
+CREATE INDEX idx_fund_overview_risk ON fund_overview (risk_reward_indicator);
+
+-- search_funds returns the largest funds first
+CREATE INDEX idx_fund_overview_aum ON fund_overview (fund_aum);
+
+-- Cross-sectional reads (all funds on a date, latest trading day); per-fund
+-- series and latest NAV per fund are served by the (isin, date) primary key
+CREATE INDEX idx_nav_date ON nav (date);
@@ -0,0 +1,56 @@
+-- 0003: compact close prices and yearly range partitions on nav
+--
+-- DECIMAL(12, 4) stores a close in 6 bytes instead of 9 and still holds
+-- values up to 99,999,999.9999.
+--
+-- Partitioning by date keeps date-range reads to the years they touch and
+-- lets old years be archived with ALTER TABLE ... DROP/EXCHANGE PARTITION.
+-- The partition column is part of the (isin, date) primary key, as MySQL
+-- requires. Partitioned InnoDB tables cannot have foreign keys, so
+-- fk_nav_isin is dropped. NAV rows of a deleted fund are therefore no longer
+-- removed by cascade; nothing in the pipeline deletes funds.
+--
+-- Add a year before p_future fills up:
+--   ALTER TABLE nav REORGANIZE PARTITION p_future INTO (
+--       PARTITION p2031 VALUES LESS THAN ('2032-01-01'),
+--       PARTITION p_future VALUES LESS THAN (MAXVALUE));
+
+ALTER TABLE nav DROP FOREIGN KEY fk_nav_isin;
+
+ALTER TABLE nav
+    MODIFY close DECIMAL(12, 4)
+PARTITION BY RANGE COLUMNS (date) (
+    PARTITION p_before_2000 VALUES LESS THAN ('2000-01-01'),
+    PARTITION p2000 VALUES LESS THAN ('2001-01-01'),
+    PARTITION p2001 VALUES LESS THAN ('2002-01-01'),
+    PARTITION p2002 VALUES LESS THAN ('2003-01-01'),
+    PARTITION p2003 VALUES LESS THAN ('2004-01-01'),
+    PARTITION p2004 VALUES LESS THAN ('2005-01-01'),
+    PARTITION p2005 VALUES LESS THAN ('2006-01-01'),
+    PARTITION p2006 VALUES LESS THAN ('2007-01-01'),
+    PARTITION p2007 VALUES LESS THAN ('2008-01-01'),
+    PARTITION p2008 VALUES LESS THAN ('2009-01-01'),
+    PARTITION p2009 VALUES LESS THAN ('2010-01-01'),
+    PARTITION p2010 VALUES LESS THAN ('2011-01-01'),
+    PARTITION p2011 VALUES LESS THAN ('2012-01-01'),
+    PARTITION p2012 VALUES LESS THAN ('2013-01-01'),
+    PARTITION p2013 VALUES LESS THAN ('2014-01-01'),
+    PARTITION p2014 VALUES LESS THAN ('2015-01-01'),
+    PARTITION p2015 VALUES LESS THAN ('2016-01-01'),
+    PARTITION p2016 VALUES LESS THAN ('2017-01-01'),
+    PARTITION p2017 VALUES LESS THAN ('2018-01-01'),
+    PARTITION p2018 VALUES LESS THAN ('2019-01-01'),
+    PARTITION p2019 VALUES LESS THAN ('2020-01-01'),
+    PARTITION p2020 VALUES LESS THAN ('2021-01-01'),
+    PARTITION p2021 VALUES LESS THAN ('2022-01-01'),
+    PARTITION p2022 VALUES LESS THAN ('2023-01-01'),
+    PARTITION p2023 VALUES LESS THAN ('2024-01-01'),
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p2027 VALUES LESS THAN ('2028-01-01'),
+    PARTITION p2028 VALUES LESS THAN ('2029-01-01'),
+    PARTITION p2029 VALUES LESS THAN ('2030-01-01'),
+    PARTITION p2030 VALUES LESS THAN ('2031-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
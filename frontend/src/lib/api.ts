@@ -35,6 +35,15 @@ export const endpoints = {
     stream: '/api/chat/stream',
     completion: '/api/chat',
   },
+  sessions: {
+    create: '/api/sessions',
+    session: (id: string) => `/api/sessions/${id}`,
+    stream: (id: string) => `/api/sessions/${id}/messages/stream`,
+    completion: (id: string) => `/api/sessions/${id}/messages`,
+  },
+  streams: {
+    resume: (id: string) => `/api/streams/${id}`,
+  },
 } as const;
 
 // API request types
@@ -45,21 +54,52 @@ export const MessageSchema = z.object({
 
 export const ChatRequestSchema = z.object({
   messages: z.array(MessageSchema),
+  // scopes the backend's fund-lookup tool cache to one conversation
+  conversation_id: z.string().optional(),
+});
+
+// Session requests: create once (optionally seeded), then post only the new turn
+export const SessionCreateRequestSchema = z.object({
+  messages: z.array(MessageSchema).optional(),
+});
+
+export const SessionTurnSchema = z.object({
+  content: z.string(),
 });
 
 // API response types
+export const SessionSchema = z.object({
+  session_id: z.string(),
+  created_at: z.number(),
+  message_count: z.number(),
+});
+
+export const UsageSchema = z.object({
+  prompt_tokens: z.number(),
+  original_prompt_tokens: z.number(),
+  prompt_tokens_saved: z.number(),
+  summarized_messages: z.number(),
+});
+
 export const ChatResponseSchema = z.object({
   content: z.string(),
   thinking_duration: z.number(),
+  usage: UsageSchema.optional(),
 });
 
 export type Message = z.infer<typeof MessageSchema>;
 export type ChatRequest = z.infer<typeof ChatRequestSchema>;
 export type ChatResponse = z.infer<typeof ChatResponseSchema>;
+export type Usage = z.infer<typeof UsageSchema>;
+export type SessionCreateRequest = z.infer<typeof SessionCreateRequestSchema>;
+export type SessionTurn = z.infer<typeof SessionTurnSchema>;
+export type Session = z.infer<typeof SessionSchema>;
 
 // Streaming response types
 export type StreamResponse = {
-  type: 'text-delta' | 'finish' | 'error';
+  type: 'text-delta' | 'tool-call' | 'finish' | 'error';
   textDelta?: string;
+  toolName?: string;
+  usage?: Usage;
   error?: string;
 }; 
\ No newline at end of file
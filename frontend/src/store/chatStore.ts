@@ -1,6 +1,13 @@
 import { create } from "zustand"
 import xiaoiceManager from "../utils/xiaoiceManager"
-import { endpoints, type Message, type ChatRequest, type StreamResponse } from "../lib/api"
+import {
+  endpoints,
+  SessionSchema,
+  type Message,
+  type SessionCreateRequest,
+  type SessionTurn,
+  type StreamResponse,
+} from "../lib/api"
 
 export interface ChatMessage {
   id: string
@@ -12,6 +19,7 @@ export interface ChatMessage {
 
 interface ChatState {
   messages: ChatMessage[]
+  sessionId: string | null
   isTyping: boolean
   showAvatar: boolean
   inputValue: string
@@ -32,8 +40,43 @@ interface ChatState {
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000"
 
+// Start a server-side session, seeded with the history the client already has
+async function createSession(history: Message[]): Promise<string> {
+  const request: SessionCreateRequest = { messages: history }
+  const response = await fetch(`${API_BASE_URL}${endpoints.sessions.create}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(request),
+  })
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status} - ${await response.text()}`)
+  }
+  return SessionSchema.parse(await response.json()).session_id
+}
+
+function postTurn(sessionId: string, content: string): Promise<Response> {
+  const turn: SessionTurn = { content }
+  return fetch(`${API_BASE_URL}${endpoints.sessions.stream(sessionId)}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+    },
+    body: JSON.stringify(turn),
+  })
+}
+
+// Reopen a dropped stream after the last event received; the backend replays what was missed
+function resumeStream(lastEventId: string): Promise<Response> {
+  const streamId = lastEventId.split(":")[0]
+  return fetch(`${API_BASE_URL}${endpoints.streams.resume(streamId)}`, {
+    headers: { Accept: "text/event-stream", "Last-Event-ID": lastEventId },
+  })
+}
+
 export const useChatStore = create<ChatState>((set, get) => ({
   messages: [],
+  sessionId: null,
   isTyping: false,
   showAvatar: true,
   inputValue: "",
@@ -60,7 +103,11 @@ export const useChatStore = create<ChatState>((set, get) => ({
   setInputValue: (value) => set({ inputValue: value }),
   clearMessages: () => {
     console.info("Clearing all messages", "ChatStore")
-    set({ messages: [] })
+    const { sessionId } = get()
+    if (sessionId) {
+      fetch(`${API_BASE_URL}${endpoints.sessions.session(sessionId)}`, { method: "DELETE" }).catch(() => {})
+    }
+    set({ messages: [], sessionId: null })
   },
 
   setIsAvatarTalking: (talking) => {
@@ -114,66 +161,93 @@ export const useChatStore = create<ChatState>((set, get) => ({
     startThinking()
 
     try {
-      const conversationMessages: Message[] = messages
-        .map((msg) => ({
-          role: msg.role,
-          content: msg.content,
-        }))
-        .concat([{ role: "user", content: message }])
-
-      const request: ChatRequest = {
-        messages: conversationMessages,
+      // Only the new message is sent; the backend keeps the history in the session
+      const history: Message[] = messages.map((msg) => ({ role: msg.role, content: msg.content }))
+      let { sessionId } = get()
+      if (!sessionId) {
+        sessionId = await createSession(history)
+        set({ sessionId })
       }
 
-      const response = await fetch(`${API_BASE_URL}${endpoints.chat.stream}`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Accept: "text/plain",
-        },
-        body: JSON.stringify(request),
-      })
+      let response = await postTurn(sessionId, message)
+      if (response.status === 404) {
+        // Session expired server-side: re-create it from the local history and retry once
+        sessionId = await createSession(history)
+        set({ sessionId })
+        response = await postTurn(sessionId, message)
+      }
 
       if (!response.ok) {
         const errorText = await response.text()
         throw new Error(`API Error: ${response.status} - ${errorText}`)
       }
 
-      const reader = response.body?.getReader()
-      if (!reader) {
-        throw new Error("No response body")
-      }
-
       let assistantMessage = ""
+      let lastEventId: string | null = null
+      let finished = false
+      let resumed = false
       const thinkingDuration = stopThinking()
       addMessage("", "assistant", thinkingDuration)
 
       while (true) {
-        const { done, value } = await reader.read()
-        if (done) break
-
-        const chunk = new TextDecoder().decode(value)
-        const lines = chunk.split("\n")
-
-        for (const line of lines) {
-          if (line.startsWith("data: ")) {
-            try {
-              const data = JSON.parse(line.slice(6)) as StreamResponse
-              if (data.type === "text-delta" && data.textDelta) {
-                assistantMessage += data.textDelta
-                set((state) => ({
-                  messages: state.messages.map((msg, index) =>
-                    index === state.messages.length - 1 ? { ...msg, content: assistantMessage } : msg,
-                  ),
-                }))
-              } else if (data.type === "error" && data.error) {
-                throw new Error(data.error)
+        const reader = response.body?.getReader()
+        if (!reader) {
+          throw new Error("No response body")
+        }
+        const decoder = new TextDecoder()
+        // A frame can be split across reads; keep the incomplete last line for the next one
+        let buffer = ""
+
+        try {
+          while (true) {
+            const { done, value } = await reader.read()
+            if (done) break
+
+            buffer += decoder.decode(value, { stream: true })
+            const lines = buffer.split("\n")
+            buffer = lines.pop() ?? ""
+
+            for (const line of lines) {
+              if (line.startsWith("id: ")) {
+                lastEventId = line.slice(4)
+              } else if (line.startsWith("data: ")) {
+                try {
+                  const data = JSON.parse(line.slice(6)) as StreamResponse
+                  if (data.type === "text-delta" && data.textDelta) {
+                    assistantMessage += data.textDelta
+                    set((state) => ({
+                      messages: state.messages.map((msg, index) =>
+                        index === state.messages.length - 1 ? { ...msg, content: assistantMessage } : msg,
+                      ),
+                    }))
+                  } else if (data.type === "finish" || data.type === "error") {
+                    finished = true
+                    if (data.type === "error" && data.error) {
+                      throw new Error(data.error)
+                    }
+                  }
+                } catch (e) {
+                  console.error("Parse error for line", "ChatStore", { line, error: e })
+                }
               }
-            } catch (e) {
-              console.error("Parse error for line", "ChatStore", { line, error: e })
+              // Lines starting with ":" are keep-alive comments
             }
           }
+        } catch (error) {
+          console.warn("Stream interrupted", "ChatStore", { lastEventId, error })
+        }
+
+        // The connection dropped before the answer ended: resume once from the last event
+        if (finished || resumed || !lastEventId) break
+        resumed = true
+        response = await resumeStream(lastEventId)
+        if (response.status === 404) {
+          // The stream expired or is held by another server worker: ask again from the start.
+          assistantMessage = ""
+          lastEventId = null
+          response = await postTurn(sessionId, message)
         }
+        if (!response.ok) break
       }
 
       // Use the manager to make avatar talk